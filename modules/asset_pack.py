@@ -0,0 +1,133 @@
+# asset_pack.py
+"""
+Single-file asset pack for translations and images.
+
+Layout:  magic (4) | format version (u16) | python magic (4) | index length (u32) | index | blobs
+The index is a small JSON object {key: [offset, length]}; offsets are relative
+to the start of the blobs. Translations are stored pre-parsed (marshal) and
+images as ready-to-use PNG data, so the app reads everything through one mmap
+and only touches the bytes of the keys it asks for.
+
+Build it before packaging (PyInstaller then bundles modules/assets.pack):
+    python asset_pack.py build
+"""
+import json
+import marshal
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import importlib.util
+
+PACK_NAME = "assets.pack"
+MAGIC = b"VXPK"
+FORMAT_VERSION = 1
+# marshal data is only valid for the Python version that wrote it
+PYTHON_MAGIC = importlib.util.MAGIC_NUMBER
+HEADER = struct.Struct("<4sH4sI")
+
+LANGUAGES = ["en", "fa", "ru", "zh"]
+LOGO_SIZES = [16, 32, 42, 48, 53, 63, 84]
+
+
+def translation_key(lang):
+    return f"translations/{lang}"
+
+
+def image_key(name):
+    return f"image/{name}"
+
+
+class AssetPack:
+    """Read-only view of an asset pack; blobs are sliced out of the mmap on demand."""
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, python_magic, index_length = HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                raise ValueError("not a supported asset pack")
+            self.python_compatible = python_magic == PYTHON_MAGIC
+            index_start = HEADER.size
+            self._index = json.loads(bytes(self._map[index_start:index_start + index_length]))
+            self._blobs_start = index_start + index_length
+        except Exception:
+            self.close()
+            raise
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def get_bytes(self, key):
+        offset, length = self._index[key]
+        start = self._blobs_start + offset
+        return self._map[start:start + length]
+
+    def get_translations(self, lang):
+        """The pre-parsed translations of a language, or None if the pack cannot provide them."""
+        key = translation_key(lang)
+        if not self.python_compatible or key not in self._index:
+            return None
+        return marshal.loads(self.get_bytes(key))
+
+    def close(self):
+        if getattr(self, "_map", None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+
+_packs = {}
+
+
+def get_pack(path):
+    """Opens the pack at path once per process; returns None when it is missing or invalid."""
+    if path not in _packs:
+        try:
+            _packs[path] = AssetPack(path)
+        except (OSError, ValueError, struct.error):
+            _packs[path] = None
+    return _packs[path]
+
+
+def build_pack(source_dir, output_path):
+    """Builds the pack from the translation files and the logo in source_dir."""
+    blobs = {}
+    for lang in LANGUAGES:
+        with open(os.path.join(source_dir, f"{lang}.json"), "r", encoding='utf-8') as f:
+            blobs[translation_key(lang)] = marshal.dumps(json.load(f))
+
+    from theme_assets import render_logo_png, prescaled_logo_name, LOGO_SOURCE
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for edge in LOGO_SIZES:
+            name = prescaled_logo_name(edge, edge)
+            temp_path = os.path.join(temp_dir, name)
+            render_logo_png(os.path.join(source_dir, LOGO_SOURCE), temp_path, (edge, edge))
+            with open(temp_path, "rb") as f:
+                blobs[image_key(name)] = f.read()
+
+    index = {}
+    offset = 0
+    for key, blob in blobs.items():
+        index[key] = [offset, len(blob)]
+        offset += len(blob)
+    index_bytes = json.dumps(index, separators=(",", ":")).encode("utf-8")
+
+    with open(output_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, PYTHON_MAGIC, len(index_bytes)))
+        f.write(index_bytes)
+        for blob in blobs.values():
+            f.write(blob)
+    return index
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "build":
+        print("Usage: python asset_pack.py build [output]")
+        sys.exit(2)
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    output = sys.argv[2] if len(sys.argv) > 2 else os.path.join(base_dir, PACK_NAME)
+    built = build_pack(base_dir, output)
+    print(f"Wrote {output} ({len(built)} entries, {os.path.getsize(output)} bytes)")
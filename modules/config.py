@@ -2,6 +2,9 @@
 import json
 import os
 import sys
+import threading
+
+from subscription import Subscription
 
 def resource_path(relative_path):
     """ Get absolute path to resource, works for dev and for PyInstaller """
@@ -11,25 +14,76 @@ def resource_path(relative_path):
         base_path = os.path.dirname(os.path.abspath(__file__))
     return os.path.join(base_path, relative_path)
 
-# Load translations from external JSON files
-TRANSLATIONS = {}
-for lang in ["en", "fa", "ru", "zh"]:
-    try:
-        filepath = resource_path(f"{lang}.json")
-        with open(filepath, "r", encoding='utf-8') as f:
-            TRANSLATIONS[lang] = json.load(f)
-    except Exception as e:
-        print(f"FATAL ERROR: Could not load language file {lang}.json. Error: {e}")
+LANGUAGES = ["en", "fa", "ru", "zh"]
+
+class LazyTranslations(dict):
+    """
+    Translations loaded on first use of each language, so startup only reads the
+    language that is actually shown. The pre-parsed copy in the asset pack is used
+    when it is bundled; the JSON files are the fallback.
+    """
+
+    def __missing__(self, lang):
+        if lang not in LANGUAGES:
+            raise KeyError(lang)
+        translations = self._load_from_pack(lang)
+        if translations is not None:
+            self[lang] = translations
+            return translations
+        try:
+            filepath = resource_path(f"{lang}.json")
+            with open(filepath, "r", encoding='utf-8') as f:
+                translations = json.load(f)
+        except Exception as e:
+            print(f"FATAL ERROR: Could not load language file {lang}.json. Error: {e}")
+            raise KeyError(lang)
+        self[lang] = translations
+        return translations
+
+    def __contains__(self, lang):
+        return lang in LANGUAGES
+
+    @staticmethod
+    def _load_from_pack(lang):
+        from asset_pack import get_pack, PACK_NAME
+        pack = get_pack(resource_path(PACK_NAME))
+        if pack is None:
+            return None
+        try:
+            return pack.get_translations(lang)
+        except Exception as e:
+            print(f"Could not read {lang} from the asset pack, using {lang}.json. Error: {e}")
+            return None
+
+TRANSLATIONS = LazyTranslations()
+
+# Command-line switches of the elevated DNS service (see dns_service.py)
+SERVICE_ARG = "--dns-service"
+DATA_DIR_ARG = "--data-dir"
+
+def argument_value(argv, name):
+    """The value following name in argv, or None."""
+    if name in argv:
+        index = argv.index(name) + 1
+        if index < len(argv):
+            return argv[index]
+    return None
+
+def _app_data_path(argv):
+    # UAC may run the DNS service as another administrator, whose own %APPDATA% the GUI
+    # never reads: the GUI passes its folder on the service's command line instead
+    if SERVICE_ARG in argv and argument_value(argv, DATA_DIR_ARG):
+        return argument_value(argv, DATA_DIR_ARG)
+    return os.path.join(os.getenv('APPDATA'), 'VexoChecker')
 
 # Global settings
 current_language = "en"
-APP_DATA_PATH = os.path.join(os.getenv('APPDATA'), 'VexoChecker')
+APP_DATA_PATH = _app_data_path(sys.argv)
 SETTINGS_FILE = os.path.join(APP_DATA_PATH, 'settings.json')
-app_settings = {"language": "en", "last_used_url": "", "last_known_ip": ""}
+app_settings = {"language": "en", "last_used_url": "", "last_known_ip": "", "resolver_mode": "plain", "auto_refresh": True, "auto_update_ip": True, "adapter_policy": "default_route"}
 last_fetched_data = None
-active_timer_id = None
-active_fetch_id = None
-watchdog_timer_id = None
+# Held while saving; worker threads (e.g. the mirror race) also hold it while they change app_settings
+settings_lock = threading.RLock()
 
 # config.py
 
@@ -52,15 +106,19 @@ def load_settings():
                     current_language = lang
                 
                 # همچنین داده‌های fetch شده را نیز از همان دیکشنری اصلی می‌خوانیم
-                last_fetched_data = app_settings.get("last_fetched_data", None)
+                last_fetched_data = Subscription.from_cache(app_settings.get("last_fetched_data"))
 
             except json.JSONDecodeError:
                 # اگر فایل خراب بود، از تنظیمات پیش‌فرض استفاده می‌شود
                 pass
                 
 def save_settings():
-    """Save settings to file"""
+    """Save settings to file (safe to call from any thread)"""
     global app_settings
-    os.makedirs(APP_DATA_PATH, exist_ok=True)
-    with open(SETTINGS_FILE, "w", encoding='utf-8') as f:
-        json.dump(app_settings, f, indent=2)
+    with settings_lock:
+        os.makedirs(APP_DATA_PATH, exist_ok=True)
+        # Written to a temporary file first, so a concurrent reader never sees half a file
+        temp_path = SETTINGS_FILE + ".tmp"
+        with open(temp_path, "w", encoding='utf-8') as f:
+            json.dump(app_settings, f, indent=2)
+        os.replace(temp_path, SETTINGS_FILE)
@@ -0,0 +1,95 @@
+# connectivity.py
+"""
+Fast connectivity pre-check, run before a refresh so that an offline machine or a
+captive portal gets a specific error at once instead of after the fetch timeouts.
+
+The probe is conservative: it only reports OFFLINE or CAPTIVE_PORTAL when it is
+sure. A slow or blocked probe is UNKNOWN and the normal fetch goes ahead.
+"""
+import socket
+import threading
+import time
+
+ONLINE = "online"
+OFFLINE = "offline"
+CAPTIVE_PORTAL = "captive_portal"
+UNKNOWN = "unknown"
+
+PROBE_BUDGET = 0.3
+# The endpoint Windows itself uses for its captive-portal check (NCSI)
+PROBE_HOST = "www.msftconnecttest.com"
+PROBE_PATH = "/connecttest.txt"
+PROBE_EXPECTED_BODY = b"Microsoft Connect Test"
+MAX_RESPONSE_SIZE = 8192
+
+
+def has_default_route():
+    """
+    Cheap offline check: asks the OS for a route to a public address.
+    A UDP connect() sends no packets, it only fails when there is no default route.
+    """
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.connect(("8.8.8.8", 53))
+            return not sock.getsockname()[0].startswith("0.")
+    except OSError:
+        return False
+
+
+def classify_probe_response(response):
+    """
+    ONLINE for the expected NCSI answer; CAPTIVE_PORTAL for a redirect, or a 200
+    with another body (a login page). Any other status (an error from the probe
+    host, a proxy or a filter) proves nothing and is UNKNOWN.
+    """
+    head, _, body = response.partition(b"\r\n\r\n")
+    status_line = head.split(b"\r\n", 1)[0]
+    parts = status_line.split()
+    if len(parts) < 2 or not parts[0].startswith(b"HTTP/"):
+        return UNKNOWN
+    status = parts[1]
+    if status == b"200":
+        return ONLINE if body.strip().startswith(PROBE_EXPECTED_BODY) else CAPTIVE_PORTAL
+    if len(status) == 3 and status.startswith(b"3"):
+        return CAPTIVE_PORTAL
+    return UNKNOWN
+
+
+def _http_probe(deadline, result):
+    try:
+        address = socket.getaddrinfo(PROBE_HOST, 80, socket.AF_INET, socket.SOCK_STREAM)[0][4]
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            return
+        with socket.create_connection(address, timeout=timeout) as sock:
+            sock.sendall(
+                f"GET {PROBE_PATH} HTTP/1.0\r\nHost: {PROBE_HOST}\r\nConnection: close\r\n\r\n".encode("ascii")
+            )
+            response = b""
+            while len(response) < MAX_RESPONSE_SIZE:
+                sock.settimeout(max(0.01, deadline - time.monotonic()))
+                chunk = sock.recv(MAX_RESPONSE_SIZE)
+                if not chunk:
+                    break
+                response += chunk
+        result.append(classify_probe_response(response))
+    except (OSError, IndexError):
+        # Name resolution or connection failed: could be filtering, not proof of being offline
+        pass
+
+
+def probe_connectivity(budget=PROBE_BUDGET):
+    """
+    Returns ONLINE, OFFLINE, CAPTIVE_PORTAL or UNKNOWN within about budget seconds.
+    The HTTP probe thread uses socket timeouts bounded by the same deadline, so it
+    does not outlive the probe (only a hanging name lookup can, briefly).
+    """
+    if not has_default_route():
+        return OFFLINE
+
+    deadline = time.monotonic() + budget
+    result = []
+    thread = threading.Thread(target=_http_probe, args=(deadline, result), name="connectivity-probe", daemon=True)
+    thread.start()
+    thread.join(budget)
+    return result[0] if result else UNKNOWN
@@ -0,0 +1,235 @@
+# diagnostics.py
+"""
+On-demand profiling of one refresh or DNS operation.
+
+Arming the capture (the --diagnostics flag, or Ctrl+Shift+D in the window) makes
+the next operation passed through capture_next() run under cProfile, together
+with every thread it starts, while span() records wall-clock timings per thread.
+The result is written as one zip bundle the user can send us:
+
+    profile.pstats   the merged cProfile data (load with pstats / snakeviz)
+    profile.txt      the top functions by cumulative time
+    timings.json     operation, duration, thread spans, Python and OS version
+    settings.json    the settings, with links, tokens and IP addresses redacted
+
+When DNS changes go through the DNS service, the DNS operations are profiled on
+the GUI side only (the RPC round trips show up as the time spent waiting).
+
+This module is imported on the startup path, so the profiling and bundling
+modules are only imported once a capture runs.
+"""
+import json
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from config import APP_DATA_PATH, app_settings
+
+DIAGNOSTICS_ARG = "--diagnostics"
+DIAGNOSTICS_DIR = os.path.join(APP_DATA_PATH, 'diagnostics')
+TOP_FUNCTIONS = 60
+# How often the GUI looks for a finished bundle while a capture is pending
+POLL_MS = 250
+
+REDACTED = "<redacted>"
+# Settings that identify the user or their subscription
+REDACTED_KEYS = {"last_used_url", "last_known_ip", "last_fetched_data", "dhcp_dns_servers"}
+_IPV4 = re.compile(r"\b\d{1,3}(?:\.\d{1,3}){3}\b")
+_TOKEN = re.compile(r"/sub/[^/\s\"']+")
+
+_lock = threading.Lock()
+_armed = None
+_active = None
+
+
+class _Capture:
+    def __init__(self, operation):
+        self.operation = operation
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.profiles = []
+        self.spans = []
+
+    def profile_thread(self):
+        """Starts a profiler for the calling thread; False where one profiler already covers all threads."""
+        import cProfile
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+: cProfile uses sys.monitoring, which sees every thread
+            return False
+        with _lock:
+            self.profiles.append(profiler)
+        return True
+
+    def add_span(self, name, started, finished):
+        thread = threading.current_thread()
+        with _lock:
+            self.spans.append({
+                "name": name,
+                "thread": thread.name,
+                "thread_id": thread.ident,
+                "start_ms": round((started - self.started) * 1000, 3),
+                "duration_ms": round((finished - started) * 1000, 3),
+            })
+
+
+def arm(on_saved=None):
+    """
+    The next capture_next() call is profiled. Afterwards on_saved(path, error) is
+    called from its thread: with the bundle path, or with None and the exception
+    that kept the bundle from being written.
+    """
+    global _armed
+    _armed = on_saved or (lambda path, error: None)
+
+
+def is_armed():
+    return _armed is not None
+
+
+def is_capturing():
+    """Armed, or running: on_saved may still be called."""
+    return _armed is not None or _active is not None
+
+
+def _thread_hook(frame, event, arg):
+    # Installed with threading.setprofile: runs first thing in each thread started during a capture
+    capture = _active
+    sys.setprofile(None)
+    if capture is not None:
+        capture.profile_thread()
+
+
+@contextmanager
+def span(name):
+    """Times the enclosed block (in the calling thread) when a capture is running; free otherwise."""
+    capture = _active
+    if capture is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        capture.add_span(name, started, time.perf_counter())
+
+
+def spanned(name, func):
+    """func wrapped in span(name), e.g. as a thread target."""
+    def run(*args, **kwargs):
+        with span(name):
+            return func(*args, **kwargs)
+    return run
+
+
+def capture_next(operation, func, *args):
+    """Runs func(*args); profiled and bundled if a capture was armed."""
+    global _armed, _active
+    with _lock:
+        # While another capture is running this one stays armed for the next call
+        on_saved = _armed if _active is None else None
+        if on_saved is not None:
+            _armed = None
+            _active = _Capture(operation)
+    if on_saved is None:
+        return func(*args)
+
+    capture = _active
+    threading.setprofile(_thread_hook)
+    capture.profile_thread()
+    error = None
+    try:
+        with span(operation):
+            return func(*args)
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        threading.setprofile(None)
+        for profiler in capture.profiles:
+            profiler.disable()
+        try:
+            path, write_error = write_bundle(capture, error), None
+        except Exception as e:
+            path, write_error = None, e
+        try:
+            on_saved(path, write_error)
+        except Exception:
+            # A broken callback must not replace the operation's own result
+            pass
+        # Cleared last: once is_capturing() is false, on_saved has run
+        _active = None
+
+
+def redact(value):
+    """Masks subscription tokens and IPv4 addresses in a settings value."""
+    if isinstance(value, str):
+        return _IPV4.sub("x.x.x.x", _TOKEN.sub("/sub/" + REDACTED, value))
+    if isinstance(value, list):
+        return [redact(item) for item in value]
+    if isinstance(value, dict):
+        return {redact(key): redact(item) for key, item in value.items()}
+    return value
+
+
+def redacted_settings():
+    settings = {key: REDACTED if key in REDACTED_KEYS and value else redact(value)
+                for key, value in dict(app_settings).items()}
+    if isinstance(settings.get("panel_mirrors"), dict):
+        # Keyed by subscription token
+        settings["panel_mirrors"] = {f"{REDACTED}-{number}": mirrors
+                                     for number, mirrors in enumerate(settings["panel_mirrors"].values(), 1)}
+    return settings
+
+
+def write_bundle(capture, error=None, directory=None):
+    """Writes the capture as a zip file (in DIAGNOSTICS_DIR by default) and returns its path."""
+    import io
+    import marshal
+    import platform
+    import pstats
+    import zipfile
+
+    directory = directory or DIAGNOSTICS_DIR
+    duration = time.perf_counter() - capture.started
+    stats = None
+    for profiler in capture.profiles:
+        profiler.create_stats()
+        if not profiler.stats:
+            continue
+        if stats is None:
+            stats = pstats.Stats(profiler)
+        else:
+            stats.add(profiler)
+
+    timings = {
+        "operation": capture.operation,
+        "started_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(capture.started_at)),
+        "duration_ms": round(duration * 1000, 3),
+        "error": repr(error) if error else None,
+        "spans": sorted(capture.spans, key=lambda item: item["start_ms"]),
+        "profiled_threads": len(capture.profiles),
+        "python": sys.version,
+        "platform": platform.platform(),
+    }
+
+    os.makedirs(directory, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(capture.started_at))
+    path = os.path.join(directory, f"vexo-diagnostics-{capture.operation}-{stamp}.zip")
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as bundle:
+        if stats is not None:
+            # Stats.dump_stats only writes to a file name; marshal the same data here
+            bundle.writestr("profile.pstats", marshal.dumps(stats.stats))
+            text = io.StringIO()
+            stats.stream = text
+            stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+            bundle.writestr("profile.txt", text.getvalue())
+        bundle.writestr("timings.json", json.dumps(timings, indent=2))
+        bundle.writestr("settings.json", json.dumps(redacted_settings(), indent=2))
+    return path
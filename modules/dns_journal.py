@@ -0,0 +1,127 @@
+# dns_journal.py
+import json
+import os
+import time
+
+from config import APP_DATA_PATH
+import dns_manager
+
+# Write-ahead journal of DNS changes. It holds each interface's original DNS
+# configuration and is written (and flushed to disk) before any adapter is
+# touched, so a crash or power loss at any point can be reverted on next start.
+JOURNAL_FILE = os.path.join(APP_DATA_PATH, 'dns_journal.json')
+JOURNAL_VERSION = 1
+
+STATE_PENDING = "pending"
+STATE_APPLIED = "applied"
+
+
+def read_journal():
+    """Returns the journal entry, {} if it is unreadable, or None if there is none."""
+    try:
+        with open(JOURNAL_FILE, "r", encoding='utf-8') as f:
+            entry = json.load(f)
+        return entry if isinstance(entry, dict) else {}
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_journal(entry):
+    """Atomically replaces the journal (temp file + fsync + rename)."""
+    os.makedirs(APP_DATA_PATH, exist_ok=True)
+    temp_path = JOURNAL_FILE + ".tmp"
+    with open(temp_path, "w", encoding='utf-8') as f:
+        json.dump(entry, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, JOURNAL_FILE)
+
+
+def begin_change(target_dns, interfaces):
+    """
+    Records the intent to point interfaces at target_dns, with their current DNS
+    configuration. Originals already in the journal are kept: they are the
+    configuration from before the app's first change, not the app's own DNS.
+    """
+    existing = read_journal() or {}
+    originals = dict(existing.get("interfaces") or {})
+    current = dns_manager.read_dns_configuration()
+
+    for name in interfaces:
+        if name in originals:
+            continue
+        original = current.get(name) or {"source": "dhcp", "servers": []}
+        if target_dns in original.get("servers", []):
+            # Already pointing at us (e.g. an earlier run without a journal): DHCP is the best guess
+            original = {"source": "dhcp", "servers": []}
+        originals[name] = original
+
+    _write_journal({
+        "version": JOURNAL_VERSION,
+        "intent": "set_dns",
+        "target_dns": target_dns,
+        "state": STATE_PENDING,
+        "updated": time.time(),
+        "interfaces": originals,
+    })
+
+
+def commit_change():
+    """Marks the journaled change as applied."""
+    entry = read_journal()
+    if entry:
+        entry["state"] = STATE_APPLIED
+        entry["updated"] = time.time()
+        _write_journal(entry)
+
+
+def clear_journal():
+    try:
+        os.remove(JOURNAL_FILE)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"Could not remove DNS journal: {e}")
+
+
+def plan_recovery(entry, actual):
+    """
+    Compares the journal with the actual configuration and returns the netsh
+    commands needed to revert it. Interfaces that no longer use the app's DNS
+    (reverted by hand, or the change never landed) are left alone.
+
+    The journal is a user-writable file read by the elevated service, so only
+    interface names found in actual (the adapters in the registry) are used.
+    """
+    target_dns = entry.get("target_dns")
+    commands = []
+    for name, original in (entry.get("interfaces") or {}).items():
+        current = actual.get(name)
+        if current is None or not isinstance(original, dict):
+            # Adapter no longer exists (or never did)
+            continue
+        if target_dns and target_dns not in current.get("servers", []):
+            continue
+        commands.extend(dns_manager.build_restore_commands(name, original))
+    return commands
+
+
+def reconcile(timeout=5):
+    """
+    Reverts whatever the journal says is still changed (the interfaces in parallel)
+    and clears the journal when done. Returns True if nothing is left to revert.
+    """
+    entry = read_journal()
+    if entry is None:
+        return True
+    actual = dns_manager.read_dns_configuration()
+    if not isinstance(entry.get("interfaces"), dict) or not entry["interfaces"] or not actual:
+        # Damaged journal, or no adapter list to check it against: fall back to DHCP on the known interfaces
+        success = dns_manager.unset_dns_parallel(timeout=timeout)
+    else:
+        success = dns_manager.run_netsh_batch(plan_recovery(entry, actual), timeout=timeout)
+    if success:
+        clear_journal()
+    return success
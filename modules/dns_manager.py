@@ -3,6 +3,42 @@ import subprocess
 import ctypes
 import sys
 import re
+import time
+import os
+import json
+import socket
+import ipaddress
+
+import metrics
+
+NETWORK_CLASS_KEY = r"SYSTEM\CurrentControlSet\Control\Network\{4D36E972-E325-11CE-BFC1-08002BE10318}"
+TCPIP_INTERFACES_KEY = r"SYSTEM\CurrentControlSet\Services\Tcpip\Parameters\Interfaces"
+
+# The interfaces found by the last successful discovery; used where a fresh
+# discovery would be too slow (e.g. restoring DNS while the app is closing)
+last_active_interfaces = []
+
+def _command_name(command):
+    executable = command.split()[0] if isinstance(command, str) else command[0]
+    return os.path.splitext(os.path.basename(executable))[0].lower()
+
+def _run(command, **kwargs):
+    """subprocess.run, timed per command for the metrics endpoint."""
+    started = time.perf_counter()
+    try:
+        return subprocess.run(command, **kwargs)
+    finally:
+        metrics.observe(metrics.SUBPROCESS_DURATION, time.perf_counter() - started, command=_command_name(command))
+
+def validate_ipv4(value):
+    """Returns value as a normalised IPv4 address; raises ValueError for anything else."""
+    if not isinstance(value, str):
+        raise ValueError(f"not an IPv4 address: {value!r}")
+    return str(ipaddress.IPv4Address(value.strip()))
+
+def _netsh_dnsservers(*args):
+    """A netsh "interface ipv4 ... dnsservers" command as an argument list (never through a shell)."""
+    return ['netsh', 'interface', 'ipv4'] + list(args)
 
 def is_admin():
     """Check if the application has admin privileges"""
@@ -18,64 +54,260 @@ def get_main_executable_path():
     return buffer.value
 
 def get_active_interface_names():
+    """Finds active network interface names and remembers them in last_active_interfaces."""
+    global last_active_interfaces
+    interfaces = _discover_active_interface_names()
+    if interfaces:
+        last_active_interfaces = interfaces
+    return interfaces
+
+# Interface types and operational status from the IP Helper API (ipifcons.h / ifdef.h)
+IF_TYPE_SOFTWARE_LOOPBACK = 24
+IF_TYPE_TUNNEL = 131
+IF_OPER_STATUS_UP = 1
+GAA_FLAGS_NAMES_ONLY = 0x0001 | 0x0002 | 0x0004 | 0x0008  # skip unicast, anycast, multicast, DNS servers
+ERROR_BUFFER_OVERFLOW = 111
+
+# Machine-readable discovery commands: numeric status codes, never localized text
+POWERSHELL_ADAPTERS_COMMAND = (
+    'powershell -NoProfile -ExecutionPolicy Bypass -Command "'
+    "[Console]::OutputEncoding = [Text.Encoding]::UTF8; "
+    "Get-NetAdapter | ForEach-Object { [pscustomobject]@{ "
+    "Name = $_.Name; Index = [int]$_.ifIndex; Status = [int]$_.InterfaceOperationalStatus; "
+    "Type = [int]$_.InterfaceType; Description = $_.InterfaceDescription } } | ConvertTo-Json -Compress"
+    '"'
+)
+WMIC_ADAPTERS_COMMAND = (
+    'wmic path Win32_NetworkAdapter where "NetConnectionStatus=2" get InterfaceIndex,NetConnectionID /format:csv'
+)
+
+
+def _is_usable_adapter(status, if_type):
+    return status == IF_OPER_STATUS_UP and if_type not in (IF_TYPE_SOFTWARE_LOOPBACK, IF_TYPE_TUNNEL)
+
+
+def parse_powershell_adapters(output):
     """
-    Finds active network interface names using a three-stage fallback system
-    to ensure maximum compatibility across all Windows versions.
+    Parses the ConvertTo-Json output of POWERSHELL_ADAPTERS_COMMAND into adapters
+    ({"name", "index", "type", "description"}) that are up. A single adapter comes as an object, not a list.
     """
-    # Stage 1: Best and most reliable method (WMIC)
-    try:
-        command = 'wmic path Win32_NetworkAdapter where "NetConnectionStatus=2" get NetConnectionID'
-        result = subprocess.run(
-            command, shell=True, capture_output=True, text=True, check=True,
-            encoding='utf-8', creationflags=subprocess.CREATE_NO_WINDOW
-        )
-        lines = result.stdout.strip().split('\n')
-        active_interfaces = [name.strip() for name in lines[1:] if name.strip()]
-        if active_interfaces:
-            return active_interfaces
-    except Exception:
+    output = output.strip().lstrip("\ufeff")
+    if not output:
+        return []
+    records = json.loads(output)
+    if isinstance(records, dict):
+        records = [records]
+    adapters = []
+    for record in records:
+        try:
+            name, index = record["Name"], int(record["Index"])
+            status, if_type = int(record["Status"]), int(record.get("Type") or 0)
+        except (KeyError, TypeError, ValueError):
+            continue
+        if name and _is_usable_adapter(status, if_type):
+            adapters.append({"name": name, "index": index, "type": if_type,
+                             "description": record.get("Description") or ""})
+    return adapters
+
+
+def parse_wmic_csv(output):
+    """
+    Parses "wmic ... get InterfaceIndex,NetConnectionID /format:csv" output.
+    Columns are Node,InterfaceIndex,NetConnectionID (alphabetical after Node);
+    the connection status was already filtered by its numeric code in the query.
+    """
+    adapters = []
+    header_seen = False
+    for line in output.replace("\r", "").split("\n"):
+        if not line.strip():
+            continue
+        fields = line.split(",")
+        if not header_seen:
+            header_seen = True
+            continue
+        if len(fields) < 3:
+            continue
+        # The adapter name is the last column and may itself contain commas
+        name = ",".join(fields[2:]).strip()
+        try:
+            index = int(fields[1])
+        except ValueError:
+            continue
+        if name:
+            adapters.append({"name": name, "index": index, "type": None, "description": ""})
+    return adapters
+
+
+def _adapters_from_ip_helper():
+    """Reads the adapters straight from GetAdaptersAddresses: no process, no text parsing."""
+    if sys.platform != "win32":
+        return []
+
+    class IP_ADAPTER_ADDRESSES(ctypes.Structure):
         pass
 
-    # Stage 2: Modern method (PowerShell)
-    try:
-        command = "powershell -ExecutionPolicy Bypass -Command \"Get-NetAdapter -Physical | Where-Object { $_.Status -eq 'Up' } | ForEach-Object { $_.Name }\""
-        result = subprocess.run(
-            command, shell=True, capture_output=True, text=True, check=True,
-            encoding='utf-8', creationflags=subprocess.CREATE_NO_WINDOW
+    # Only the leading fields are declared; the list is walked through Next
+    IP_ADAPTER_ADDRESSES._fields_ = [
+        ("Length", ctypes.c_ulong),
+        ("IfIndex", ctypes.c_ulong),
+        ("Next", ctypes.POINTER(IP_ADAPTER_ADDRESSES)),
+        ("AdapterName", ctypes.c_char_p),
+        ("FirstUnicastAddress", ctypes.c_void_p),
+        ("FirstAnycastAddress", ctypes.c_void_p),
+        ("FirstMulticastAddress", ctypes.c_void_p),
+        ("FirstDnsServerAddress", ctypes.c_void_p),
+        ("DnsSuffix", ctypes.c_wchar_p),
+        ("Description", ctypes.c_wchar_p),
+        ("FriendlyName", ctypes.c_wchar_p),
+        ("PhysicalAddress", ctypes.c_ubyte * 8),
+        ("PhysicalAddressLength", ctypes.c_ulong),
+        ("Flags", ctypes.c_ulong),
+        ("Mtu", ctypes.c_ulong),
+        ("IfType", ctypes.c_ulong),
+        ("OperStatus", ctypes.c_int),
+    ]
+
+    size = ctypes.c_ulong(16 * 1024)
+    for _ in range(3):
+        buffer = ctypes.create_string_buffer(size.value)
+        result = ctypes.windll.iphlpapi.GetAdaptersAddresses(
+            socket.AF_INET, GAA_FLAGS_NAMES_ONLY, None, buffer, ctypes.byref(size)
         )
-        active_interfaces = [name.strip() for name in result.stdout.strip().split('\n') if name.strip()]
-        if active_interfaces:
-            return active_interfaces
-    except Exception:
-        pass
+        if result != ERROR_BUFFER_OVERFLOW:
+            break
+    if result != 0:
+        return []
+
+    adapters = []
+    entry = ctypes.cast(buffer, ctypes.POINTER(IP_ADAPTER_ADDRESSES))
+    while entry:
+        adapter = entry.contents
+        if adapter.FriendlyName and _is_usable_adapter(adapter.OperStatus, adapter.IfType):
+            adapters.append({"name": adapter.FriendlyName, "index": adapter.IfIndex, "type": adapter.IfType,
+                             "description": adapter.Description or ""})
+        entry = adapter.Next
+    return adapters
+
 
-    # Stage 3: Legacy method (netsh)
+def _adapters_from_command(command, parse):
+    result = _run(
+        command, shell=True, capture_output=True, text=True, check=True,
+        encoding='utf-8', errors='replace', creationflags=subprocess.CREATE_NO_WINDOW
+    )
+    return parse(result.stdout)
+
+
+def discover_active_adapters():
+    """
+    Returns the adapters that are up as [{"name", "index", "type", "description"}], using structured
+    sources only, so the result does not depend on the Windows display language:
+    the IP Helper API first (no process at all), then PowerShell JSON, then WMIC CSV.
+    """
+    stages = (
+        _adapters_from_ip_helper,
+        lambda: _adapters_from_command(POWERSHELL_ADAPTERS_COMMAND, parse_powershell_adapters),
+        lambda: _adapters_from_command(WMIC_ADAPTERS_COMMAND, parse_wmic_csv),
+    )
+    for stage in stages:
+        try:
+            adapters = stage()
+        except Exception:
+            continue
+        if adapters:
+            return adapters
+    return []
+
+
+def get_default_route_metrics():
+    """
+    {interface index: lowest metric} of the IPv4 default routes, read with
+    GetIpForwardTable (no process spawn); {} when it is not available.
+    """
+    if sys.platform != "win32":
+        return {}
     try:
-        command = 'netsh interface ipv4 show interfaces'
-        result = subprocess.run(
-            command, shell=True, capture_output=True, text=True, check=True,
-            encoding='utf-8', creationflags=subprocess.CREATE_NO_WINDOW
-        )
-        lines = result.stdout.strip().split('\n')
-        active_interfaces = []
-        for line in lines[2:]:
-            if 'connected' in line.lower():
-                parts = line.strip().split()
-                interface_name = " ".join(parts[3:])
-                active_interfaces.append(interface_name)
-        if active_interfaces:
-            return active_interfaces
+        size = ctypes.c_ulong(0)
+        iphlpapi = ctypes.windll.iphlpapi
+        iphlpapi.GetIpForwardTable(None, ctypes.byref(size), False)
+        buffer = ctypes.create_string_buffer(size.value)
+        if iphlpapi.GetIpForwardTable(buffer, ctypes.byref(size), False) != 0:
+            return {}
     except Exception:
-        pass
+        return {}
 
-    return []
+    # MIB_IPFORWARDTABLE: a DWORD count followed by MIB_IPFORWARDROWs of 14 DWORDs
+    # (dest, mask, policy, next hop, if index, type, proto, age, next hop AS, metric1..5)
+    words = (ctypes.c_uint32 * (size.value // 4)).from_buffer(buffer)
+    metrics_by_index = {}
+    for row in range(words[0]):
+        dest, mask, if_index, metric = (words[1 + row * 14 + offset] for offset in (0, 1, 4, 9))
+        if dest == 0 and mask == 0:
+            metrics_by_index[if_index] = min(metric, metrics_by_index.get(if_index, metric))
+    return metrics_by_index
+
+
+ADAPTER_POLICY_DEFAULT_ROUTE = "default_route"
+ADAPTER_POLICY_PHYSICAL = "physical"
+ADAPTER_POLICY_LIST = "list"
+ADAPTER_POLICY_ALL = "all"
+# Driver descriptions of virtual adapters (vendor strings, not translated)
+VIRTUAL_ADAPTER_MARKERS = (
+    "hyper-v", "virtual", "vmware", "virtualbox", "tap-windows", "wintun", "wireguard",
+    "tunnel", "loopback", "vpn", "wsl", "docker", "npcap",
+)
+
+
+def is_physical_adapter(adapter):
+    description = (adapter.get("description") or "").lower()
+    name = adapter["name"].lower()
+    return not any(marker in description for marker in VIRTUAL_ADAPTER_MARKERS) and not name.startswith("vethernet")
+
+
+def select_adapters(adapters, policy, default_routes, allow=(), deny=()):
+    """
+    Picks the adapters DNS changes should touch, best first.
+      default_route: the adapter carrying the default route with the lowest metric
+      physical:      every adapter that is not a known virtual one
+      list:          the adapters named in allow (all of them if allow is empty)
+      all:           every active adapter
+    Adapters named in deny are never used. When a policy matches nothing (e.g. no
+    default route yet), the physical adapters are used, or failing that all of them.
+    """
+    candidates = [adapter for adapter in adapters if adapter["name"] not in deny]
+    # Default-route adapters by metric first, then physical before virtual
+    candidates.sort(key=lambda adapter: (
+        default_routes.get(adapter["index"], float("inf")), not is_physical_adapter(adapter)
+    ))
+
+    if policy == ADAPTER_POLICY_DEFAULT_ROUTE:
+        chosen = [adapter for adapter in candidates if adapter["index"] in default_routes][:1]
+    elif policy == ADAPTER_POLICY_PHYSICAL:
+        chosen = [adapter for adapter in candidates if is_physical_adapter(adapter)]
+    elif policy == ADAPTER_POLICY_LIST and allow:
+        chosen = [adapter for adapter in candidates if adapter["name"] in allow]
+    else:
+        chosen = candidates
+    return chosen or [adapter for adapter in candidates if is_physical_adapter(adapter)] or candidates
+
+
+def _discover_active_interface_names():
+    from config import app_settings
+
+    adapters = discover_active_adapters()
+    policy = app_settings.get("adapter_policy", ADAPTER_POLICY_DEFAULT_ROUTE)
+    default_routes = get_default_route_metrics() if policy == ADAPTER_POLICY_DEFAULT_ROUTE else {}
+    selected = select_adapters(
+        adapters, policy, default_routes,
+        allow=app_settings.get("adapter_allow") or (), deny=app_settings.get("adapter_deny") or ()
+    )
+    return [adapter["name"] for adapter in selected]
 
 def get_current_dns_servers(interface_name):
     """Gets the currently configured DNS servers for a specific interface."""
     try:
-        command = f'netsh interface ipv4 show dnsservers name="{interface_name}"'
-        result = subprocess.run(
-            command, shell=True, capture_output=True, text=True, check=True,
+        result = _run(
+            _netsh_dnsservers('show', 'dnsservers', f'name={interface_name}'),
+            capture_output=True, text=True, check=True,
             encoding='utf-8', creationflags=subprocess.CREATE_NO_WINDOW
         )
         dns_servers = re.findall(r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}', result.stdout)
@@ -83,6 +315,18 @@ def get_current_dns_servers(interface_name):
     except (subprocess.CalledProcessError, FileNotFoundError):
         return []
 
+def capture_dns_servers(exclude=()):
+    """
+    Collects the DNS servers the active interfaces use right now (normally the ones
+    handed out by DHCP), so they can still be reached after set_dns replaces them.
+    """
+    servers = []
+    for interface in get_active_interface_names():
+        for dns in get_current_dns_servers(interface):
+            if dns not in servers and dns not in exclude and not dns.startswith("127."):
+                servers.append(dns)
+    return servers
+
 def check_dns_status(target_dns):
     """Checks if the app's DNS is set on any active network interface."""
     if not target_dns:
@@ -96,23 +340,33 @@ def check_dns_status(target_dns):
 
     return False
 
-def set_dns(dns_ip1, dns_ip2=None):
-    """Set DNS on all active interfaces"""
+def set_dns(dns_ip1, dns_ip2=None, before_change=None):
+    """
+    Set DNS on all active interfaces.
+    before_change(interfaces) is called right before anything is modified,
+    so the caller can journal the original configuration.
+    Raises ValueError when a server is not an IPv4 address.
+    """
+    dns_ip1 = validate_ipv4(dns_ip1)
+    dns_ip2 = validate_ipv4(dns_ip2) if dns_ip2 else None
     interfaces = get_active_interface_names()
     if not interfaces:
         return {"success": False, "error_key": "no_active_interface"}
     
+    if before_change:
+        before_change(interfaces)
+    
     for name in interfaces:
         try:
             flags = subprocess.CREATE_NO_WINDOW
-            subprocess.run(
-                f'netsh interface ipv4 set dnsservers name="{name}" static {dns_ip1} primary',
-                check=True, shell=True, capture_output=True, creationflags=flags
+            _run(
+                _netsh_dnsservers('set', 'dnsservers', f'name={name}', 'static', dns_ip1, 'primary'),
+                check=True, capture_output=True, creationflags=flags
             )
             if dns_ip2:
-                subprocess.run(
-                    f'netsh interface ipv4 add dnsservers name="{name}" address={dns_ip2} index=2',
-                    shell=True, capture_output=True, creationflags=flags
+                _run(
+                    _netsh_dnsservers('add', 'dnsservers', f'name={name}', f'address={dns_ip2}', 'index=2'),
+                    capture_output=True, creationflags=flags
                 )
             return {"success": True, "dns_ip": dns_ip1}
         except subprocess.CalledProcessError:
@@ -127,35 +381,150 @@ def unset_dns():
         return {"success": False, "error_key": "no_active_interface"}
     
     success = any(
-        subprocess.run(
-            f'netsh interface ipv4 set dnsservers name="{name}" source=dhcp',
-            shell=True, capture_output=True, creationflags=subprocess.CREATE_NO_WINDOW
+        _run(
+            _netsh_dnsservers('set', 'dnsservers', f'name={name}', 'source=dhcp'),
+            capture_output=True, creationflags=subprocess.CREATE_NO_WINDOW
         ).returncode == 0
         for name in interfaces
     )
     
     return {"success": success, "error_key": "dns_unset_fail_message"}
 
-def unset_dns_synchronously():
+def unset_dns_parallel(interfaces=None, timeout=5):
     """
-    A simplified, synchronous function to unset DNS on all active interfaces.
-    This is used for the exit process to ensure DNS is reset before closing.
+    Resets DNS to DHCP on the given interfaces (default: the last known ones) with
+    one netsh process per interface running in parallel. Processes still running
+    after the timeout are killed, so this never takes much longer than timeout.
     """
-    interfaces = get_active_interface_names()
+    interfaces = interfaces or last_active_interfaces or get_active_interface_names()
     if not interfaces:
         return False
 
-    success = False
+    deadline = time.monotonic() + timeout
+    started = time.perf_counter()
+    processes = []
     for name in interfaces:
         try:
-            result = subprocess.run(
-                f'netsh interface ipv4 set dnsservers name="{name}" source=dhcp',
-                shell=True, capture_output=True, check=True,
+            processes.append(subprocess.Popen(
+                _netsh_dnsservers('set', 'dnsservers', f'name={name}', 'source=dhcp'),
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
                 creationflags=subprocess.CREATE_NO_WINDOW
-            )
-            if result.returncode == 0:
+            ))
+        except OSError:
+            continue
+
+    success = False
+    for process in processes:
+        try:
+            if process.wait(max(0, deadline - time.monotonic())) == 0:
                 success = True
-        except subprocess.CalledProcessError:
+        except subprocess.TimeoutExpired:
+            process.kill()
+        metrics.observe(metrics.SUBPROCESS_DURATION, time.perf_counter() - started, command="netsh")
+
+    return success
+
+def _split_servers(value):
+    return [ip for ip in re.split(r'[,\s]+', value or '') if ip and ip != "0.0.0.0"]
+
+def read_dns_configuration():
+    """
+    Reads the IPv4 DNS configuration of every adapter in one pass from the registry,
+    without spawning a process. Returns {name: {"source": "static"|"dhcp", "servers": [...]}},
+    or {} when the registry is not available.
+    """
+    try:
+        import winreg
+    except ImportError:
+        return {}
+
+    configuration = {}
+    try:
+        network_key = winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, NETWORK_CLASS_KEY)
+    except OSError:
+        return {}
+
+    with network_key:
+        index = 0
+        while True:
+            try:
+                guid = winreg.EnumKey(network_key, index)
+            except OSError:
+                break
+            index += 1
+            try:
+                with winreg.OpenKey(network_key, guid + r"\Connection") as connection_key:
+                    name = winreg.QueryValueEx(connection_key, "Name")[0]
+                with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, TCPIP_INTERFACES_KEY + "\\" + guid) as tcpip_key:
+                    values = {}
+                    for value_name in ("NameServer", "DhcpNameServer"):
+                        try:
+                            values[value_name] = winreg.QueryValueEx(tcpip_key, value_name)[0]
+                        except OSError:
+                            values[value_name] = ""
+            except OSError:
+                continue
+
+            static_servers = _split_servers(values["NameServer"])
+            if static_servers:
+                configuration[name] = {"source": "static", "servers": static_servers}
+            else:
+                configuration[name] = {"source": "dhcp", "servers": _split_servers(values["DhcpNameServer"])}
+
+    return configuration
+
+def build_restore_commands(name, original):
+    """
+    netsh commands (argument lists) that put an interface back to its original DNS configuration.
+    Servers that are not IPv4 addresses (the journal is a user-writable file) are dropped.
+    """
+    servers = []
+    for server in original.get("servers") or []:
+        try:
+            servers.append(validate_ipv4(server))
+        except ValueError:
             continue
-    
-    return success
\ No newline at end of file
+    if original.get("source") != "static" or not servers:
+        return [['interface', 'ipv4', 'set', 'dnsservers', f'name={name}', 'source=dhcp']]
+
+    commands = [['interface', 'ipv4', 'set', 'dnsservers', f'name={name}', 'static', servers[0], 'primary']]
+    for index, server in enumerate(servers[1:], start=2):
+        commands.append(['interface', 'ipv4', 'add', 'dnsservers', f'name={name}', f'address={server}', f'index={index}'])
+    return commands
+
+def _run_netsh_each(commands, timeout):
+    """One netsh process per command, in order, with list arguments (no script file, no code page)."""
+    deadline = time.monotonic() + timeout
+    success = True
+    for args in commands:
+        try:
+            result = _run(
+                ['netsh'] + list(args), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                timeout=max(0.1, deadline - time.monotonic()), creationflags=subprocess.CREATE_NO_WINDOW
+            )
+        except (OSError, subprocess.TimeoutExpired):
+            return False
+        success = success and result.returncode == 0
+    return success
+
+def run_netsh_batch(commands, timeout=5):
+    """
+    Runs netsh commands (argument lists): the commands of one interface in order,
+    different interfaces in parallel. Returns True if every command succeeded.
+
+    There is no netsh -f script: this runs elevated, and a script file in the
+    user's %TEMP% could be rewritten by unelevated code before netsh read it.
+    """
+    if not commands:
+        return True
+
+    groups = {}
+    for args in commands:
+        name = next((arg for arg in args if arg.startswith('name=')), None)
+        groups.setdefault(name, []).append(args)
+    if len(groups) == 1:
+        return _run_netsh_each(commands, timeout)
+
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=len(groups), thread_name_prefix="netsh") as pool:
+        return all(list(pool.map(lambda group: _run_netsh_each(group, timeout), groups.values())))
@@ -0,0 +1,112 @@
+# dns_rules.py
+import threading
+
+from dns_transport import UdpUpstream, get_query_name, upstream_from_spec
+
+# Special upstream names a rule can point to
+UPSTREAM_SUBSCRIPTION = "subscription"
+UPSTREAM_DHCP = "dhcp"
+
+_MATCH = "$"
+
+
+class SuffixTrie:
+    """
+    Domain suffix trie keyed by labels from the TLD down.
+    A lookup walks at most one node per label of the queried name, so its cost
+    does not grow with the number of rules. The longest matching suffix wins.
+    """
+
+    def __init__(self):
+        self._root = {}
+
+    def add(self, suffix, value):
+        node = self._root
+        for label in reversed(suffix.strip(".").lower().split(".")):
+            node = node.setdefault(label, {})
+        node[_MATCH] = value
+
+    def lookup(self, name):
+        node = self._root
+        match = node.get(_MATCH)
+        for label in reversed(name.strip(".").lower().split(".")):
+            node = node.get(label)
+            if node is None:
+                break
+            match = node.get(_MATCH, match)
+        return match
+
+    def values(self):
+        """Every value stored in the trie (without duplicates)."""
+        found, nodes = [], [self._root]
+        while nodes:
+            node = nodes.pop()
+            for key, child in node.items():
+                if key == _MATCH:
+                    if child not in found:
+                        found.append(child)
+                else:
+                    nodes.append(child)
+        return found
+
+
+def compile_rules(rules):
+    """
+    Compiles the 'dns_rules' setting, a list like
+    [{"suffix": "corp.example.com", "upstream": "dhcp"}], into a SuffixTrie.
+    Malformed entries are skipped.
+    """
+    trie = SuffixTrie()
+    for rule in rules or []:
+        if not isinstance(rule, dict):
+            continue
+        suffix = str(rule.get("suffix", "")).strip()
+        upstream = str(rule.get("upstream", "")).strip()
+        if suffix and upstream:
+            trie.add(suffix, upstream)
+    return trie
+
+
+class RoutingUpstream:
+    """
+    Sends each query to the upstream chosen by the split-horizon rules.
+
+    The rule upstreams are all built (and their host names resolved) here, while
+    the system DNS still points at the old resolver: built later, from inside the
+    forwarder, a host name lookup would go through the forwarder itself.
+    """
+
+    def __init__(self, trie, default_upstream, dhcp_servers=None):
+        self.trie = trie
+        self.default_upstream = default_upstream
+        self.dhcp_servers = [ip for ip in (dhcp_servers or []) if ip]
+        self._upstreams = {UPSTREAM_SUBSCRIPTION: default_upstream}
+        self._lock = threading.Lock()
+        for spec in trie.values():
+            self._get_upstream(spec)
+
+    def _get_upstream(self, spec):
+        # Forwarder threads call this concurrently; each upstream (and its connection pool) is built once
+        with self._lock:
+            upstream = self._upstreams.get(spec)
+            if upstream is None:
+                upstream = self._create_upstream(spec)
+                self._upstreams[spec] = upstream
+            return upstream
+
+    def _create_upstream(self, spec):
+        if spec == UPSTREAM_DHCP:
+            # No DHCP servers were captured: let the subscription resolver try
+            return UdpUpstream(self.dhcp_servers[0]) if self.dhcp_servers else self.default_upstream
+        # An unusable rule target falls back to the subscription resolver
+        return upstream_from_spec(spec) or self.default_upstream
+
+    def query(self, packet):
+        name = get_query_name(packet)
+        spec = self.trie.lookup(name) if name else None
+        upstream = self._get_upstream(spec) if spec else self.default_upstream
+        return upstream.query(packet)
+
+    def close(self):
+        for upstream in set(self._upstreams.values()):
+            upstream.close()
@@ -0,0 +1,768 @@
+# dns_service.py
+"""
+Privileged DNS service.
+
+Changing adapter DNS needs admin rights. Instead of elevating the whole GUI on
+every start, a small service process (the app started with --dns-service, once,
+through UAC) does the privileged work. It stays running while a GUI is connected
+and exits SERVICE_IDLE_TIMEOUT after the last one left. The unprivileged GUI talks
+to it over a loopback socket:
+
+    server -> {"nonce": "<hex>"}
+    client -> {"method": "...", "params": {...}, "mac": HMAC-SHA256(key, nonce + body)}
+    server -> {"result": ...} or {"error": "..."}, plus the nonce for the next request
+
+The key and port are published in dns_service.json in the user's app data folder,
+so only processes that can read it can call the service, and every request is
+bound to a fresh nonce so captured requests cannot be replayed. UAC may run the
+service as another administrator, so the GUI passes its own folder (--data-dir)
+and a launch id on the command line; the service publishes the id, which tells
+the GUI that the service it finds is the one it just launched.
+
+Any process of the same user can read that file, so the key alone does not keep
+unelevated code from driving an elevated process. The service therefore also
+checks on Windows that the connecting process runs the app's own executable,
+accepts only the methods in METHODS with validated parameters (IPv4 addresses,
+never free text that reaches netsh), and only touches adapters that exist.
+
+DnsControl is the service core. The elevated GUI (no service) uses it in-process,
+so both paths journal and apply changes the same way. Between requests it keeps
+the interface list and DNS status warm, so status polls do not spawn processes.
+"""
+import collections
+import hmac
+import hashlib
+import json
+import os
+import secrets
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+from config import APP_DATA_PATH, SETTINGS_FILE, SERVICE_ARG, DATA_DIR_ARG, load_settings, settings_lock
+from single_instance import InstanceLock
+from dns_manager import validate_ipv4
+import metrics
+
+SERVICE_FILE = os.path.join(APP_DATA_PATH, 'dns_service.json')
+SERVICE_LOCK_FILE = os.path.join(APP_DATA_PATH, 'dns_service.lock')
+LAUNCH_ID_ARG = "--launch-id"
+
+HEALTH_INTERVAL = 5
+# A cached status older than this is re-checked on request
+STATUS_MAX_AGE = 6
+INTERFACES_MAX_AGE = 30
+# Adapters pointed at the GUI's local forwarder are restored after this many failed probes in a row
+FORWARDER_MAX_MISSES = 3
+# The service exits after this long without a connected GUI
+SERVICE_IDLE_TIMEOUT = 10 * 60
+SERVICE_START_TIMEOUT = 20
+CALL_TIMEOUT = 30
+MAX_MESSAGE_SIZE = 64 * 1024
+MAX_TIMEOUT = 60
+
+TCP_TABLE_OWNER_PID_ALL = 5
+ERROR_INSUFFICIENT_BUFFER = 122
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+
+
+def _optional_ipv4(value):
+    return validate_ipv4(value) if value else None
+
+
+def _address_list(value):
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        raise ValueError("expected a list of addresses")
+    return value
+
+
+def _timeout(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 < value <= MAX_TIMEOUT:
+        raise ValueError(f"timeout must be between 0 and {MAX_TIMEOUT} seconds")
+    return value
+
+
+# The only calls the service accepts: method -> {parameter: validator}
+METHODS = {
+    "health": {},
+    "check_dns_status": {"target_dns": _optional_ipv4},
+    "capture_dns_servers": {"exclude": _address_list},
+    "apply_dns": {"dns_ip1": validate_ipv4, "dns_ip2": _optional_ipv4},
+    "unset_dns": {},
+    "reconcile": {"timeout": _timeout},
+    "restore_dns": {"timeout": _timeout},
+    "metrics": {},
+    "shutdown": {},
+}
+
+
+def validate_params(method, params):
+    """The params of a METHODS call, validated; raises ValueError for anything unexpected."""
+    if not isinstance(params, dict):
+        raise ValueError("params must be an object")
+    validators = METHODS[method]
+    unknown = set(params) - set(validators)
+    if unknown:
+        raise ValueError(f"unexpected parameters {sorted(unknown)}")
+    return {name: validators[name](value) for name, value in params.items()}
+
+
+class DnsServiceError(Exception):
+    """The service could not be reached or rejected the request."""
+
+
+class SystemDnsBackend:
+    """The real backend: netsh and the registry through dns_manager, plus the DNS journal."""
+
+    def __init__(self, settings_file=SETTINGS_FILE):
+        import dns_manager
+        import dns_journal
+        self.dns_manager = dns_manager
+        self.dns_journal = dns_journal
+        self.settings_file = settings_file
+        self._settings_mtime = None
+
+    def _reload_settings(self):
+        """Picks up the adapter selection the GUI saved since the last call."""
+        try:
+            mtime = os.stat(self.settings_file).st_mtime_ns
+        except OSError:
+            return
+        with settings_lock:
+            if mtime != self._settings_mtime:
+                self._settings_mtime = mtime
+                load_settings()
+
+    def active_interfaces(self):
+        self._reload_settings()
+        return self.dns_manager.get_active_interface_names()
+
+    def check_dns_status(self, target_dns, interfaces):
+        # One registry read instead of a netsh run per interface
+        configuration = self.dns_manager.read_dns_configuration()
+        if not configuration:
+            return self.dns_manager.check_dns_status(target_dns)
+        return any(target_dns in configuration.get(name, {}).get("servers", []) for name in interfaces)
+
+    def capture_dns_servers(self, exclude):
+        self._reload_settings()
+        return self.dns_manager.capture_dns_servers(exclude=exclude)
+
+    def set_dns(self, dns_ip1, dns_ip2, before_change):
+        self._reload_settings()
+        return self.dns_manager.set_dns(dns_ip1, dns_ip2, before_change=before_change)
+
+    def unset_dns(self):
+        self._reload_settings()
+        return self.dns_manager.unset_dns()
+
+    def begin_change(self, target_dns, interfaces):
+        self.dns_journal.begin_change(target_dns, interfaces)
+
+    def commit_change(self):
+        self.dns_journal.commit_change()
+
+    def clear_journal(self):
+        self.dns_journal.clear_journal()
+
+    def reconcile(self, timeout):
+        return self.dns_journal.reconcile(timeout)
+
+    def restore_dns(self, timeout):
+        from shutdown import restore_dns
+        return restore_dns(timeout)
+
+
+class FakeDnsBackend:
+    """In-memory backend for running the service and RPC without Windows or admin rights."""
+
+    def __init__(self, interfaces=("Ethernet",), dhcp_servers=("192.168.1.1",)):
+        self.configuration = {name: {"source": "dhcp", "servers": list(dhcp_servers)} for name in interfaces}
+        self.journal = None
+        self.calls = collections.Counter()
+
+    def active_interfaces(self):
+        self.calls["active_interfaces"] += 1
+        return list(self.configuration)
+
+    def check_dns_status(self, target_dns, interfaces):
+        self.calls["check_dns_status"] += 1
+        return any(target_dns in self.configuration[name]["servers"] for name in interfaces if name in self.configuration)
+
+    def capture_dns_servers(self, exclude):
+        return [server for config in self.configuration.values() for server in config["servers"]
+                if server not in exclude]
+
+    def set_dns(self, dns_ip1, dns_ip2, before_change):
+        interfaces = list(self.configuration)
+        if not interfaces:
+            return {"success": False, "error_key": "no_active_interface"}
+        if before_change:
+            before_change(interfaces)
+        for name in interfaces:
+            self.configuration[name] = {"source": "static", "servers": [ip for ip in (dns_ip1, dns_ip2) if ip]}
+        return {"success": True, "dns_ip": dns_ip1}
+
+    def unset_dns(self):
+        for name in self.configuration:
+            self.configuration[name] = {"source": "dhcp", "servers": []}
+        return {"success": True, "error_key": "dns_unset_fail_message"}
+
+    def begin_change(self, target_dns, interfaces):
+        originals = (self.journal or {}).get("interfaces") or {
+            name: dict(self.configuration[name]) for name in interfaces
+        }
+        self.journal = {"target_dns": target_dns, "state": "pending", "interfaces": originals}
+
+    def commit_change(self):
+        if self.journal:
+            self.journal["state"] = "applied"
+
+    def clear_journal(self):
+        self.journal = None
+
+    def reconcile(self, timeout):
+        if self.journal:
+            self.configuration.update(self.journal["interfaces"])
+            self.journal = None
+        return True
+
+    def restore_dns(self, timeout):
+        if self.journal:
+            return self.reconcile(timeout)
+        return self.unset_dns()["success"]
+
+
+class DnsControl:
+    """
+    The DNS operations the GUI needs, journaled and serialised, with warm caches.
+    Results are plain JSON-compatible values so the same calls work over RPC.
+
+    While the adapters point at a loopback address (the GUI's local forwarder),
+    the health monitor probes that forwarder. If the GUI crashed or was killed,
+    the probes fail and the original DNS is restored, so the machine does not
+    stay without name resolution until the app is started again.
+    """
+
+    def __init__(self, backend, health_interval=HEALTH_INTERVAL, clock=time.monotonic, probe_forwarder=None):
+        self.backend = backend
+        self.health_interval = health_interval
+        self.clock = clock
+        if probe_forwarder is None:
+            from local_forwarder import probe as probe_forwarder
+        self.probe_forwarder = probe_forwarder
+        self._forwarder_ip = None
+        self._forwarder_misses = 0
+        self._change_lock = threading.RLock()
+        self._cache_lock = threading.Lock()
+        self._interfaces = []
+        self._interfaces_at = None
+        self._status = {}
+        self._last_target = None
+        self._stop = threading.Event()
+        self._monitor = None
+
+    def start_monitor(self):
+        self._monitor = threading.Thread(target=self._monitor_loop, name="dns-health", daemon=True)
+        self._monitor.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _monitor_loop(self):
+        while not self._stop.wait(self.health_interval):
+            try:
+                # Interface discovery spawns processes, so it only runs when the list is stale
+                self.interfaces()
+                if self._last_target:
+                    self._refresh_status(self._last_target)
+                self.check_forwarder()
+            except Exception as e:
+                print(f"DNS health check failed: {e!r}")
+
+    def _refresh_interfaces(self):
+        interfaces = self.backend.active_interfaces()
+        with self._cache_lock:
+            if interfaces:
+                self._interfaces = interfaces
+            self._interfaces_at = self.clock()
+            return self._interfaces
+
+    def interfaces(self):
+        with self._cache_lock:
+            fresh = self._interfaces_at is not None and self.clock() - self._interfaces_at < INTERFACES_MAX_AGE
+            if fresh and self._interfaces:
+                return list(self._interfaces)
+        return list(self._refresh_interfaces())
+
+    def _refresh_status(self, target_dns):
+        connected = bool(self.backend.check_dns_status(target_dns, self.interfaces()))
+        with self._cache_lock:
+            self._status[target_dns] = (connected, self.clock())
+        return connected
+
+    def check_forwarder(self):
+        """
+        One probe of the local forwarder the adapters point at, if any.
+        Returns False when the forwarder was given up on and DNS was restored.
+        """
+        forwarder_ip = self._forwarder_ip
+        if forwarder_ip is None:
+            return True
+        if self.probe_forwarder(forwarder_ip):
+            self._forwarder_misses = 0
+            return True
+        self._forwarder_misses += 1
+        if self._forwarder_misses < FORWARDER_MAX_MISSES:
+            return True
+        with self._change_lock:
+            if self._forwarder_ip != forwarder_ip:
+                # The GUI changed DNS meanwhile
+                return True
+            print(f"The local forwarder on {forwarder_ip} stopped answering: restoring DNS")
+            self.restore_dns()
+        return False
+
+    def _watch_forwarder(self, dns_ip):
+        """Probes dns_ip from now on if it is a loopback address; stops probing otherwise."""
+        import ipaddress
+        self._forwarder_ip = dns_ip if dns_ip and ipaddress.ip_address(dns_ip).is_loopback else None
+        self._forwarder_misses = 0
+
+    def _invalidate(self):
+        with self._cache_lock:
+            self._interfaces_at = None
+            self._status.clear()
+
+    def health(self):
+        with self._cache_lock:
+            return {"pid": os.getpid(), "interfaces": list(self._interfaces)}
+
+    def check_dns_status(self, target_dns):
+        if not target_dns:
+            return False
+        self._last_target = target_dns
+        with self._cache_lock:
+            cached = self._status.get(target_dns)
+        if cached and self.clock() - cached[1] < STATUS_MAX_AGE:
+            return cached[0]
+        return self._refresh_status(target_dns)
+
+    def capture_dns_servers(self, exclude=()):
+        return self.backend.capture_dns_servers(list(exclude))
+
+    def apply_dns(self, dns_ip1, dns_ip2=None):
+        """
+        Points the active adapters at dns_ip1 (and dns_ip2), journaling their original DNS first.
+        Raises ValueError when a server is not an IPv4 address.
+        """
+        dns_ip1, dns_ip2 = validate_ipv4(dns_ip1), _optional_ipv4(dns_ip2)
+        with self._change_lock:
+            journaled = []
+
+            def journal_change(interfaces):
+                self.backend.begin_change(dns_ip1, interfaces)
+                journaled.append(dns_ip1)
+
+            try:
+                result = self.backend.set_dns(dns_ip1, dns_ip2, journal_change)
+                if result["success"]:
+                    self.backend.commit_change()
+                    self._watch_forwarder(dns_ip1)
+                elif journaled:
+                    # The change failed part-way: put back whatever did change
+                    self.backend.reconcile(5)
+                return result
+            finally:
+                self._invalidate()
+
+    def unset_dns(self):
+        with self._change_lock:
+            try:
+                result = self.backend.unset_dns()
+                if result["success"]:
+                    self.backend.clear_journal()
+                    self._watch_forwarder(None)
+                return result
+            finally:
+                self._invalidate()
+
+    def reconcile(self, timeout=5):
+        with self._change_lock:
+            try:
+                success = self.backend.reconcile(timeout)
+                if success:
+                    self._watch_forwarder(None)
+                return success
+            finally:
+                self._invalidate()
+
+    def restore_dns(self, timeout=5):
+        with self._change_lock:
+            try:
+                success = self.backend.restore_dns(timeout)
+                if success:
+                    self._watch_forwarder(None)
+                return success
+            finally:
+                self._invalidate()
+
+
+def _sign(key, nonce, method, params):
+    body = json.dumps({"method": method, "params": params}, sort_keys=True, separators=(",", ":"))
+    return hmac.new(key, nonce + body.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def _send_message(stream, message):
+    stream.write(json.dumps(message).encode("utf-8") + b"\n")
+    stream.flush()
+
+
+def _read_message(stream):
+    line = stream.readline(MAX_MESSAGE_SIZE)
+    if not line:
+        raise ConnectionError("connection closed")
+    return json.loads(line)
+
+
+def _caller_pid(client_address, server_port):
+    """The PID owning the client end of a loopback connection to server_port (GetExtendedTcpTable)."""
+    import ctypes
+
+    size = ctypes.c_ulong(16 * 1024)
+    for _ in range(3):
+        buffer = ctypes.create_string_buffer(size.value)
+        result = ctypes.windll.iphlpapi.GetExtendedTcpTable(
+            buffer, ctypes.byref(size), False, socket.AF_INET, TCP_TABLE_OWNER_PID_ALL, 0
+        )
+        if result != ERROR_INSUFFICIENT_BUFFER:
+            break
+    if result != 0:
+        return None
+
+    # MIB_TCPTABLE_OWNER_PID: a DWORD count followed by rows of 6 DWORDs
+    # (state, local addr, local port, remote addr, remote port, owning PID); ports in network order
+    words = (ctypes.c_uint32 * (len(buffer) // 4)).from_buffer(buffer)
+    for row in range(words[0]):
+        local_port, remote_port, pid = (words[1 + row * 6 + offset] for offset in (2, 4, 5))
+        if socket.ntohs(local_port & 0xFFFF) == client_address[1] and socket.ntohs(remote_port & 0xFFFF) == server_port:
+            return pid
+    return None
+
+
+def _process_image(pid):
+    import ctypes
+
+    kernel32 = ctypes.windll.kernel32
+    kernel32.OpenProcess.restype = ctypes.c_void_p
+    handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+    if not handle:
+        return None
+    try:
+        buffer = ctypes.create_unicode_buffer(1024)
+        size = ctypes.c_ulong(len(buffer))
+        if not kernel32.QueryFullProcessImageNameW(ctypes.c_void_p(handle), 0, buffer, ctypes.byref(size)):
+            return None
+        return buffer.value
+    finally:
+        kernel32.CloseHandle(ctypes.c_void_p(handle))
+
+
+def caller_is_app(client_address, server_port):
+    """True when the connecting process runs the same executable as the service (Windows only)."""
+    try:
+        from dns_manager import get_main_executable_path
+        pid = _caller_pid(client_address, server_port)
+        image = _process_image(pid) if pid else None
+        own_image = get_main_executable_path()
+    except (OSError, AttributeError, ValueError):
+        return False
+    return bool(image) and os.path.normcase(image) == os.path.normcase(own_image)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        verify_caller = self.server.verify_caller
+        if verify_caller is not None and not verify_caller(self.client_address, self.server.port):
+            print(f"Refused a DNS service connection from an unknown process ({self.client_address[1]})")
+            return
+        self.server.connection_opened()
+        try:
+            self._serve_requests()
+        finally:
+            self.server.connection_closed()
+
+    def _serve_requests(self):
+        # Every request must be signed with the nonce sent just before it
+        nonce = secrets.token_bytes(16)
+        try:
+            _send_message(self.wfile, {"nonce": nonce.hex()})
+        except OSError:
+            return
+        while True:
+            try:
+                request = _read_message(self.rfile)
+            except (OSError, ValueError, ConnectionError):
+                return
+            reply = self.server.dispatch(nonce, request)
+            nonce = secrets.token_bytes(16)
+            reply["nonce"] = nonce.hex()
+            try:
+                _send_message(self.wfile, reply)
+            except OSError:
+                return
+
+
+class DnsServiceServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """
+    Serves a DnsControl over authenticated loopback RPC. verify_caller(client_address,
+    port), when given, decides whether a connecting process may talk to the service.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = False
+
+    def __init__(self, control, key=None, verify_caller=None):
+        super().__init__(("127.0.0.1", 0), _RequestHandler)
+        self.control = control
+        self.key = key or secrets.token_bytes(32)
+        self.verify_caller = verify_caller
+        self.stopped = threading.Event()
+        self._connections = 0
+        self._idle_since = time.monotonic()
+        self._connections_lock = threading.Lock()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def connection_opened(self):
+        with self._connections_lock:
+            self._connections += 1
+
+    def connection_closed(self):
+        with self._connections_lock:
+            self._connections -= 1
+            if not self._connections:
+                self._idle_since = time.monotonic()
+
+    def idle_time(self, now=None):
+        """Seconds since the last client disconnected (or the server started); 0 while one is connected."""
+        with self._connections_lock:
+            if self._connections:
+                return 0
+            return (time.monotonic() if now is None else now) - self._idle_since
+
+    def dispatch(self, nonce, request):
+        try:
+            method, params, mac = request["method"], request.get("params") or {}, request["mac"]
+        except (KeyError, TypeError):
+            return {"error": "malformed request"}
+        if not isinstance(mac, str) or not hmac.compare_digest(mac, _sign(self.key, nonce, method, params)):
+            return {"error": "authentication failed"}
+        if not isinstance(method, str) or method not in METHODS:
+            return {"error": f"unknown method {method}"}
+        try:
+            params = validate_params(method, params)
+        except ValueError as e:
+            return {"error": f"invalid parameters: {e}"}
+        if method == "shutdown":
+            self.stopped.set()
+            return {"result": True}
+        if method == "metrics":
+            # The netsh runs are recorded in this process; the GUI merges them into its endpoint
+            return {"result": metrics.export_samples()}
+        try:
+            return {"result": getattr(self.control, method)(**params)}
+        except Exception as e:
+            return {"error": f"{type(e).__name__}: {e}"}
+
+    def publish(self, service_file=SERVICE_FILE, launch_id=None):
+        """Writes port, key and the launch id where the GUI (same user) can find them."""
+        os.makedirs(os.path.dirname(service_file), exist_ok=True)
+        temp_path = service_file + ".tmp"
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding='utf-8') as f:
+            json.dump({"pid": os.getpid(), "port": self.port, "key": self.key.hex(), "launch": launch_id}, f)
+        os.replace(temp_path, service_file)
+
+    def unpublish(self, service_file=SERVICE_FILE):
+        try:
+            with open(service_file, "r", encoding='utf-8') as f:
+                published = json.load(f)
+            if published.get("key") == self.key.hex():
+                os.remove(service_file)
+        except (OSError, ValueError):
+            pass
+
+
+class DnsServiceClient:
+    """
+    Calls a DnsControl in the service process; has the same methods, so the GUI
+    does not care which one it holds. Thread-safe; keeps one connection open.
+    """
+
+    def __init__(self, port, key, timeout=CALL_TIMEOUT):
+        self.port = port
+        self.key = key
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._socket = None
+        self._stream = None
+        self._nonce = None
+
+    def _connect(self):
+        self._socket = socket.create_connection(("127.0.0.1", self.port), timeout=self.timeout)
+        self._stream = self._socket.makefile("rwb")
+        self._nonce = bytes.fromhex(_read_message(self._stream)["nonce"])
+
+    def _disconnect(self):
+        for closable in (self._stream, self._socket):
+            if closable is not None:
+                try:
+                    closable.close()
+                except OSError:
+                    pass
+        self._socket = self._stream = self._nonce = None
+
+    def call(self, method, **params):
+        with self._lock:
+            # A kept-alive connection may have been dropped; a fresh one is tried once
+            for attempt in range(2):
+                reused = self._socket is not None
+                try:
+                    if not reused:
+                        self._connect()
+                    _send_message(self._stream, {
+                        "method": method, "params": params, "mac": _sign(self.key, self._nonce, method, params)
+                    })
+                    reply = _read_message(self._stream)
+                    break
+                except (OSError, ValueError, ConnectionError, KeyError) as e:
+                    self._disconnect()
+                    if not reused or attempt:
+                        raise DnsServiceError(f"DNS service unavailable: {e}")
+            self._nonce = bytes.fromhex(reply["nonce"])
+        if "error" in reply:
+            raise DnsServiceError(reply["error"])
+        return reply["result"]
+
+    def close(self):
+        with self._lock:
+            self._disconnect()
+
+    def health(self):
+        return self.call("health")
+
+    def check_dns_status(self, target_dns):
+        return self.call("check_dns_status", target_dns=target_dns)
+
+    def capture_dns_servers(self, exclude=()):
+        return self.call("capture_dns_servers", exclude=list(exclude))
+
+    def apply_dns(self, dns_ip1, dns_ip2=None):
+        return self.call("apply_dns", dns_ip1=dns_ip1, dns_ip2=dns_ip2)
+
+    def unset_dns(self):
+        return self.call("unset_dns")
+
+    def reconcile(self, timeout=5):
+        return self.call("reconcile", timeout=timeout)
+
+    def restore_dns(self, timeout=5):
+        return self.call("restore_dns", timeout=timeout)
+
+    def metrics(self):
+        """The service process's metrics.export_samples()."""
+        return self.call("metrics")
+
+    def stop(self):
+        self.close()
+
+
+def connect_dns_service(service_file=SERVICE_FILE, timeout=CALL_TIMEOUT, launch_id=None):
+    """
+    A client for the running service, or None if there is none. With launch_id, only
+    the service started by that launch_dns_service() call is accepted.
+    """
+    try:
+        with open(service_file, "r", encoding='utf-8') as f:
+            published = json.load(f)
+        if launch_id is not None and published.get("launch") != launch_id:
+            return None
+        client = DnsServiceClient(int(published["port"]), bytes.fromhex(published["key"]), timeout)
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        return None
+    try:
+        client.health()
+    except DnsServiceError:
+        client.close()
+        return None
+    return client
+
+
+def service_arguments(launch_id, data_dir=APP_DATA_PATH):
+    """The command line of a service that serves this user's data_dir and publishes launch_id."""
+    import subprocess
+    return subprocess.list2cmdline([SERVICE_ARG, DATA_DIR_ARG, data_dir, LAUNCH_ID_ARG, launch_id])
+
+
+def launch_dns_service():
+    """
+    Starts the service elevated (one UAC prompt). Returns the launch id to pass to
+    wait_for_dns_service(), or None if the launch was refused or failed.
+    """
+    launch_id = secrets.token_hex(8)
+    try:
+        import ctypes
+        from dns_manager import get_main_executable_path
+        ret_code = ctypes.windll.shell32.ShellExecuteW(
+            None, "runas", get_main_executable_path(), service_arguments(launch_id), None, 0
+        )
+    except Exception as e:
+        print(f"Could not start the DNS service: {e}")
+        return None
+    return launch_id if ret_code > 32 else None
+
+
+def wait_for_dns_service(launch_id, timeout=SERVICE_START_TIMEOUT, service_file=SERVICE_FILE):
+    """Waits for the service launched with launch_id to come up; None if it does not in time."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        client = connect_dns_service(service_file, launch_id=launch_id)
+        if client:
+            return client
+        time.sleep(0.25)
+    return None
+
+
+def run_service(backend=None, service_file=SERVICE_FILE, lock_file=SERVICE_LOCK_FILE,
+                idle_timeout=SERVICE_IDLE_TIMEOUT, launch_id=None):
+    """Runs the service until asked to shut down or without a connected GUI for idle_timeout seconds."""
+    lock = InstanceLock(lock_file)
+    if not lock.acquire():
+        # Already running
+        return
+    # The backend re-reads the user's settings when they change, so adapter selection follows the GUI
+    control = DnsControl(backend or SystemDnsBackend())
+    control.start_monitor()
+    server = DnsServiceServer(control, verify_caller=caller_is_app if sys.platform == "win32" else None)
+    thread = threading.Thread(target=server.serve_forever, name="dns-service", daemon=True)
+    thread.start()
+    server.publish(service_file, launch_id)
+    try:
+        while not server.stopped.wait(1):
+            if server.idle_time() > idle_timeout:
+                break
+    finally:
+        server.unpublish(service_file)
+        server.shutdown()
+        server.server_close()
+        control.stop()
+        lock.release()
+
+
+if __name__ == "__main__":
+    run_service(FakeDnsBackend() if "--fake" in sys.argv else None)
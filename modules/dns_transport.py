@@ -0,0 +1,290 @@
+# dns_transport.py
+import socket
+import ssl
+import struct
+import threading
+import queue
+import http.client
+import urllib.parse
+
+DEFAULT_TIMEOUT = 5
+
+
+def build_query(hostname, qtype=1, query_id=0):
+    """Builds a minimal DNS query packet (RD set) for a hostname."""
+    header = struct.pack("!HHHHHH", query_id, 0x0100, 1, 0, 0, 0)
+    qname = b"".join(
+        bytes([len(label)]) + label.encode("idna")
+        for label in hostname.rstrip(".").split(".") if label
+    ) + b"\x00"
+    return header + qname + struct.pack("!HH", qtype, 1)
+
+
+def get_query_id(packet):
+    return struct.unpack("!H", packet[:2])[0]
+
+
+def set_query_id(packet, query_id):
+    return struct.pack("!H", query_id) + packet[2:]
+
+
+def get_query_name(packet):
+    """Returns the first question name of a DNS packet in lower case, or None."""
+    try:
+        labels = []
+        pos = 12
+        while True:
+            length = packet[pos]
+            if length == 0:
+                break
+            if length & 0xC0:
+                return None
+            labels.append(packet[pos + 1:pos + 1 + length].decode("ascii", "replace"))
+            pos += 1 + length
+        return ".".join(labels).lower()
+    except IndexError:
+        return None
+
+
+class UdpUpstream:
+    """Plain DNS over UDP (DoU), kept for parity with the encrypted upstreams."""
+
+    def __init__(self, server, port=53, timeout=DEFAULT_TIMEOUT):
+        self.server = server
+        self.port = port
+        self.timeout = timeout
+
+    def query(self, packet):
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.sendto(packet, (self.server, self.port))
+            while True:
+                response, _ = sock.recvfrom(4096)
+                if response[:2] == packet[:2]:
+                    return response
+
+    def close(self):
+        pass
+
+
+class DotUpstream:
+    """
+    DNS over TLS with one persistent connection.
+    Queries are pipelined on the same socket and matched back by message ID,
+    so the TLS handshake is only paid when the connection is (re)opened.
+    """
+
+    def __init__(self, host, port=853, server_name=None, ssl_context=None, timeout=DEFAULT_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.server_name = server_name or host
+        self.ssl_context = ssl_context or ssl.create_default_context()
+        self.timeout = timeout
+        self._sock = None
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._next_id = 0
+        self.connections_opened = 0
+
+    def _connect(self):
+        raw = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock = self.ssl_context.wrap_socket(raw, server_hostname=self.server_name)
+        sock.settimeout(None)
+        self._sock = sock
+        self.connections_opened += 1
+        threading.Thread(target=self._reader, args=(sock,), daemon=True).start()
+        return sock
+
+    def _recv_exact(self, sock, size):
+        data = b""
+        while len(data) < size:
+            chunk = sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("connection closed by upstream")
+            data += chunk
+        return data
+
+    def _reader(self, sock):
+        try:
+            while True:
+                length = struct.unpack("!H", self._recv_exact(sock, 2))[0]
+                response = self._recv_exact(sock, length)
+                with self._lock:
+                    entry = self._pending.pop(get_query_id(response), None)
+                if entry:
+                    entry[0].put(response)
+        except (OSError, ConnectionError, struct.error):
+            pass
+        finally:
+            with self._lock:
+                if self._sock is sock:
+                    self._sock = None
+                # Wake up everyone still waiting on this connection so they can retry
+                for wire_id, (waiter, owner) in list(self._pending.items()):
+                    if owner is sock:
+                        del self._pending[wire_id]
+                        waiter.put(None)
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def query(self, packet):
+        original_id = get_query_id(packet)
+        waiter = queue.Queue(maxsize=1)
+
+        for attempt in range(2):
+            with self._lock:
+                sock = self._sock or self._connect()
+                self._next_id = (self._next_id + 1) & 0xFFFF
+                wire_id = self._next_id
+                self._pending[wire_id] = (waiter, sock)
+                try:
+                    wire = set_query_id(packet, wire_id)
+                    sock.sendall(struct.pack("!H", len(wire)) + wire)
+                except OSError:
+                    self._pending.pop(wire_id, None)
+                    self._sock = None
+                    if attempt == 0:
+                        continue
+                    raise
+
+            try:
+                response = waiter.get(timeout=self.timeout)
+            except queue.Empty:
+                with self._lock:
+                    self._pending.pop(wire_id, None)
+                raise socket.timeout("DoT query timed out")
+
+            if response is not None:
+                return set_query_id(response, original_id)
+            # The connection dropped while waiting; retry once on a fresh one
+
+        raise ConnectionError("DoT upstream unavailable")
+
+    def close(self):
+        with self._lock:
+            sock, self._sock = self._sock, None
+        if sock:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+
+class _PinnedHTTPSConnection(http.client.HTTPSConnection):
+    """HTTPS connection to a pre-resolved address, keeping the real host name for SNI/Host."""
+
+    def __init__(self, host, address, port, **kwargs):
+        super().__init__(host, port, **kwargs)
+        self.address = address
+
+    def connect(self):
+        raw = socket.create_connection((self.address, self.port), self.timeout)
+        self.sock = self._context.wrap_socket(raw, server_hostname=self.host)
+
+
+class DohUpstream:
+    """
+    DNS over HTTPS (RFC 8484, POST) over a small pool of keep-alive connections.
+    Each connection is reused across queries, so the TLS handshake is paid once per slot.
+    """
+
+    def __init__(self, url, address=None, pool_size=4, ssl_context=None, timeout=DEFAULT_TIMEOUT):
+        parsed = urllib.parse.urlsplit(url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 443
+        self.path = parsed.path or "/dns-query"
+        self.address = address or self.host
+        self.ssl_context = ssl_context or ssl.create_default_context()
+        self.timeout = timeout
+        self._pool = queue.LifoQueue()
+        for _ in range(pool_size):
+            self._pool.put(None)
+        self.connections_opened = 0
+
+    def _new_connection(self):
+        self.connections_opened += 1
+        return _PinnedHTTPSConnection(
+            self.host, self.address, self.port, timeout=self.timeout, context=self.ssl_context
+        )
+
+    def query(self, packet):
+        original_id = get_query_id(packet)
+        # RFC 8484 recommends ID 0 so identical queries are cache friendly
+        wire = set_query_id(packet, 0)
+        conn = self._pool.get()
+        try:
+            for attempt in range(2):
+                if conn is None:
+                    conn = self._new_connection()
+                try:
+                    conn.request("POST", self.path, body=wire, headers={
+                        "Content-Type": "application/dns-message",
+                        "Accept": "application/dns-message",
+                    })
+                    response = conn.getresponse()
+                    body = response.read()
+                    if response.status != 200:
+                        raise ConnectionError(f"DoH upstream returned HTTP {response.status}")
+                    return set_query_id(body, original_id)
+                except (OSError, http.client.HTTPException):
+                    # Stale keep-alive connection; reopen once
+                    conn.close()
+                    conn = None
+                    if attempt == 1:
+                        raise
+        finally:
+            self._pool.put(conn)
+
+    def close(self):
+        while not self._pool.empty():
+            conn = self._pool.get_nowait()
+            if conn:
+                conn.close()
+
+
+def upstream_from_spec(spec):
+    """
+    Builds an upstream client from "https://..." (DoH), "tls://host[:port]" (DoT)
+    or a plain resolver IP. Returns None if it is not usable.
+
+    Host names are resolved here, before the system DNS is pointed at the local
+    forwarder, so the upstream never has to resolve itself through itself.
+    """
+    try:
+        if spec.startswith("https://"):
+            host = urllib.parse.urlsplit(spec).hostname
+            return DohUpstream(spec, address=socket.gethostbyname(host))
+
+        if spec.startswith("tls://"):
+            host, _, port = spec[len("tls://"):].partition(":")
+            return DotUpstream(socket.gethostbyname(host), int(port or 853), server_name=host)
+    except (socket.gaierror, UnicodeError, ValueError):
+        return None
+
+    try:
+        socket.inet_aton(spec)
+    except OSError:
+        return None
+    return UdpUpstream(spec)
+
+
+def make_upstream(sub_data, mode):
+    """
+    Builds the upstream client for the given resolver mode ('doh', 'dot' or 'plain')
+    from the resolver info of the Subscription. Returns None if it is not available.
+    """
+    if not sub_data:
+        return None
+
+    if mode == "doh" and sub_data.doh_link:
+        return upstream_from_spec(sub_data.doh_link)
+
+    if mode == "dot" and sub_data.dot_address:
+        return upstream_from_spec("tls://" + sub_data.dot_address)
+
+    if mode == "plain" and sub_data.dou_ip1:
+        return upstream_from_spec(sub_data.dou_ip1)
+
+    return None
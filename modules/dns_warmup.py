@@ -0,0 +1,109 @@
+# dns_warmup.py
+"""
+Post-switch stage of the DNS connect flow.
+
+Right after the adapters were pointed at a new resolver, the OS resolver cache
+still holds answers from the old one, and the first lookups on the new one are
+cold misses. This stage flushes the cache through the native API (the call
+ipconfig /flushdns makes, without spawning it) and then resolves a list of
+frequently used domains concurrently, so they are cached before the user starts
+browsing. The whole stage is bounded by a time budget; lookups still running
+when it runs out are abandoned.
+
+The backend does the actual work, so the stage runs against a local stub
+resolver as well as against the system.
+"""
+import random
+import socket
+import sys
+import threading
+import time
+
+WARMUP_BUDGET = 2.0
+WARMUP_CONCURRENCY = 8
+# Overridden by "warmup_domains" in the settings (an empty list turns the warmup off)
+DEFAULT_HOT_DOMAINS = (
+    "www.google.com", "www.youtube.com", "www.instagram.com", "web.whatsapp.com",
+    "telegram.org", "www.wikipedia.org", "github.com", "www.microsoft.com",
+)
+
+
+class SystemResolverBackend:
+    """The Windows DNS Client: its cache is flushed, lookups go through it to the configured resolver."""
+
+    def flush(self):
+        if sys.platform != "win32":
+            return False
+        try:
+            import ctypes
+            return bool(ctypes.windll.dnsapi.DnsFlushResolverCache())
+        except (OSError, AttributeError):
+            return False
+
+    def resolve(self, domain, timeout):
+        # getaddrinfo has no timeout of its own; the stage stops waiting for it at the deadline
+        return bool(socket.getaddrinfo(domain, 443, socket.AF_INET, socket.SOCK_STREAM))
+
+
+class UpstreamResolverBackend:
+    """Queries one resolver directly over UDP (e.g. a local stub); there is no cache to flush."""
+
+    def __init__(self, server, port=53):
+        self.server = server
+        self.port = port
+
+    def flush(self):
+        return False
+
+    def resolve(self, domain, timeout):
+        # Imported here: dns_transport pulls in ssl and http.client
+        from dns_transport import UdpUpstream, build_query, get_query_id
+
+        query_id = random.randrange(1 << 16)
+        answer = UdpUpstream(self.server, self.port, timeout=timeout).query(build_query(domain, query_id=query_id))
+        return bool(answer) and get_query_id(answer) == query_id
+
+
+def run_post_switch(backend, domains=DEFAULT_HOT_DOMAINS, budget=WARMUP_BUDGET, concurrency=WARMUP_CONCURRENCY):
+    """
+    Flushes the resolver cache, then resolves domains with up to concurrency lookups
+    at a time until all are done or budget seconds have passed.
+    Returns {"flushed", "warmed", "failed", "skipped", "elapsed"}.
+    """
+    started = time.monotonic()
+    deadline = started + budget
+    result = {"flushed": backend.flush(), "warmed": 0, "failed": 0, "skipped": 0}
+
+    pending = list(dict.fromkeys(domains))
+    total = len(pending)
+    lock = threading.Lock()
+    finished = threading.Event()
+    remaining = [total]
+
+    def worker():
+        while True:
+            with lock:
+                if not pending or time.monotonic() >= deadline:
+                    return
+                domain = pending.pop(0)
+            try:
+                ok = backend.resolve(domain, max(0.05, deadline - time.monotonic()))
+            except (OSError, ValueError):
+                ok = False
+            with lock:
+                result["warmed" if ok else "failed"] += 1
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    finished.set()
+
+    if pending:
+        # Daemon threads: a lookup stuck in the OS must not hold up the stage or the app's exit
+        for _ in range(min(concurrency, len(pending))):
+            threading.Thread(target=worker, name="dns-warmup", daemon=True).start()
+        finished.wait(max(0, deadline - time.monotonic()))
+
+    with lock:
+        # A copy: lookups abandoned at the deadline may still finish later
+        summary = dict(result, skipped=total - result["warmed"] - result["failed"])
+    summary["elapsed"] = round(time.monotonic() - started, 3)
+    return summary
@@ -1,90 +1,76 @@
 # gui.py - Fixed Modern Version
+import queue
+import time
 import tkinter as tk
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
 from tkinter import messagebox
-import threading
-import time
-from PIL import Image, ImageTk
 
 from config import (
     TRANSLATIONS, current_language, app_settings, last_fetched_data,
-    active_timer_id, active_fetch_id, watchdog_timer_id,
     load_settings, save_settings, resource_path
 )
-from network_utils import process_all_data, update_ip_check_hosts
-from dns_manager import check_dns_status, set_dns, unset_dns, unset_dns_synchronously
-from ui_helpers import start_countdown, manage_subscription_link, retranslate_results_data
+from network_utils import (
+    process_all_data, update_ip_check_hosts, get_public_ip, get_api_url,
+    register_ip_or_queue, replay_queued_ip_updates
+)
+from connectivity import has_default_route
+import outbound_queue
+from ip_monitor import IpChangeDetector, LOCAL_CHECK_INTERVAL
+from task_executor import GuiTaskExecutor
+from timer_scheduler import TimerScheduler
+from theme_assets import get_palette, get_logo_image
+from shutdown import ShutdownCoordinator
+from single_instance import CommandServer, COMMAND_SET_DNS, COMMAND_UNSET_DNS, COMMAND_DIAGNOSTICS, COMMAND_POLL_MS
+from dns_journal import read_journal
+from local_forwarder import LOCAL_DNS_IP
+from refresh_scheduler import AutoRefreshScheduler
+import diagnostics
+from ui_helpers import start_countdown, manage_subscription_link
+from view_model import (
+    LabelRenderer, build_results_view, build_placeholder_view, build_chrome_view
+)
 import config
 
 class ModernVexoChecker:
-    def __init__(self):
+    def __init__(self, dns_control=None):
+        # DNS changes go through the DNS service when the GUI runs unprivileged,
+        # otherwise through the same control core in-process
+        if dns_control is None:
+            from dns_service import DnsControl, SystemDnsBackend
+            dns_control = DnsControl(SystemDnsBackend())
+            dns_control.start_monitor()
+        self.dns_control = dns_control
         self.is_dns_connected = False
         self.is_operation_in_progress = False
         self.window = None
+        self.current_theme = None
         self.labels = {}
+        self.renderer = LabelRenderer()
         self.cards = {}
         self.dns_toggle_button = None
         self.fetch_button = None
         self.context_menu = None
+        self.local_forwarder = None
+        self.refresh_scheduler = None
+        self.ip_monitor = None
+        self.executor = None
+        self.timers = None
+        self.countdown = None
+        self.watchdog_timer = None
+        self.fetch_token = None
+        self.instance_server = None
+        self.metrics_server = None
+        self.outbound_timer = None
+        self.instance_commands = queue.Queue()
+        self.diagnostics_bundles = queue.Queue()
+        self.diagnostics_polling = False
         self.window_width = 500
         self.window_height = 600
         
     def get_theme_colors(self):
-        """Get colors based on current theme"""
-        current_theme = self.window.style.theme_use()
-        
-        if current_theme in ['darkly', 'superhero', 'cyborg', 'vapor', 'solar']:
-            # Dark theme colors
-            return {
-                'bg': '#1a1d23',
-                'card_bg': '#2b3035',
-                'text_primary': '#ffffff',
-                'text_secondary': '#8B949E',
-                'accent': '#00D9FF',
-                'success': '#00D084',
-                'warning': '#FFA500',
-                'danger': '#FF6B6B',
-                'border': '#3d4148'
-            }
-        else:
-            # Light theme colors
-            return {
-                'bg': '#f8f9fa',
-                'card_bg': '#ffffff',
-                'text_primary': '#212529',
-                'text_secondary': '#6c757d',
-                'accent': '#0d6efd',
-                'success': '#198754',
-                'warning': '#fd7e14',
-                'danger': '#dc3545',
-                'border': '#dee2e6'
-            }
-    
-    def create_logo_image(self, image_path, size=(48, 48)):
-        """Create properly sized logo WITHOUT deformation"""
-        try:
-            img = Image.open(image_path).convert("RGBA")
-            
-            # Calculate aspect ratio
-            original_width, original_height = img.size
-            target_width, target_height = size
-            
-            # Calculate scaling to fit within target size while maintaining aspect ratio
-            width_ratio = target_width / original_width
-            height_ratio = target_height / original_height
-            scale_ratio = min(width_ratio, height_ratio)
-            
-            new_width = int(original_width * scale_ratio)
-            new_height = int(original_height * scale_ratio)
-            
-            # Resize with high quality
-            img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-            
-            return ImageTk.PhotoImage(img)
-        except Exception as e:
-            print(f"Error loading logo: {e}")
-            return None
+        """Get colors based on current theme (a cached palette, no Tk query)"""
+        return get_palette(self.current_theme)
         
     def create_window(self):
         """Create modern styled window with FIXED size"""
@@ -94,6 +80,10 @@ class ModernVexoChecker:
         initial_theme = app_settings.get("theme", "darkly")
         
         self.window = ttk.Window(themename=initial_theme)
+        self.current_theme = initial_theme
+        # Every periodic callback of the app goes through this one scheduler
+        self.timers = TimerScheduler(self.window)
+        self.executor = GuiTaskExecutor(self.timers)
         self.window.title("")
         
         # Set FIXED window size
@@ -180,8 +170,7 @@ class ModernVexoChecker:
         self.logo_label.pack(side="left", padx=(0, 12))
         
         try:
-            logo_path = resource_path("logo.png")
-            photo = self.create_logo_image(logo_path, (42, 42))
+            photo = get_logo_image(self.window, (42, 42))
             if photo:
                 self.logo_label.config(image=photo)
                 self.logo_label.image = photo
@@ -203,6 +192,8 @@ class ModernVexoChecker:
                                   style="Subtitle.TLabel",
                                   foreground=colors['text_secondary'])
         self.subtitle_label.pack(anchor="w")
+        self.labels['title'] = self.title_label
+        self.labels['subtitle'] = self.subtitle_label
         
         # Right side - Controls
         controls_frame = ttk.Frame(header_frame)
@@ -349,12 +340,9 @@ class ModernVexoChecker:
         # Save current geometry
         current_geometry = self.window.geometry()
         
-        if self.theme_var.get():
-            self.window.style.theme_use('darkly')
-            app_settings["theme"] = "darkly"
-        else:
-            self.window.style.theme_use('flatly')
-            app_settings["theme"] = "flatly"
+        self.current_theme = 'darkly' if self.theme_var.get() else 'flatly'
+        self.window.style.theme_use(self.current_theme)
+        app_settings["theme"] = self.current_theme
         
         save_settings()
         
@@ -364,30 +352,19 @@ class ModernVexoChecker:
         # Update colors for all elements
         self.update_theme_colors()
     
+    def render_view(self, lang_code=None, results=True):
+        """Renders the view-model; only changed label options reach Tk"""
+        lang_code = lang_code or config.current_language
+        colors = self.get_theme_colors()
+        self.renderer.apply(self.labels, build_chrome_view(lang_code, colors))
+        if results:
+            self.renderer.apply(self.labels, build_results_view(config.last_fetched_data, lang_code, colors))
+
     def update_theme_colors(self):
         """Update all colors when theme changes"""
         colors = self.get_theme_colors()
         
-        # Update title colors
-        self.title_label.config(foreground=colors['accent'])
-        self.subtitle_label.config(foreground=colors['text_secondary'])
-        
-        # Update header labels
-        for key in ['username', 'status', 'time', 'volume', 'ip']:
-            if f"{key}_header" in self.labels:
-                self.labels[f"{key}_header"].config(foreground=colors['text_secondary'])
-            if key in self.labels:
-                # Re-apply proper color based on current data
-                if key == 'status' and config.last_fetched_data:
-                    status_key = config.last_fetched_data.get('status_key')
-                    if status_key == 'table_status_active':
-                        self.labels[key].config(foreground=colors['success'])
-                    elif status_key == 'table_status_expired':
-                        self.labels[key].config(foreground=colors['danger'])
-                    elif status_key in ['sub_status_disabled', 'limited']:
-                        self.labels[key].config(foreground=colors['warning'])
-                else:
-                    self.labels[key].config(foreground=colors['accent'])
+        self.render_view()
         
         # Update status bar
         self.labels['status_bar'].config(foreground=colors['text_secondary'])
@@ -398,31 +375,66 @@ class ModernVexoChecker:
         self.fetch_button.config(command=self.on_fetch_click)
         self.dns_toggle_button.config(command=self.on_dns_toggle_click)
         self.window.protocol("WM_DELETE_WINDOW", self.on_window_close)
+        self.window.bind("<Unmap>", self.on_window_visibility, add="+")
+        self.window.bind("<Map>", self.on_window_visibility, add="+")
+        # Hidden: profiles the next refresh or DNS change for a bug report
+        self.window.bind("<Control-Shift-D>", lambda event: self.arm_diagnostics())
+
+    def arm_diagnostics(self):
+        """Records the next refresh or DNS operation into a diagnostics bundle"""
+        # The worker thread that ran the operation only queues the outcome
+        diagnostics.arm(lambda path, error: self.diagnostics_bundles.put((path, error)))
+        self.labels['status_bar'].config(
+            text=TRANSLATIONS[config.current_language]["diagnostics_armed"],
+            foreground=self.get_theme_colors()['warning']
+        )
+        if not self.diagnostics_polling:
+            self.diagnostics_polling = True
+            self.poll_diagnostics_bundles()
+
+    def poll_diagnostics_bundles(self):
+        """Shows finished bundles on the Tk thread until the capture is over"""
+        # Checked before draining: once the capture is over, its path is already queued
+        capturing = diagnostics.is_capturing()
+        self.on_diagnostics_saved()
+        if capturing:
+            self.timers.call_later(diagnostics.POLL_MS, self.poll_diagnostics_bundles)
+        else:
+            self.diagnostics_polling = False
+
+    def on_diagnostics_saved(self):
+        while True:
+            try:
+                path, error = self.diagnostics_bundles.get_nowait()
+            except queue.Empty:
+                return
+            texts = TRANSLATIONS[config.current_language]
+            if path is None:
+                messagebox.showerror(texts["diagnostics_title"], texts["diagnostics_failed"].format(error=error))
+            else:
+                messagebox.showinfo(texts["diagnostics_title"], texts["diagnostics_saved"].format(path=path))
+
+    def on_window_visibility(self, event):
+        """Holds display-only timers while the window is minimized"""
+        # <Map>/<Unmap> are also delivered for child widgets
+        if event.widget is not self.window:
+            return
+        if self.window.state() == "iconic":
+            self.timers.pause_nonessential()
+        elif self.timers.paused:
+            self.timers.resume_nonessential()
     
     def update_ui_text(self):
         """Update UI text"""
         lang_code = config.current_language
-        colors = self.get_theme_colors()
         
         self.window.title(TRANSLATIONS[lang_code]["window_title"])
         self.fetch_button.config(text=f"🔄 {TRANSLATIONS[lang_code]['fetch_button']}")
         
-        labels_map = {
-            "username": "👤 " + TRANSLATIONS[lang_code]["username_header"],
-            "status": "📊 " + TRANSLATIONS[lang_code]["status_header"],
-            "time": "⏱️ " + TRANSLATIONS[lang_code]["time_header"],
-            "volume": "💾 " + TRANSLATIONS[lang_code]["volume_header"],
-            "ip": "🌐 " + TRANSLATIONS[lang_code]["ip_header"]
-        }
-        
-        for key, text in labels_map.items():
-            if f"{key}_header" in self.labels:
-                self.labels[f"{key}_header"].config(text=text)
-        
-        if config.last_fetched_data:
-            retranslate_results_data(self.labels, config.last_fetched_data, lang_code, colors)
+        # While a fetch is running the results keep their placeholders
+        self.render_view(lang_code, results=self.fetch_token is None)
 
-        if config.active_timer_id:
+        if self.countdown and self.countdown.active:
             wait_message = TRANSLATIONS[lang_code]["ip_wait_notice"]
             self.labels['status_bar'].config(text=wait_message)
         
@@ -442,28 +454,97 @@ class ModernVexoChecker:
         
         self.dns_toggle_button.config(text=text, bootstyle=style)
         
-        if not (config.last_fetched_data and config.last_fetched_data.get('dou_ip1')):
+        if not (config.last_fetched_data and config.last_fetched_data.dou_ip1):
             self.dns_toggle_button.config(state="disabled")
         else:
             self.dns_toggle_button.config(state="normal")
     
+    def get_dns_target(self):
+        """The DNS IP adapters point to while connected: the local forwarder or the DoU IP."""
+        if self.local_forwarder and self.local_forwarder.is_running:
+            return LOCAL_DNS_IP
+        return config.last_fetched_data.dou_ip1 if config.last_fetched_data else None
+
+    def start_local_forwarder(self, mode):
+        """
+        Starts the local forwarder (DoH/DoT upstream and/or split-horizon rules)
+        and points the adapters at it.
+        Falls back to plain DNS when the subscription has no resolver for this mode.
+        """
+        # Imported on first use: these pull in ssl and http.client
+        from dns_transport import make_upstream
+        from dns_rules import compile_rules, RoutingUpstream
+        from local_forwarder import LocalForwarder
+
+        upstream = make_upstream(config.last_fetched_data, mode)
+        if upstream is None:
+            return self.dns_control.apply_dns(config.last_fetched_data.dou_ip1, config.last_fetched_data.dou_ip2)
+
+        rules = app_settings.get("dns_rules")
+        if rules:
+            # Remember the DHCP-provided servers before they are replaced
+            own_ips = config.last_fetched_data.dns_servers
+            captured = self.dns_control.capture_dns_servers(exclude=own_ips)
+            if captured:
+                app_settings["dhcp_dns_servers"] = captured
+                save_settings()
+            upstream = RoutingUpstream(compile_rules(rules), upstream, app_settings.get("dhcp_dns_servers"))
+
+        self.stop_local_forwarder()
+        forwarder = LocalForwarder(upstream)
+        try:
+            forwarder.start()
+        except OSError:
+            upstream.close()
+            return {"success": False, "error_key": "dns_set_fail_message"}
+
+        result = self.dns_control.apply_dns(LOCAL_DNS_IP)
+        if result["success"]:
+            self.local_forwarder = forwarder
+        else:
+            forwarder.stop()
+        return result
+
+    def stop_local_forwarder(self):
+        if self.local_forwarder:
+            self.local_forwarder.stop()
+            self.local_forwarder = None
+
+    def run_post_switch_stage(self, warm=True):
+        """
+        Runs on a worker right after a DNS switch: flushes the OS resolver cache and
+        (time-bounded) pre-resolves the hot domains through the new resolver.
+        """
+        from dns_warmup import SystemResolverBackend, DEFAULT_HOT_DOMAINS, run_post_switch
+
+        domains = app_settings.get("warmup_domains", DEFAULT_HOT_DOMAINS) if warm else ()
+        try:
+            with diagnostics.span("post_switch"):
+                return run_post_switch(SystemResolverBackend(), domains)
+        except Exception as e:
+            print(f"Post-switch stage failed: {e!r}")
+            return None
+
     def update_dns_button_status(self):
         """Monitor DNS status"""
         if self.is_operation_in_progress:
-            self.window.after(1000, self.update_dns_button_status)
+            self.schedule_dns_status_poll(1000)
             return
         
-        def background_check():
-            target_dns = config.last_fetched_data.get('dou_ip1') if config.last_fetched_data else None
-            status = check_dns_status(target_dns)
-            self.window.after(0, update_ui_on_main_thread, status)
-        
         def update_ui_on_main_thread(status):
             self.is_dns_connected = status
             self.update_dns_button_status_ui_only(status, config.current_language)
-            self.window.after(3000, self.update_dns_button_status)
+            self.schedule_dns_status_poll(3000)
         
-        threading.Thread(target=background_check, daemon=True).start()
+        self.executor.submit(
+            self.dns_control.check_dns_status, self.get_dns_target(),
+            on_done=update_ui_on_main_thread,
+            on_error=lambda e: self.schedule_dns_status_poll(3000)
+        )
+
+    def schedule_dns_status_poll(self, delay_ms):
+        # Only keeps the button current: not needed while the window is minimized
+        self.timers.call_later(delay_ms, self.update_dns_button_status, essential=False)
     
     def on_dns_toggle_click(self):
         """Toggle DNS"""
@@ -477,7 +558,7 @@ class ModernVexoChecker:
         Refreshes subscription data first, then connects DNS if the subscription is active.
         """
         if not self.is_dns_connected:
-            threading.Thread(target=update_ip_check_hosts, daemon=True).start()        
+            self.executor.submit(update_ip_check_hosts)
         if self.is_operation_in_progress:
             return
 
@@ -490,16 +571,21 @@ class ModernVexoChecker:
 
         # Define the function that will run ONLY if the data fetch is successful
         def _proceed_with_dns_connection():
-            status = config.last_fetched_data.get('status_key')
-            
             # Check if subscription is active
-            if status == 'table_status_active':
+            if config.last_fetched_data.is_active:
                 # Original DNS connection logic starts here
-                dns_ip1 = config.last_fetched_data.get('dou_ip1')
-                dns_ip2 = config.last_fetched_data.get('dou_ip2')
+                dns_ip1, dns_ip2 = config.last_fetched_data.dou_ip1, config.last_fetched_data.dou_ip2
                 
                 def background_task():
-                    return set_dns(dns_ip1, dns_ip2)
+                    # apply_dns journals the original DNS of each interface before touching it
+                    mode = app_settings.get("resolver_mode", "plain")
+                    if mode in ("doh", "dot") or app_settings.get("dns_rules"):
+                        result = self.start_local_forwarder(mode)
+                    else:
+                        result = self.dns_control.apply_dns(dns_ip1, dns_ip2)
+                    if result["success"]:
+                        self.run_post_switch_stage()
+                    return result
 
                 def handle_result(result):
                     if result["success"]:
@@ -518,10 +604,10 @@ class ModernVexoChecker:
                     self.is_operation_in_progress = False
                     self.update_dns_button_status_ui_only(self.is_dns_connected, lang_code)
 
-                threading.Thread(
-                    target=lambda: self.window.after(0, handle_result, background_task()),
-                    daemon=True
-                ).start()
+                self.executor.submit(diagnostics.capture_next, "set_dns", background_task,
+                                     on_done=handle_result, on_error=lambda e: handle_result(
+                    {"success": False, "error_key": "dns_set_fail_message"}
+                ))
             else:
                 # If subscription is not active, show a warning
                 messagebox.showwarning(
@@ -548,7 +634,12 @@ class ModernVexoChecker:
         )
         
         def background_task():
-            return unset_dns()
+            result = self.dns_control.unset_dns()
+            if result["success"]:
+                self.stop_local_forwarder()
+                # Drop the answers cached from our resolver; nothing to warm up for DHCP DNS
+                self.run_post_switch_stage(warm=False)
+            return result
         
         def handle_result(result):
             if result["success"]:
@@ -571,30 +662,41 @@ class ModernVexoChecker:
             self.dns_toggle_button.config(text=text, bootstyle=style, state="normal")
             self.is_operation_in_progress = False
         
-        threading.Thread(
-            target=lambda: self.window.after(0, handle_result, background_task()),
-            daemon=True
-        ).start()
+        self.executor.submit(diagnostics.capture_next, "unset_dns", background_task,
+                             on_done=handle_result, on_error=lambda e: handle_result(
+            {"success": False, "error_key": "dns_unset_fail_message"}
+        ))
     
     def on_fetch_click(self):
         """Fetch data"""
         self._execute_fetch()
 
-    def _execute_fetch(self, on_success_callback=None):
+    def on_auto_refresh(self):
+        """Background refresh started by the auto-refresh scheduler"""
+        return self._execute_fetch(silent=True)
+
+    def is_fetch_busy(self):
+        return self.is_operation_in_progress or self.fetch_token is not None
+
+    def _execute_fetch(self, on_success_callback=None, silent=False):
         """
         Core logic to fetch subscription data.
         Optionally executes a callback function upon successful data retrieval.
+        A silent fetch (auto-refresh) shows no dialogs and keeps the current values on screen.
+        Returns True if a fetch was started.
         """
         if not self.is_dns_connected:
-            threading.Thread(target=update_ip_check_hosts, daemon=True).start()        
+            self.executor.submit(update_ip_check_hosts)
         url = app_settings.get("last_used_url", "").strip()
         if not url:
+            if silent:
+                return False
             messagebox.showwarning(
                 TRANSLATIONS[config.current_language]["warning_title"],
                 TRANSLATIONS[config.current_language]["warning_add_link_first"]
             )
             manage_subscription_link(self.window, config.current_language)
-            return
+            return False
 
         colors = self.get_theme_colors()
 
@@ -607,51 +709,70 @@ class ModernVexoChecker:
             foreground=colors['warning']
         )
 
-        for key in ['username', 'status', 'time', 'volume', 'ip']:
-            self.labels[key].config(text="...")
+        if not silent:
+            self.renderer.apply(self.labels, build_placeholder_view())
 
-        fetch_id = time.time()
-        config.active_fetch_id = fetch_id
+        if self.fetch_token:
+            self.fetch_token.cancel()
 
-        def background_task():
-            result = process_all_data(url, config.current_language)
-            # Pass the callback to the UI update function
-            self.window.after(0, self.update_ui, result, config.current_language, fetch_id, on_success_callback)
+        lang_code = config.current_language
+        known_public_ip = self.ip_monitor.get_fresh_ip() if self.ip_monitor else None
 
-        config.watchdog_timer_id = self.window.after(20000, lambda: self.on_fetch_timeout(fetch_id))
+        def on_error(error):
+            failed = {"success": False, "sub_data": None, "ip_status": None,
+                      "error": TRANSLATIONS[lang_code]["error_unknown"]}
+            self.update_ui(failed, lang_code, token, on_success_callback, silent)
 
-        thread = threading.Thread(target=background_task)
-        thread.daemon = True
-        thread.start()
+        # The result is dropped if the token is cancelled by the watchdog or a newer fetch
+        token = self.executor.submit(
+            diagnostics.capture_next, "refresh", process_all_data, url, lang_code, known_public_ip,
+            on_done=lambda result: self.update_ui(result, lang_code, token, on_success_callback, silent),
+            on_error=on_error
+        )
+        self.fetch_token = token
+
+        self.watchdog_timer = self.timers.call_later(20000, self.on_fetch_timeout, token, silent)
+        return True
     
-    def on_fetch_timeout(self, fetch_id):
+    def on_fetch_timeout(self, token, silent=False):
         """Handle timeout"""
-        if fetch_id == config.active_fetch_id:
-            config.active_fetch_id = None
+        if token is self.fetch_token:
+            token.cancel()
+            self.fetch_token = None
             self.fetch_button.config(
                 state="normal",
                 text=f"🔄 {TRANSLATIONS[config.current_language]['fetch_button']}"
             )
             self.labels['status_bar'].config(text="")
-            messagebox.showerror(
-                TRANSLATIONS[config.current_language]["error_title"],
-                TRANSLATIONS[config.current_language]["error_timeout"]
-            )
+            if not silent:
+                messagebox.showerror(
+                    TRANSLATIONS[config.current_language]["error_title"],
+                    TRANSLATIONS[config.current_language]["error_timeout"]
+                )
+            if self.refresh_scheduler:
+                self.refresh_scheduler.on_fetch_finished(None)
     
-    def update_ui(self, result, lang_code, fetch_id, on_success_callback=None):
+    def update_ui(self, result, lang_code, token, on_success_callback=None, silent=False):
         """Update UI with data"""
-        if fetch_id != config.active_fetch_id:
+        if token is not self.fetch_token:
             return
         
-        if config.watchdog_timer_id:
-            self.window.after_cancel(config.watchdog_timer_id)
-            config.watchdog_timer_id = None
+        self.timers.cancel(self.watchdog_timer)
+        self.watchdog_timer = None
         
-        config.active_fetch_id = None
+        self.fetch_token = None
         colors = self.get_theme_colors()
         
         try:
             if not result["success"]:
+                if result.get("offline") and config.last_fetched_data and not on_success_callback:
+                    # Network trouble: keep serving the last data, marked as stale
+                    self.show_stale_notice(result["error"], lang_code, colors)
+                    return
+                if silent:
+                    # Keep showing the last good data; the scheduler will try again
+                    self.labels['status_bar'].config(text="")
+                    return
                 self.labels['timer_label'].pack_forget()
                 messagebox.showerror(TRANSLATIONS[lang_code]["error_title"], result["error"])
                 config.last_fetched_data = None
@@ -659,63 +780,14 @@ class ModernVexoChecker:
                 config.last_fetched_data = result["sub_data"]
                 data = result["sub_data"]
                 
-                # Status with proper colors
-                status_map = {
-                    'table_status_active': (TRANSLATIONS[lang_code]["status_active"], colors['success']),
-                    'sub_status_disabled': (TRANSLATIONS[lang_code]["status_disabled"], colors['warning']),
-                    'limited': (TRANSLATIONS[lang_code]["status_limited"], colors['warning']),
-                    'table_status_expired': (TRANSLATIONS[lang_code]["status_expired"], colors['danger'])
-                }
-                
-                status_key = data.get('status_key')
-                status_text, status_color = status_map.get(status_key, (status_key, colors['text_secondary']))
-                
-                # Time
-                if data.get('is_unlimited_time'):
-                    remaining_time = TRANSLATIONS[lang_code]["unlimited"]
-                else:
-                    days = data.get('remaining_days', 0)
-                    hours = data.get('remaining_hours', 0)
-                    remaining_time = TRANSLATIONS[lang_code]["time_format"].format(days=days, hours=hours)
-                
-                # Volume
-                if data.get('is_unlimited_volume'):
-                    remaining_volume = TRANSLATIONS[lang_code]["unlimited"]
-                else:
-                    allowed_gb = data.get('allowed_volume_gb') or 0
-                    used_gb = data.get('used_volume_gb', 0)
-                    remaining_gb = max(0, allowed_gb - used_gb)
-                    remaining_volume = f"{remaining_gb:.2f} GB"
-                
-                # Update labels
-                self.labels['username'].config(text=data.get('username', "..."), foreground=colors['accent'])
-                self.labels['status'].config(text=status_text, foreground=status_color)
-                self.labels['time'].config(text=remaining_time, foreground=colors['accent'])
-                self.labels['volume'].config(text=remaining_volume, foreground=colors['accent'])
-                self.labels['ip'].config(text=data.get('last_ip') or "N/A", foreground=colors['accent'])
+                self.renderer.apply(self.labels, build_results_view(data, lang_code, colors))
                 
                 # IP status
                 ip_status = result.get("ip_status")
                 if ip_status:
-                    if ip_status.get("key") == "ip_changed_from_to":
-                        wait_message = TRANSLATIONS[lang_code]["ip_wait_notice"]
-                        self.labels['status_bar'].config(text=wait_message, foreground=colors['warning'])
-                        
-                        if config.active_timer_id:
-                            self.window.after_cancel(config.active_timer_id)
-                        
-                        start_countdown(60, self.labels['timer_label'], 
-                                      self.labels['status_bar'], self.window)
-                    else:
-                        if not config.active_timer_id:
-                            self.labels['timer_label'].pack_forget()
-                        
-                        message = TRANSLATIONS[lang_code][ip_status["key"]].format(
-                            **ip_status.get("params", {})
-                        )
-                        style_key = ip_status.get("style", "success")
-                        color = colors.get(style_key, colors['success'])
-                        self.labels['status_bar'].config(text=message, foreground=color)
+                    self.show_ip_status(ip_status, lang_code, colors)
+                    if self.ip_monitor and ip_status.get("key") in ("ip_no_change", "ip_changed_from_to"):
+                        self.ip_monitor.note_registered(data.last_ip)
                 else:
                     self.labels['timer_label'].pack_forget()
                     self.labels['status_bar'].config(
@@ -723,7 +795,8 @@ class ModernVexoChecker:
                         foreground=colors['success']
                     )
                 
-                app_settings["last_fetched_data"] = config.last_fetched_data
+                app_settings["last_fetched_data"] = data.to_dict()
+                app_settings["last_fetched_at"] = time.time()
                 save_settings()
                 if on_success_callback:
                     on_success_callback()                
@@ -738,7 +811,104 @@ class ModernVexoChecker:
                 state="normal",
                 text=f"🔄 {TRANSLATIONS[lang_code]['fetch_button']}"
             )
+            if self.refresh_scheduler:
+                self.refresh_scheduler.on_fetch_finished(result)
+    
+    def show_stale_notice(self, error, lang_code, colors):
+        """Status bar note that the shown data is the last saved copy"""
+        fetched_at = app_settings.get("last_fetched_at")
+        when = time.strftime("%Y-%m-%d %H:%M", time.localtime(fetched_at)) if fetched_at else "-"
+        self.labels['status_bar'].config(
+            text=TRANSLATIONS[lang_code]["stale_data_notice"].format(error=error, time=when),
+            foreground=colors['warning']
+        )
     
+    def show_ip_status(self, ip_status, lang_code, colors):
+        """Shows an IP registration result in the status bar (with the 60 s wait after a change)"""
+        if ip_status.get("key") == "ip_update_queued":
+            self.schedule_outbound_replay()
+        if ip_status.get("key") == "ip_changed_from_to":
+            wait_message = TRANSLATIONS[lang_code]["ip_wait_notice"]
+            self.labels['status_bar'].config(text=wait_message, foreground=colors['warning'])
+            
+            if self.countdown:
+                self.countdown.cancel()
+            
+            self.countdown = start_countdown(60, self.labels['timer_label'], 
+                                             self.labels['status_bar'], self.timers)
+        else:
+            if not (self.countdown and self.countdown.active):
+                self.labels['timer_label'].pack_forget()
+            
+            message = TRANSLATIONS[lang_code][ip_status["key"]].format(
+                **ip_status.get("params", {})
+            )
+            style_key = ip_status.get("style", "success")
+            color = colors.get(style_key, colors['success'])
+            self.labels['status_bar'].config(text=message, foreground=color)
+
+    def register_current_ip(self, public_ip, old_ip):
+        """Called by the IP monitor (worker thread) when the public IP really changed"""
+        url = app_settings.get("last_used_url", "").strip()
+        api_url = get_api_url(url)
+        if not api_url:
+            return {"key": "ip_update_fail", "params": {}, "style": "warning"}
+        return register_ip_or_queue(url, api_url, public_ip, old_ip)
+
+    def schedule_outbound_replay(self):
+        """Arms a timer for the next queued IP registration (none when the queue is empty)"""
+        self.timers.cancel(self.outbound_timer)
+        self.outbound_timer = None
+        delay = outbound_queue.seconds_until_next()
+        if delay is not None:
+            self.outbound_timer = self.timers.call_later(int(max(1, delay) * 1000), self.replay_outbound_queue)
+
+    def replay_outbound_queue(self):
+        """Sends due queued IP registrations once the network is back"""
+        self.outbound_timer = None
+        if not has_default_route():
+            self.outbound_timer = self.timers.call_later(
+                outbound_queue.RETRY_BASE * 1000, self.replay_outbound_queue
+            )
+            return
+
+        def on_done(answered):
+            current_url = app_settings.get("last_used_url", "").strip()
+            for url, ip_status in answered:
+                # Other subscriptions' answers are not shown, their data is not on screen
+                if url == current_url:
+                    self.on_background_ip_registered(ip_status)
+            self.schedule_outbound_replay()
+
+        self.executor.submit(replay_queued_ip_updates, on_done=on_done,
+                             on_error=lambda e: self.schedule_outbound_replay())
+
+    def poll_ip_monitor(self):
+        """Runs one IP monitor step on the worker pool, then schedules the next one"""
+        def on_done(ip_status):
+            if ip_status:
+                self.on_background_ip_registered(ip_status)
+            self.timers.call_later(LOCAL_CHECK_INTERVAL * 1000, self.poll_ip_monitor)
+
+        self.executor.submit(
+            self.ip_monitor.check, on_done=on_done,
+            on_error=lambda e: self.timers.call_later(LOCAL_CHECK_INTERVAL * 1000, self.poll_ip_monitor)
+        )
+
+    def on_background_ip_registered(self, ip_status):
+        """Main-thread handler for registrations made by the IP monitor"""
+        if ip_status.get("key") == "ip_changed_from_to" and config.last_fetched_data:
+            new_ip = ip_status["params"]["new_ip"]
+            config.last_fetched_data.last_ip = new_ip
+            self.renderer.apply(self.labels, {'ip': {'text': new_ip}})
+            app_settings["last_fetched_data"] = config.last_fetched_data.to_dict()
+            save_settings()
+            if self.refresh_scheduler:
+                self.refresh_scheduler.on_fetch_finished(
+                    {"success": True, "sub_data": config.last_fetched_data, "ip_status": ip_status}
+                )
+        self.show_ip_status(ip_status, config.current_language, self.get_theme_colors())
+
     def on_window_close(self):
         """Handle close"""
         lang_code = config.current_language
@@ -746,13 +916,90 @@ class ModernVexoChecker:
         
         if self.is_dns_connected:
             message = TRANSLATIONS[lang_code]["exit_confirm_dns_set"]
-            if messagebox.askyesno(title, message):
-                unset_dns_synchronously()
-                self.window.destroy()
         else:
             message = TRANSLATIONS[lang_code]["exit_confirm_no_dns"]
-            if messagebox.askyesno(title, message):
-                self.window.destroy()
+        if not messagebox.askyesno(title, message):
+            return
+        
+        # DNS is restored on a worker with a hard deadline; the window stays responsive
+        self.is_operation_in_progress = True
+        self.fetch_button.config(state="disabled")
+        self.dns_toggle_button.config(state="disabled")
+        coordinator = ShutdownCoordinator(
+            self.timers, self.executor, self.labels['status_bar'], self.finish_close, restore=self.dns_control.restore_dns
+        )
+        coordinator.start(lang_code, restore=self.is_dns_connected)
+    
+    def finish_close(self):
+        """Final step of closing, after DNS was restored (or the restore deadline passed)"""
+        self.stop_local_forwarder()
+        if self.instance_server:
+            self.instance_server.stop()
+        if self.metrics_server:
+            self.metrics_server.stop()
+        self.executor.shutdown()
+        self.dns_control.stop()
+        self.window.destroy()
+    
+    def start_instance_server(self):
+        """Listens for commands forwarded by later launches of the app"""
+        # The server thread only queues commands; Tk is touched on the Tk thread alone
+        self.instance_server = CommandServer(self.instance_commands.put)
+        try:
+            self.instance_server.start()
+        except OSError as e:
+            print(f"Could not start the instance command channel: {e}")
+            self.instance_server = None
+            return
+        self.poll_instance_commands()
+    
+    def poll_instance_commands(self):
+        """Runs forwarded commands; essential, so a minimized window still comes back"""
+        self.on_instance_command()
+        self.timers.call_later(COMMAND_POLL_MS, self.poll_instance_commands)
+    
+    def start_metrics_server(self):
+        """Serves health metrics on 127.0.0.1 when "metrics_port" is set in the settings"""
+        port = app_settings.get("metrics_port")
+        if not port:
+            return
+        import metrics
+        metrics.set_gauge_callback(metrics.DNS_CONNECTED, lambda: self.is_dns_connected)
+        # Only the service client has metrics(): DNS work done in-process is already recorded here
+        service_metrics = getattr(self.dns_control, "metrics", None)
+        if service_metrics:
+            metrics.add_source("dns_service", service_metrics)
+        self.metrics_server = metrics.MetricsServer(int(port))
+        try:
+            self.metrics_server.start()
+        except OSError as e:
+            print(f"Could not start the metrics endpoint on port {port}: {e}")
+            self.metrics_server = None
+    
+    def on_instance_command(self):
+        """Brings the window to the front and runs commands forwarded by another launch"""
+        while True:
+            try:
+                command = self.instance_commands.get_nowait()
+            except queue.Empty:
+                return
+            self.window.deiconify()
+            self.window.lift()
+            self.window.focus_force()
+            if self.is_operation_in_progress:
+                continue
+            if command == COMMAND_SET_DNS:
+                self.on_dns_connect_click()
+            elif command == COMMAND_UNSET_DNS:
+                self.on_dns_unset_click()
+            elif command == COMMAND_DIAGNOSTICS:
+                self.arm_diagnostics()
+    
+    def recover_dirty_dns(self):
+        """Reconciles DNS left changed by a previous run that crashed or was killed"""
+        if read_journal() is None:
+            return
+        self.executor.submit(self.dns_control.reconcile)
     
     def run(self):
         """Run application"""
@@ -760,10 +1007,33 @@ class ModernVexoChecker:
         
         self.update_ui_text()
         
+        if diagnostics.DIAGNOSTICS_ARG in sys.argv:
+            self.arm_diagnostics()
+        
+        if "--set-dns" not in sys.argv:
+            self.recover_dirty_dns()
+        
         if "--set-dns" in sys.argv:
             self.on_dns_connect_click()
         elif "--unset-dns" in sys.argv:
             self.on_dns_unset_click()
         
+        self.start_instance_server()
+        self.start_metrics_server()
+        # IP registrations queued while offline (possibly in an earlier run)
+        self.schedule_outbound_replay()
+        
+        if app_settings.get("auto_refresh", True):
+            self.refresh_scheduler = AutoRefreshScheduler(self.timers, self.on_auto_refresh, self.is_fetch_busy)
+            # With a cached snapshot the first background check can wait; otherwise fetch soon
+            self.refresh_scheduler.start(delay=None if config.last_fetched_data else 5)
+        
+        if app_settings.get("auto_update_ip", True):
+            self.ip_monitor = IpChangeDetector(
+                get_public_ip, self.register_current_ip,
+                registered_ip=config.last_fetched_data.last_ip if config.last_fetched_data else None
+            )
+            self.poll_ip_monitor()
+        
         self.update_dns_button_status()
         self.window.mainloop()
\ No newline at end of file
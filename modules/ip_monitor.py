@@ -0,0 +1,182 @@
+# ip_monitor.py
+import ctypes
+import socket
+import struct
+import sys
+import threading
+import time
+
+LOCAL_CHECK_INTERVAL = 10        # Local signals are cheap: no network traffic at all
+DEBOUNCE_SECONDS = 5             # A local change must settle before it is confirmed
+MIN_CONFIRM_INTERVAL = 60        # Never ask the external IP services more often than this
+MAX_CONFIRM_INTERVAL = 15 * 60   # NAT can change the public IP without any local signal
+FRESH_IP_MAX_AGE = MAX_CONFIRM_INTERVAL
+CONFLICT_BACKOFF_BASE = 60
+CONFLICT_BACKOFF_MAX = 60 * 60
+
+
+def get_default_gateway():
+    """Returns the IPv4 default gateway through GetBestRoute (no process spawn), or None."""
+    if sys.platform != "win32":
+        return None
+    try:
+        # MIB_IPFORWARDROW is 14 DWORDs; dwForwardNextHop is the 4th
+        row = (ctypes.c_uint32 * 14)()
+        if ctypes.windll.iphlpapi.GetBestRoute(struct.unpack("<I", socket.inet_aton("8.8.8.8"))[0], 0, row) != 0:
+            return None
+        return socket.inet_ntoa(struct.pack("<I", row[3]))
+    except Exception:
+        return None
+
+
+# MIB_IPADDRROW: dwAddr, dwIndex, dwMask, dwBCastAddr, dwReasmSize, two WORDs
+IP_ADDR_ROW = struct.Struct("<4sIIIIHH")
+ERROR_INSUFFICIENT_BUFFER = 122
+
+
+def parse_ip_addr_table(data):
+    """The IPv4 addresses (without loopback) of a MIB_IPADDRTABLE, sorted."""
+    count = struct.unpack_from("<I", data, 0)[0]
+    addresses = (socket.inet_ntoa(IP_ADDR_ROW.unpack_from(data, 4 + i * IP_ADDR_ROW.size)[0])
+                 for i in range(count))
+    return tuple(sorted(address for address in addresses if not address.startswith("127.")))
+
+
+def get_interface_addresses():
+    """
+    The host's IPv4 interface addresses through GetIpAddrTable, or () elsewhere.
+    A read of the local stack's table: unlike resolving the host name, it never
+    waits for DNS or NetBIOS.
+    """
+    if sys.platform != "win32":
+        return ()
+    try:
+        get_table = ctypes.windll.iphlpapi.GetIpAddrTable
+        size = ctypes.c_ulong(0)
+        # The table can grow between the size query and the read
+        for _ in range(3):
+            buffer = ctypes.create_string_buffer(max(size.value, 4))
+            error = get_table(buffer, ctypes.byref(size), False)
+            if error == 0:
+                return parse_ip_addr_table(buffer.raw)
+            if error != ERROR_INSUFFICIENT_BUFFER:
+                break
+    except Exception:
+        pass
+    return ()
+
+
+def get_local_network_signature():
+    """
+    A cheap fingerprint of the local network: the source address of the default
+    route, the host's interface addresses and the default gateway.
+    When this changes, the public IP has most likely changed too.
+    """
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            # connect() on a UDP socket only picks the route, it sends nothing
+            sock.connect(("8.8.8.8", 53))
+            route_source = sock.getsockname()[0]
+    except OSError:
+        route_source = None
+
+    return (route_source, get_interface_addresses(), get_default_gateway())
+
+
+class IpChangeDetector:
+    """
+    Detector that keeps the registered IP in sync with the public IP; the caller
+    runs check() every LOCAL_CHECK_INTERVAL seconds off the GUI thread.
+
+    Local signals are polled often; the external IP services are only queried
+    (throttled) after a debounced local change or a long quiet period, and
+    /api/update_ip is only called when the public IP really differs from the
+    registered one. IP_CONFLICT and other failures back off exponentially.
+    """
+
+    def __init__(self, get_public_ip, register_ip, registered_ip=None,
+                 get_signature=get_local_network_signature, clock=time.monotonic):
+        self.get_public_ip = get_public_ip
+        self.register_ip = register_ip
+        self.registered_ip = registered_ip
+        self.get_signature = get_signature
+        self.clock = clock
+
+        self.confirmed_ip = None
+        self.last_confirm = None
+        self.next_confirm_allowed = 0
+        self.backoff = 0
+        self._signature = None
+        self._change_seen_at = None
+        self._lock = threading.Lock()
+
+    def get_fresh_ip(self):
+        """The public IP if it was confirmed recently and nothing changed locally since, else None."""
+        with self._lock:
+            if self.confirmed_ip is None or self._change_seen_at is not None:
+                return None
+            if self.clock() - self.last_confirm > FRESH_IP_MAX_AGE:
+                return None
+            return self.confirmed_ip
+
+    def note_registered(self, ip):
+        """Keeps the detector in sync when a manual refresh registered or confirmed an IP."""
+        with self._lock:
+            self.registered_ip = ip
+            self.confirmed_ip = ip
+            self.last_confirm = self.clock()
+            self.backoff = 0
+
+    def check(self):
+        """
+        One detector step. Returns the ip_status of a registration attempt, or None
+        when no registration was needed.
+        """
+        now = self.clock()
+        signature = self.get_signature()
+        if self._signature is None:
+            # First step: nothing to compare with yet
+            self._signature = signature
+        elif signature != self._signature:
+            self._signature = signature
+            self._change_seen_at = now
+
+        if now < self.next_confirm_allowed:
+            return None
+
+        settled_change = self._change_seen_at is not None and now - self._change_seen_at >= DEBOUNCE_SECONDS
+        overdue = self.last_confirm is None or now - self.last_confirm >= MAX_CONFIRM_INTERVAL
+        if not (settled_change or overdue):
+            return None
+
+        return self._confirm(now)
+
+    def _confirm(self, now):
+        public_ip = self.get_public_ip()
+        with self._lock:
+            self.last_confirm = now
+            self._change_seen_at = None
+            self.next_confirm_allowed = now + MIN_CONFIRM_INTERVAL
+            self.confirmed_ip = public_ip
+
+        if not public_ip or public_ip == self.registered_ip:
+            return None
+
+        try:
+            ip_status = self.register_ip(public_ip, self.registered_ip)
+        except Exception:
+            ip_status = {"key": "ip_update_fail", "params": {}, "style": "warning"}
+
+        if ip_status.get("key") == "ip_changed_from_to":
+            with self._lock:
+                self.registered_ip = public_ip
+                self.backoff = 0
+        else:
+            # IP_CONFLICT (409) or a failed update: back off exponentially
+            with self._lock:
+                self.backoff = min(CONFLICT_BACKOFF_MAX, (self.backoff * 2) or CONFLICT_BACKOFF_BASE)
+                self.next_confirm_allowed = now + self.backoff
+                # Retry after the backoff even if nothing changes locally
+                self._change_seen_at = now
+
+        return ip_status
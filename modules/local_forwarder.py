@@ -0,0 +1,133 @@
+# local_forwarder.py
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+LOCAL_DNS_IP = "127.0.0.1"
+# Answered by the forwarder itself, so the DNS service can tell that it is alive
+PROBE_NAME = "forwarder-probe.vexo.invalid"
+_PROBE_QNAME = b"".join(bytes([len(label)]) + label.encode("ascii") for label in PROBE_NAME.split(".")) + b"\x00"
+# recvfrom() wakes up at least this often to notice stop()
+RECEIVE_TIMEOUT = 0.5
+MAX_ERROR_BACKOFF = 1.0
+
+
+def _probe_answer(query):
+    """The NXDOMAIN answer to a probe query."""
+    return query[:2] + b"\x81\x83" + query[4:]
+
+
+def probe(ip=LOCAL_DNS_IP, port=53, timeout=1.0):
+    """True when a forwarder answers the probe on ip:port."""
+    from dns_transport import build_query, get_query_id
+
+    query = build_query(PROBE_NAME, query_id=0x5650)
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.settimeout(timeout)
+            sock.sendto(query, (ip, port))
+            return get_query_id(sock.recvfrom(4096)[0]) == 0x5650
+    except OSError:
+        return False
+
+
+class LocalForwarder:
+    """
+    A small UDP DNS forwarder bound to the loopback address.
+    Every query received locally is handed to the upstream client (DoH/DoT/plain),
+    which keeps its own persistent connections, and the answer is sent back as-is.
+    """
+
+    def __init__(self, upstream, listen_ip=LOCAL_DNS_IP, listen_port=53, max_workers=16):
+        self.upstream = upstream
+        self.listen_ip = listen_ip
+        self.listen_port = listen_port
+        self.max_workers = max_workers
+        self._sock = None
+        self._executor = None
+        self._thread = None
+
+    @property
+    def is_running(self):
+        return self._sock is not None
+
+    def start(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if hasattr(socket, "SIO_UDP_CONNRESET"):
+            # Windows: an ICMP port-unreachable for a client that went away would
+            # otherwise make the next recvfrom() fail with ConnectionResetError
+            sock.ioctl(socket.SIO_UDP_CONNRESET, False)
+        sock.bind((self.listen_ip, self.listen_port))
+        sock.settimeout(RECEIVE_TIMEOUT)
+        # Port 0 means "any free port"
+        self.listen_port = sock.getsockname()[1]
+        self._sock = sock
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="dns-forward")
+        self._thread = threading.Thread(target=self._serve, args=(sock, self._executor), daemon=True)
+        self._thread.start()
+
+    def _serve(self, sock, executor):
+        errors = 0
+        while self._sock is sock:
+            try:
+                packet, client = sock.recvfrom(4096)
+            except socket.timeout:
+                continue
+            except OSError:
+                # Only stop() ends the loop; an error caused by one client must not take
+                # down the resolver the whole system is pointed at. Repeated errors back
+                # off instead of spinning a core.
+                if self._sock is not sock:
+                    break
+                errors += 1
+                time.sleep(min(MAX_ERROR_BACKOFF, 0.01 * 2 ** min(errors, 7)))
+                continue
+            errors = 0
+            if self._sock is not sock:
+                # The wake-up packet from stop()
+                break
+            try:
+                executor.submit(self._handle, sock, packet, client)
+            except RuntimeError:
+                # The executor was shut down by stop()
+                break
+
+    def _handle(self, sock, packet, client):
+        if packet[12:12 + len(_PROBE_QNAME)] == _PROBE_QNAME:
+            try:
+                sock.sendto(_probe_answer(packet), client)
+            except OSError:
+                pass
+            return
+        started = time.perf_counter()
+        try:
+            response = self.upstream.query(packet)
+            metrics.observe(metrics.RESOLVER_LATENCY, time.perf_counter() - started,
+                            upstream=type(self.upstream).__name__)
+            sock.sendto(response, client)
+        except Exception:
+            # The client will retry on its own; a dropped query is the safest answer
+            pass
+
+    def stop(self):
+        sock, self._sock = self._sock, None
+        if sock:
+            # Wakes the receive loop, which then sees that it was stopped
+            try:
+                with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as waker:
+                    waker.sendto(b"", (self.listen_ip, self.listen_port))
+            except OSError:
+                pass
+        if self._thread:
+            # No submit() can race the executor shutdown once the loop has ended
+            self._thread.join(RECEIVE_TIMEOUT * 2)
+            self._thread = None
+        if sock:
+            sock.close()
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        self.upstream.close()
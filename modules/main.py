@@ -1,18 +1,61 @@
 # main.py
 import sys
+import time
 import ctypes
+import subprocess
 from tkinter import messagebox
 
 from dns_manager import is_admin, get_main_executable_path
-from gui import ModernVexoChecker  # تغییر: gui_modern به gui
+from single_instance import InstanceLock, command_from_argv, send_command
+from config import argument_value
+from dns_service import SERVICE_ARG, LAUNCH_ID_ARG, connect_dns_service, launch_dns_service, wait_for_dns_service
+
+# How long a launch that lost the lock waits for the winner to open its channel
+LOCK_HANDOFF_ATTEMPTS = 10
+LOCK_HANDOFF_DELAY = 0.2
 
 def main():
     """Main entry point"""
+    if SERVICE_ARG in sys.argv:
+        from dns_service import run_service
+        run_service(launch_id=argument_value(sys.argv, LAUNCH_ID_ARG))
+        sys.exit()
+    
+    # An instance is already running: hand it our command and leave (no UAC prompt, no window)
+    command = command_from_argv(sys.argv)
+    if send_command(command):
+        sys.exit()
+    
+    # Taken before the service is started, so two launches at once never both ask for elevation
+    instance_lock = InstanceLock()
+    if not instance_lock.acquire():
+        # Another instance is starting right now
+        for _ in range(LOCK_HANDOFF_ATTEMPTS):
+            if send_command(command):
+                break
+            time.sleep(LOCK_HANDOFF_DELAY)
+        sys.exit()
+    
+    dns_control = None
     if not is_admin():
+        # Privileged DNS work is done by the DNS service, so the GUI itself runs unelevated.
+        # Starting the service is the only UAC prompt, and only if it is not running yet.
+        dns_control = connect_dns_service()
+        if dns_control is None:
+            launch_id = launch_dns_service()
+            if not launch_id:
+                sys.exit()
+            dns_control = wait_for_dns_service(launch_id)
+    
+    if dns_control is None and not is_admin():
+        # The service did not come up: elevate the whole app as before
+        # (the elevated copy takes the instance lock itself)
+        instance_lock.release()
         try:
             executable_path = get_main_executable_path()
+            parameters = subprocess.list2cmdline(sys.argv[1:]) or None
             ret_code = ctypes.windll.shell32.ShellExecuteW(
-                None, "runas", executable_path, None, None, 1
+                None, "runas", executable_path, parameters, None, 1
             )
             if ret_code <= 32:
                 pass
@@ -21,7 +64,8 @@ def main():
         finally:
             sys.exit()
     
-    app = ModernVexoChecker()
+    from gui import ModernVexoChecker  # تغییر: gui_modern به gui
+    app = ModernVexoChecker(dns_control)
     app.create_window()
     app.run()
 
@@ -0,0 +1,241 @@
+# metrics.py
+"""
+In-process metrics with an optional local HTTP endpoint.
+
+Recording is always on and cheap (a lock and a few additions). The endpoint is
+only started when "metrics_port" is set in the settings; it listens on loopback
+and serves the same data as Prometheus text (/metrics) and JSON (/metrics.json).
+
+Work done in another process (the DNS service runs the netsh commands) is merged
+in at scrape time: add_source() registers a call returning that process's
+export_samples(), and its series are served with a process label.
+"""
+import bisect
+import json
+import threading
+import time
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 15, 30)
+RESOLVER_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+_lock = threading.Lock()
+_metrics = {}
+_gauge_callbacks = {}
+# process label -> fetch() returning that process's export_samples()
+_sources = {}
+
+
+class _Metric:
+    def __init__(self, name, kind, help_text, buckets=None):
+        self.name = name
+        self.kind = kind
+        self.help_text = help_text
+        self.buckets = buckets
+        # labels (sorted tuple of pairs) -> value, or [bucket counts, count, sum] for histograms
+        self.samples = {}
+
+
+def _define(name, kind, help_text, buckets=None):
+    _metrics[name] = _Metric(name, kind, help_text, buckets)
+    return name
+
+
+FETCH_DURATION = _define(
+    "vexo_fetch_duration_seconds", "histogram", "Duration of a full subscription refresh.", LATENCY_BUCKETS)
+IP_PROVIDER_REQUESTS = _define(
+    "vexo_ip_provider_requests_total", "counter", "Public IP lookups per provider and result.")
+SUBPROCESS_DURATION = _define(
+    "vexo_subprocess_duration_seconds", "histogram", "Run time of spawned system commands.", LATENCY_BUCKETS)
+RESOLVER_LATENCY = _define(
+    "vexo_resolver_latency_seconds", "histogram", "Upstream latency of queries through the local forwarder.",
+    RESOLVER_BUCKETS)
+REFRESH_SUCCESS_TIME = _define(
+    "vexo_last_refresh_timestamp_seconds", "gauge", "Unix time of the last successful refresh.")
+LAST_REFRESH_AGE = _define(
+    "vexo_last_refresh_age_seconds", "gauge", "Seconds since the last successful refresh.")
+DNS_CONNECTED = _define(
+    "vexo_dns_connected", "gauge", "1 while the app's DNS is set on the adapters.")
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def inc(name, amount=1, **labels):
+    key = _label_key(labels)
+    with _lock:
+        samples = _metrics[name].samples
+        samples[key] = samples.get(key, 0) + amount
+
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _metrics[name].samples[_label_key(labels)] = value
+
+
+def observe(name, value, **labels):
+    metric = _metrics[name]
+    key = _label_key(labels)
+    with _lock:
+        sample = metric.samples.get(key)
+        if sample is None:
+            sample = metric.samples[key] = [[0] * len(metric.buckets), 0, 0.0]
+        index = bisect.bisect_left(metric.buckets, value)
+        if index < len(metric.buckets):
+            sample[0][index] += 1
+        sample[1] += 1
+        sample[2] += value
+
+
+def set_gauge_callback(name, callback):
+    """callback() is evaluated at scrape time (e.g. state owned by the GUI)."""
+    _gauge_callbacks[name] = callback
+
+
+def add_source(process, fetch):
+    """fetch() is called at scrape time and returns another process's export_samples()."""
+    _sources[process] = fetch
+
+
+def mark_refresh():
+    set_gauge(REFRESH_SUCCESS_TIME, time.time())
+
+
+def _is_sample(metric, value):
+    if metric.kind != "histogram":
+        return isinstance(value, (int, float))
+    return (isinstance(value, list) and len(value) == 3 and isinstance(value[0], list)
+            and len(value[0]) == len(metric.buckets))
+
+
+def _collect_sources():
+    """The samples of the processes registered with add_source(): {name: {labels key: value}}."""
+    collected = {}
+    for process, fetch in list(_sources.items()):
+        try:
+            exported = fetch()
+        except Exception:
+            # The other process is gone or busy: its series are left out of this scrape
+            continue
+        for name, labels, value in exported:
+            metric = _metrics.get(name)
+            if metric is None or not isinstance(labels, dict) or not _is_sample(metric, value):
+                continue
+            collected.setdefault(name, {})[_label_key({**labels, "process": process})] = value
+    return collected
+
+
+def _collect():
+    """Copies every metric, with callback gauges, the refresh age and other processes' samples filled in."""
+    values = {}
+    for name, callback in list(_gauge_callbacks.items()):
+        try:
+            values[name] = float(callback())
+        except Exception:
+            continue
+    remote = _collect_sources()
+    with _lock:
+        refreshed = _metrics[REFRESH_SUCCESS_TIME].samples.get(())
+        if refreshed is not None:
+            _metrics[LAST_REFRESH_AGE].samples[()] = round(time.time() - refreshed, 3)
+        for name, value in values.items():
+            _metrics[name].samples[()] = value
+        return [
+            (metric, {**{key: [list(value[0]), value[1], value[2]] if metric.kind == "histogram" else value
+                         for key, value in metric.samples.items()},
+                      **remote.get(metric.name, {})})
+            for metric in _metrics.values()
+        ]
+
+
+def export_samples():
+    """Every recorded sample as a JSON-friendly [name, labels, value] list, for add_source() in another process."""
+    return [[metric.name, dict(key), value] for metric, samples in _collect() for key, value in samples.items()]
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def render_prometheus():
+    lines = []
+    for metric, samples in _collect():
+        lines.append(f"# HELP {metric.name} {metric.help_text}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for key, value in samples.items():
+            if metric.kind != "histogram":
+                lines.append(f"{metric.name}{_format_labels(key)} {value}")
+                continue
+            bucket_counts, count, total = value
+            cumulative = 0
+            for bound, bucket_count in zip(metric.buckets, bucket_counts):
+                cumulative += bucket_count
+                lines.append(f"{metric.name}_bucket{_format_labels(key, [('le', bound)])} {cumulative}")
+            lines.append(f"{metric.name}_bucket{_format_labels(key, [('le', '+Inf')])} {count}")
+            lines.append(f"{metric.name}_sum{_format_labels(key)} {total}")
+            lines.append(f"{metric.name}_count{_format_labels(key)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def snapshot():
+    """The metrics as a JSON-friendly dict."""
+    result = {}
+    for metric, samples in _collect():
+        entries = []
+        for key, value in samples.items():
+            entry = {"labels": dict(key)}
+            if metric.kind == "histogram":
+                bucket_counts, count, total = value
+                entry.update({"count": count, "sum": total,
+                              "buckets": dict(zip((str(bound) for bound in metric.buckets), bucket_counts))})
+            else:
+                entry["value"] = value
+            entries.append(entry)
+        result[metric.name] = {"type": metric.kind, "help": metric.help_text, "samples": entries}
+    return result
+
+
+class MetricsServer:
+    """Serves the metrics on 127.0.0.1:port from a daemon thread."""
+
+    def __init__(self, port, host="127.0.0.1"):
+        self.host = host
+        self.port = port
+        self._server = None
+
+    def start(self):
+        # Imported here: http.server is not needed unless the endpoint is enabled
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, content_type = render_prometheus().encode("utf-8"), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, content_type = json.dumps(snapshot()).encode("utf-8"), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name="metrics", daemon=True).start()
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
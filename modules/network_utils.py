@@ -1,18 +1,49 @@
 # network_utils.py
-import requests
+# requests is imported inside the functions that use it: it is one of the
+# heaviest imports of the app and is not needed until the first fetch.
 import threading
 import socket
-from config import TRANSLATIONS, app_settings, save_settings
+import time
+from config import TRANSLATIONS, app_settings, save_settings, settings_lock
+from resilience import get_breaker, backoff_delays, Deadline, CircuitOpenError
+import metrics
+import diagnostics
+import panel_mirrors
+from subscription import Subscription
+from connectivity import probe_connectivity, OFFLINE, CAPTIVE_PORTAL
+import outbound_queue
 
-def get_public_ip():
-    """Tries to get the public IP from reliable sources with a fallback."""
-    try:
-        return requests.get('https://icanhazip.com', timeout=5).text.strip()
-    except requests.RequestException:
+IP_PROVIDERS = ['https://icanhazip.com', 'https://v4.ident.me']
+REQUEST_TIMEOUT = 5
+# Whole-refresh budget; kept under the 20-second GUI watchdog so errors surface first
+REFRESH_BUDGET = 15
+MIN_ATTEMPT_TIMEOUT = 0.5
+
+def get_public_ip(deadline=None):
+    """
+    Tries to get the public IP from reliable sources with a fallback.
+    Providers whose circuit is open are skipped instead of costing a full timeout.
+    """
+    import requests
+
+    for provider in IP_PROVIDERS:
+        timeout = deadline.timeout(REQUEST_TIMEOUT) if deadline else REQUEST_TIMEOUT
+        if timeout < MIN_ATTEMPT_TIMEOUT:
+            break
+        breaker = get_breaker(provider)
+        if not breaker.allow_request():
+            metrics.inc(metrics.IP_PROVIDER_REQUESTS, provider=provider, result="skipped")
+            continue
         try:
-            return requests.get('https://v4.ident.me', timeout=5).text.strip()
+            public_ip = requests.get(provider, timeout=timeout).text.strip()
         except requests.RequestException:
-            return None
+            breaker.record_failure()
+            metrics.inc(metrics.IP_PROVIDER_REQUESTS, provider=provider, result="failure")
+            continue
+        breaker.record_success()
+        metrics.inc(metrics.IP_PROVIDER_REQUESTS, provider=provider, result="success")
+        return public_ip
+    return None
 
 def update_ip_check_hosts():
     """
@@ -33,7 +64,9 @@ def update_ip_check_hosts():
             
             # If the IP has changed or is not stored yet, update it
             if current_ip != stored_ip:
-                app_settings[key] = current_ip
+                # Runs on a worker thread
+                with settings_lock:
+                    app_settings[key] = current_ip
                 something_changed = True
         except socket.gaierror:
             # If DNS resolution fails, just skip and do nothing
@@ -43,44 +76,149 @@ def update_ip_check_hosts():
     if something_changed:
         save_settings()
 
-def process_all_data(url, lang_code):
-    """Process subscription data and IP updates"""
+def get_api_url(url):
+    """Derives the subscription API URL from a subscription link, or None if it is not a Vexo link."""
+    if '/api/sub/' in url:
+        return url
+    elif '/sub/' in url:
+        return url.replace('/sub/', '/api/sub/')
+    return None
+
+def update_registered_ip(url, api_url, public_ip, old_ip=None, timeout=REQUEST_TIMEOUT):
+    """
+    Registers public_ip for the subscription through /api/update_ip of the fastest
+    healthy panel mirror (the subscription's own panel when it has none).
+    Returns the ip_status dict shown in the status bar. Raises RequestException
+    or CircuitOpenError when the panel cannot be reached or fails (5xx).
+    """
+    import requests
+
+    token = outbound_queue.get_token(url)
+
+    def send(base, timeout):
+        return requests.post(base + '/api/update_ip', json={'token': token, 'ip': public_ip}, timeout=timeout)
+
+    update_response = panel_mirrors.request_single(panel_mirrors.best_base(url), send, timeout)
+    
+    if panel_mirrors.is_mirror_failure(update_response):
+        # The panel failed, the registration was not refused: it is worth sending again
+        raise requests.HTTPError(f"update_ip answered {update_response.status_code}", response=update_response)
+    if update_response.ok:
+        return {"key": "ip_changed_from_to", "params": {"old_ip": old_ip or "N/A", "new_ip": public_ip}, "style": "success"}
+
+    try:
+        update_data = update_response.json()
+    except ValueError:
+        update_data = {}
+    if update_response.status_code == 409 and update_data.get('error_code') == 'IP_CONFLICT':
+        return {"key": "ip_conflict_error", "params": {}, "style": "danger"}
+    return {"key": "ip_update_fail", "params": {}, "style": "warning"}
+
+def register_ip_or_queue(url, api_url, public_ip, old_ip=None, timeout=REQUEST_TIMEOUT):
+    """
+    update_registered_ip, except that when the panel cannot be reached or fails
+    (5xx) the registration is queued on disk and replayed later instead of being lost.
+    """
+    import requests
+
+    try:
+        ip_status = update_registered_ip(url, api_url, public_ip, old_ip, timeout=timeout)
+    except (requests.RequestException, CircuitOpenError):
+        outbound_queue.enqueue_ip_update(url, api_url, public_ip, old_ip)
+        return {"key": "ip_update_queued", "params": {"ip": public_ip}, "style": "warning"}
+    # A definite answer (success, conflict or another 4xx): an older queued IP for this subscription is obsolete
+    outbound_queue.discard(url)
+    return ip_status
+
+def replay_queued_ip_updates():
+    """Sends the queued IP registrations that are due. Returns [(url, ip_status)]."""
+    import requests
+
+    return outbound_queue.replay_due(
+        lambda entry: update_registered_ip(entry["url"], entry["api_url"], entry["ip"], entry["old_ip"]),
+        retry_on=(requests.RequestException, CircuitOpenError)
+    )
+
+def process_all_data(url, lang_code, known_public_ip=None):
+    """
+    Process subscription data and IP updates.
+    If known_public_ip is given (recently confirmed by the IP monitor), the external
+    IP services are not queried again.
+    """
+    started = time.perf_counter()
+    result = _process_all_data(url, lang_code, known_public_ip)
+    metrics.observe(metrics.FETCH_DURATION, time.perf_counter() - started,
+                    outcome="success" if result["success"] else "error")
+    if result["success"]:
+        metrics.mark_refresh()
+    return result
+
+def _process_all_data(url, lang_code, known_public_ip):
+    import requests
+
     final_result = {"success": False, "sub_data": None, "ip_status": None, "error": None}
-    results = {}
+
+    # Fail fast (well under a second) when offline or behind a captive portal
+    # ("offline" results let the UI keep showing the last data, marked as stale)
+    with diagnostics.span("connectivity_probe"):
+        connectivity = probe_connectivity()
+    if connectivity == OFFLINE:
+        final_result.update(error=TRANSLATIONS[lang_code]["error_offline"], offline=True)
+        return final_result
+    if connectivity == CAPTIVE_PORTAL:
+        final_result.update(error=TRANSLATIONS[lang_code]["error_captive_portal"], offline=True)
+        return final_result
+    results = {'public_ip': known_public_ip}
+    deadline = Deadline(REFRESH_BUDGET)
 
     def get_public_ip_thread():
-        results['public_ip'] = get_public_ip()
+        results['public_ip'] = get_public_ip(deadline)
 
     def fetch_sub_data_thread():
         retries = 3
         last_exception = None
+        delays = backoff_delays(retries - 1)
+        # Mirrors that failed during this refresh; the retries go to the others first
+        failed_mirrors = set()
+        headers = {'User-Agent': 'VexoChecker/5.7'}
+
+        def send(base, timeout):
+            response = requests.get(panel_mirrors.api_url_for(base, url), headers=headers, timeout=timeout)
+            response.raise_for_status()
+            return response
 
         for attempt in range(retries):
             try:
-                if '/api/sub/' in url:
-                    api_url = url
-                elif '/sub/' in url:
-                    api_url = url.replace('/sub/', '/api/sub/')
-                else:
+                api_url = get_api_url(url)
+                if not api_url:
                     raise ValueError(TRANSLATIONS[lang_code]["error_url"])
 
-                headers = {'User-Agent': 'VexoChecker/5.7'}
-                response = requests.get(api_url, headers=headers, timeout=5)
-                response.raise_for_status()
-                sub_data = response.json()
-                
-                if sub_data.get('error'):
-                    raise Exception(sub_data['error'])
+                timeout = deadline.timeout(REQUEST_TIMEOUT)
+                if timeout < MIN_ATTEMPT_TIMEOUT:
+                    # No budget left: fail fast
+                    last_exception = requests.exceptions.ConnectionError()
+                    break
+                try:
+                    base, response = panel_mirrors.fetch(url, send, timeout, failed_mirrors)
+                except CircuitOpenError:
+                    # Every panel mirror is known to be down: fail fast
+                    last_exception = requests.exceptions.ConnectionError()
+                    break
+                # Decoded and validated once; InvalidSubscription for a bad payload or an API error
+                sub_data = Subscription.from_payload(response.json())
                 
+                panel_mirrors.remember_mirrors(url, list(sub_data.mirrors))
                 results['sub_data'] = sub_data
-                results['api_url'] = api_url 
+                results['api_url'] = panel_mirrors.api_url_for(base, url)
                 results['error'] = None
                 return
 
             except requests.exceptions.RequestException as e:
                 last_exception = e
-                if attempt < retries - 1:
-                    time.sleep(1)
+                if panel_mirrors.rejects_link(getattr(e, "response", None)):
+                    # A definite answer about the link: retrying or using the cache would hide it
+                    break
+                if attempt < retries - 1 and deadline.sleep(next(delays)):
                     continue
                 else:
                     break
@@ -88,8 +226,11 @@ def process_all_data(url, lang_code):
                 last_exception = e
                 break
 
-        if isinstance(last_exception, requests.exceptions.RequestException):
+        if panel_mirrors.rejects_link(getattr(last_exception, "response", None)):
+            results['error'] = TRANSLATIONS[lang_code]["error_url"]
+        elif isinstance(last_exception, requests.exceptions.RequestException):
             results['error'] = TRANSLATIONS[lang_code]["error_connect"]
+            results['offline'] = True
         elif isinstance(last_exception, ValueError):
             results['error'] = str(last_exception)
         else:
@@ -97,19 +238,23 @@ def process_all_data(url, lang_code):
         
         results['sub_data'] = None
 
-    ip_thread = threading.Thread(target=get_public_ip_thread)
-    sub_thread = threading.Thread(target=fetch_sub_data_thread)
-    ip_thread.start()
+    sub_thread = threading.Thread(target=diagnostics.spanned("subscription", fetch_sub_data_thread),
+                                  name="refresh-subscription", daemon=True)
     sub_thread.start()
-    ip_thread.join()
-    sub_thread.join()
+    if known_public_ip is None:
+        ip_thread = threading.Thread(target=diagnostics.spanned("public_ip", get_public_ip_thread),
+                                     name="refresh-public-ip", daemon=True)
+        ip_thread.start()
+        ip_thread.join(deadline.remaining())
+    sub_thread.join(deadline.remaining())
 
     if results.get('error'):
         final_result["error"] = results['error']
+        final_result["offline"] = results.get('offline', False)
         return final_result
 
     if not results.get('sub_data'):
-        final_result["error"] = TRANSLATIONS[lang_code]["error_connect"]
+        final_result.update(error=TRANSLATIONS[lang_code]["error_connect"], offline=True)
         return final_result
 
     sub_data = results['sub_data']
@@ -118,25 +263,19 @@ def process_all_data(url, lang_code):
 
     final_result["success"] = True
     final_result["sub_data"] = sub_data
-    old_ip = sub_data.get('last_ip')
+    old_ip = sub_data.last_ip
     
     if public_ip:
         if public_ip == old_ip:
             final_result["ip_status"] = {"key": "ip_no_change", "params": {"ip": public_ip}, "style": "success"}
+            outbound_queue.discard(url)
         else:
-            token = url.split('/sub/')[-1]
-            update_ip_url = api_url.split('/api/sub/')[0] + '/api/update_ip'
-            update_response = requests.post(update_ip_url, json={'token': token, 'ip': public_ip}, timeout=5)
-            
-            if update_response.ok:
-                final_result["ip_status"] = {"key": "ip_changed_from_to", "params": {"old_ip": old_ip or "N/A", "new_ip": public_ip}, "style": "success"}
-                final_result["sub_data"]["last_ip"] = public_ip
-            else:
-                update_data = update_response.json()
-                if update_response.status_code == 409 and update_data.get('error_code') == 'IP_CONFLICT':
-                    final_result["ip_status"] = {"key": "ip_conflict_error", "params": {}, "style": "danger"}
-                else:
-                    final_result["ip_status"] = {"key": "ip_update_fail", "params": {}, "style": "warning"}
+            with diagnostics.span("update_ip"):
+                final_result["ip_status"] = register_ip_or_queue(
+                    url, api_url, public_ip, old_ip, timeout=max(MIN_ATTEMPT_TIMEOUT, deadline.timeout(REQUEST_TIMEOUT))
+                )
+            if final_result["ip_status"]["key"] == "ip_changed_from_to":
+                sub_data.last_ip = public_ip
     else:
         final_result["ip_status"] = {"key": "ip_not_found", "params": {}, "style": "warning"}
         
@@ -0,0 +1,120 @@
+# outbound_queue.py
+import json
+import os
+import threading
+import time
+
+from config import APP_DATA_PATH
+
+# IP registrations that could not be sent (network down, panel unreachable).
+# Kept on disk so they survive a restart, one entry per subscription token:
+# a newer IP replaces an older one that was never sent.
+QUEUE_FILE = os.path.join(APP_DATA_PATH, 'outbound_queue.json')
+RETRY_BASE = 15
+RETRY_FACTOR = 2
+RETRY_MAX = 15 * 60
+
+_lock = threading.Lock()
+
+
+def get_token(url):
+    return url.split('/sub/')[-1]
+
+
+def read_queue():
+    """Returns {token: entry}; an unreadable queue counts as empty."""
+    try:
+        with open(QUEUE_FILE, "r", encoding='utf-8') as f:
+            entries = json.load(f)
+        return entries if isinstance(entries, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_queue(entries):
+    """Atomically replaces the queue file (removes it when the queue is empty)."""
+    if not entries:
+        try:
+            os.remove(QUEUE_FILE)
+        except FileNotFoundError:
+            pass
+        return
+    os.makedirs(APP_DATA_PATH, exist_ok=True)
+    temp_path = QUEUE_FILE + ".tmp"
+    with open(temp_path, "w", encoding='utf-8') as f:
+        json.dump(entries, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, QUEUE_FILE)
+
+
+def enqueue_ip_update(url, api_url, public_ip, old_ip, now=None):
+    """Queues the registration of public_ip, replacing any older one for the same subscription."""
+    now = time.time() if now is None else now
+    token = get_token(url)
+    with _lock:
+        entries = read_queue()
+        previous = entries.get(token)
+        entries[token] = {
+            "url": url,
+            "api_url": api_url,
+            "ip": public_ip,
+            # The IP the panel still has registered, for the "changed from" message
+            "old_ip": previous["old_ip"] if previous else old_ip,
+            "queued_at": now,
+            "attempts": 0,
+            "next_attempt": now + RETRY_BASE,
+        }
+        _write_queue(entries)
+
+
+def discard(url):
+    """Drops the queued registration of a subscription (it was sent, or is no longer needed)."""
+    token = get_token(url)
+    with _lock:
+        entries = read_queue()
+        if entries.pop(token, None) is not None:
+            _write_queue(entries)
+
+
+def seconds_until_next(now=None):
+    """Seconds until the next queued registration is due, or None when the queue is empty."""
+    entries = read_queue()
+    if not entries:
+        return None
+    now = time.time() if now is None else now
+    return max(0, min(entry.get("next_attempt", 0) for entry in entries.values()) - now)
+
+
+def replay_due(send, retry_on, now=None):
+    """
+    Sends every due registration with send(entry) -> ip_status. Entries failing with
+    one of the retry_on exceptions (no connection, a 5xx from the panel) stay queued
+    with exponential backoff; a definite answer (success, conflict, rejection) removes them.
+    Returns [(url, ip_status)] for the entries that got an answer.
+    """
+    now = time.time() if now is None else now
+    with _lock:
+        due = [(token, entry) for token, entry in read_queue().items() if entry.get("next_attempt", 0) <= now]
+
+    answered = []
+    for token, entry in due:
+        try:
+            ip_status = send(entry)
+        except retry_on:
+            attempts = entry.get("attempts", 0) + 1
+            with _lock:
+                entries = read_queue()
+                # Only reschedule if it was not replaced by a newer IP meanwhile
+                if entries.get(token, {}).get("ip") == entry["ip"]:
+                    entries[token]["attempts"] = attempts
+                    entries[token]["next_attempt"] = now + min(RETRY_MAX, RETRY_BASE * RETRY_FACTOR ** attempts)
+                    _write_queue(entries)
+            continue
+        with _lock:
+            entries = read_queue()
+            if entries.get(token, {}).get("ip") == entry["ip"]:
+                del entries[token]
+                _write_queue(entries)
+        answered.append((entry["url"], ip_status))
+    return answered
@@ -0,0 +1,248 @@
+# panel_mirrors.py
+"""
+Mirror selection for the Vexo panel API.
+
+A subscription can be served by several panel hosts ("mirrors"): the host of
+the subscription link itself, plus the base URLs listed in the payload's
+"mirrors" field or in the "panel_mirrors" setting ({token: [base URL, ...]}).
+Only https:// mirrors are used: the subscription token travels in every request.
+
+The first subscription request of a run (and again every REEVALUATE_INTERVAL)
+is sent to all mirrors at once and the first good answer is used. Every
+answer, including the late ones, updates the mirror's latency and success
+rate; in between, requests go to the fastest healthy mirror. The measurements
+are kept in the "mirror_stats" setting so that update_ip, which is never
+raced, has a ranking right after a restart.
+"""
+import queue
+import threading
+import time
+import urllib.parse
+
+from config import app_settings, save_settings, settings_lock
+from resilience import get_breaker, CircuitOpenError, OPEN
+from outbound_queue import get_token
+
+REEVALUATE_INTERVAL = 30 * 60
+# Weight of the newest measurement in the moving averages
+SMOOTHING = 0.3
+HEALTHY_SUCCESS_RATE = 0.5
+
+_lock = threading.Lock()
+_stats = None
+# token -> time.monotonic() of the last race, per run: the first request races
+_raced_at = {}
+
+
+def base_url(url):
+    """The panel base URL of a subscription/API link or of a mirror entry."""
+    for marker in ('/api/sub/', '/sub/'):
+        if marker in url:
+            return url.split(marker)[0]
+    return url.strip().rstrip('/')
+
+
+def api_url_for(base, url):
+    return f"{base}/api/sub/{get_token(url)}"
+
+
+def get_breaker_for(base):
+    """The circuit breaker shared by all calls to one panel host."""
+    return get_breaker(urllib.parse.urlsplit(base).netloc)
+
+
+def _load_stats():
+    global _stats
+    if _stats is None:
+        saved = app_settings.get("mirror_stats")
+        _stats = {base: dict(entry) for base, entry in saved.items()} if isinstance(saved, dict) else {}
+    return _stats
+
+
+def record(base, latency):
+    """Records one request to a mirror: latency in seconds, or None when it failed."""
+    with _lock:
+        entry = _load_stats().setdefault(base, {"latency": None, "success_rate": 1.0})
+        entry["success_rate"] = round(
+            (1 - SMOOTHING) * entry["success_rate"] + SMOOTHING * (latency is not None), 4)
+        if latency is not None:
+            previous = entry["latency"]
+            entry["latency"] = round(latency if previous is None else (1 - SMOOTHING) * previous + SMOOTHING * latency, 4)
+
+
+def save_stats():
+    # Called from race threads too: the settings lock covers the change and the write
+    with settings_lock:
+        with _lock:
+            app_settings["mirror_stats"] = {base: dict(entry) for base, entry in _load_stats().items()}
+        save_settings()
+
+
+def is_https(base):
+    return isinstance(base, str) and base.strip().lower().startswith("https://")
+
+
+def remember_mirrors(url, mirrors):
+    """Stores the https:// mirrors announced in a subscription payload."""
+    if not isinstance(mirrors, (list, tuple)):
+        return
+    bases = list(dict.fromkeys(base_url(m) for m in mirrors if is_https(m)))
+    token = get_token(url)
+    with settings_lock:
+        configured = app_settings.setdefault("panel_mirrors", {})
+        if bases and configured.get(token) != bases:
+            configured[token] = bases
+            save_settings()
+
+
+def candidates(url):
+    """The subscription's own panel first, then its https:// mirrors (without duplicates)."""
+    with settings_lock:
+        configured = list(app_settings.get("panel_mirrors", {}).get(get_token(url), []))
+    # Mirrors saved by older versions may still include http:// ones
+    bases = [base_url(url)] + [base for base in configured if is_https(base)]
+    return list(dict.fromkeys(bases))
+
+
+def is_healthy(base):
+    with _lock:
+        entry = _load_stats().get(base)
+    if entry and entry["success_rate"] < HEALTHY_SUCCESS_RATE:
+        return False
+    return get_breaker_for(base).state != OPEN
+
+
+def ranked(url):
+    """Candidates by preference: healthy ones first, fastest first; unmeasured ones after measured ones."""
+    with _lock:
+        stats = dict(_load_stats())
+
+    def key(item):
+        position, base = item
+        latency = (stats.get(base) or {}).get("latency")
+        return (not is_healthy(base), latency is None, latency or 0, position)
+
+    return [base for _, base in sorted(enumerate(candidates(url)), key=key)]
+
+
+def best_base(url):
+    return ranked(url)[0]
+
+
+def needs_race(url):
+    last = _raced_at.get(get_token(url))
+    return last is None or time.monotonic() - last >= REEVALUATE_INTERVAL
+
+
+def is_mirror_failure(response):
+    """
+    Whether an answer counts against the mirror: 5xx means the panel is in trouble,
+    while a 4xx is an answer about the request itself (bad token, IP conflict).
+    """
+    return response is None or response.status_code >= 500
+
+
+def rejects_link(response):
+    """
+    Whether an answer to the subscription request is definite about the link
+    (revoked, unknown token): a 4xx, except the transient 408 and 429.
+    """
+    return (response is not None and 400 <= response.status_code < 500
+            and response.status_code not in (408, 429))
+
+
+def _record_answer(base, breaker, response, started):
+    if is_mirror_failure(response):
+        breaker.record_failure()
+        record(base, None)
+    else:
+        breaker.record_success()
+        record(base, time.perf_counter() - started)
+
+
+def _timed_request(base, send, timeout, breaker):
+    """
+    send(base, timeout) with the result recorded in the stats and the breaker.
+    Connection errors, timeouts and 5xx answers are failures; a 4xx, raised
+    (raise_for_status) or returned, still shows that the mirror is up.
+    """
+    started = time.perf_counter()
+    try:
+        response = send(base, timeout)
+    except Exception as e:
+        # HTTPError carries the response; connection errors and timeouts have none
+        _record_answer(base, breaker, getattr(e, "response", None), started)
+        raise
+    _record_answer(base, breaker, response, started)
+    return response
+
+
+def request_single(base, send, timeout):
+    breaker = get_breaker_for(base)
+    if not breaker.allow_request():
+        raise CircuitOpenError(base)
+    return _timed_request(base, send, timeout, breaker)
+
+
+def race(bases, send, timeout):
+    """
+    Sends send(base, timeout) to all bases at once. Returns (base, response) of the
+    first that succeeds; raises the last error when all fail. The slower requests
+    keep running on their threads and only update the stats.
+    """
+    results = queue.Queue()
+
+    def run(base, breaker):
+        try:
+            results.put((base, _timed_request(base, send, timeout, breaker), None))
+        except Exception as e:
+            results.put((base, None, e))
+
+    started = 0
+    for base in bases:
+        breaker = get_breaker_for(base)
+        if breaker.allow_request():
+            threading.Thread(target=run, args=(base, breaker), name="mirror-race", daemon=True).start()
+            started += 1
+    if not started:
+        raise CircuitOpenError(", ".join(bases))
+
+    deadline = time.monotonic() + timeout
+    error = None
+    for _ in range(started):
+        try:
+            base, response, error = results.get(timeout=max(0, deadline - time.monotonic()))
+        except queue.Empty:
+            break
+        if error is None:
+            return base, response
+    if error is None:
+        import requests
+        error = requests.exceptions.Timeout(", ".join(bases))
+    raise error
+
+
+def fetch(url, send, timeout, tried):
+    """
+    Runs the subscription request send(base, timeout) -> response on the best mirror,
+    or races the mirrors when they are due for re-evaluation. Mirrors in tried (which
+    already failed during this refresh) are skipped while any other is left; a failing
+    mirror is added to tried. Returns (base, response).
+    """
+    bases = ranked(url)
+    bases = [base for base in bases if base not in tried] or bases
+
+    if len(bases) > 1 and needs_race(url):
+        _raced_at[get_token(url)] = time.monotonic()
+        try:
+            return race(bases, send, timeout)
+        finally:
+            save_stats()
+
+    # Skip mirrors whose circuit is open unless all of them are
+    base = next((base for base in bases if get_breaker_for(base).state != OPEN), bases[0])
+    try:
+        return base, request_single(base, send, timeout)
+    except Exception:
+        tried.add(base)
+        raise
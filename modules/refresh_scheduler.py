@@ -0,0 +1,129 @@
+# refresh_scheduler.py
+import random
+
+from connectivity import has_default_route
+from subscription import STATUS_EXPIRED
+
+MIN_INTERVAL = 75          # Just past the 60-second IP registration wait
+URGENT_INTERVAL = 5 * 60   # Volume or time is about to run out
+BASE_INTERVAL = 15 * 60
+MAX_INTERVAL = 60 * 60
+BACKOFF_FACTOR = 1.5
+JITTER_RATIO = 0.2
+OFFLINE_RECHECK = 30
+BUSY_RECHECK = 10
+
+LOW_VOLUME_GB = 1.0
+LOW_VOLUME_RATIO = 0.1
+
+
+def is_running_out(sub_data):
+    """True when the subscription is close to its volume or time limit (but not past it)."""
+    if not sub_data:
+        return False
+
+    # Already expired: nothing left to run out, so no reason to poll faster
+    if sub_data.status == STATUS_EXPIRED:
+        return False
+    if not sub_data.is_unlimited_time and sub_data.remaining_days <= 0 and sub_data.remaining_hours <= 0:
+        return False
+
+    if not sub_data.is_unlimited_volume:
+        allowed_gb = sub_data.allowed_volume_gb
+        remaining_gb = sub_data.remaining_volume_gb
+        if allowed_gb and (remaining_gb < LOW_VOLUME_GB or remaining_gb < allowed_gb * LOW_VOLUME_RATIO):
+            return True
+
+    if not sub_data.is_unlimited_time:
+        if sub_data.remaining_days < 1:
+            return True
+
+    return False
+
+
+def data_signature(sub_data):
+    """The parts of the subscription data whose change should speed refreshes up."""
+    if not sub_data:
+        return None
+    return (sub_data.status, sub_data.used_volume_gb, sub_data.remaining_days, sub_data.last_ip)
+
+
+def compute_next_interval(sub_data, previous_interval, data_changed, ip_changed):
+    """Picks the next refresh interval (seconds) before jitter is applied."""
+    if ip_changed:
+        return MIN_INTERVAL
+    if is_running_out(sub_data):
+        return URGENT_INTERVAL
+    if data_changed or not previous_interval:
+        return BASE_INTERVAL
+    # Nothing moved since last time: back off gradually
+    return min(MAX_INTERVAL, max(BASE_INTERVAL, previous_interval * BACKOFF_FACTOR))
+
+
+def apply_jitter(interval, rng=random):
+    """Spreads refreshes of many clients over +/- JITTER_RATIO of the interval."""
+    return interval * rng.uniform(1 - JITTER_RATIO, 1 + JITTER_RATIO)
+
+
+class AutoRefreshScheduler:
+    """
+    Re-fetches subscription data in the background on an adaptive, jittered interval.
+    The actual fetch is delegated to refresh_callback (the GUI's _execute_fetch), so
+    it shares the same fetch id and watchdog as a manual refresh; it returns True
+    when a fetch was started.
+    """
+
+    def __init__(self, window, refresh_callback, is_busy, online_check=has_default_route):
+        self.window = window
+        self.refresh_callback = refresh_callback
+        self.is_busy = is_busy
+        self.online_check = online_check
+        self.interval = None
+        self._last_signature = None
+        self._timer_id = None
+
+    def start(self, delay=None):
+        self._schedule(delay if delay is not None else apply_jitter(BASE_INTERVAL))
+
+    def stop(self):
+        if self._timer_id:
+            self.window.after_cancel(self._timer_id)
+            self._timer_id = None
+
+    def _schedule(self, delay):
+        self.stop()
+        self._timer_id = self.window.after(int(delay * 1000), self._on_timer)
+
+    def _on_timer(self):
+        self._timer_id = None
+        if not self.online_check():
+            # Offline: no fetch, just look again later
+            self._schedule(OFFLINE_RECHECK)
+        elif self.is_busy():
+            self._schedule(BUSY_RECHECK)
+        else:
+            started = False
+            try:
+                started = self.refresh_callback()
+            finally:
+                # Only a started fetch reports back through on_fetch_finished; otherwise the chain would end here
+                if not started and self._timer_id is None:
+                    self._schedule(apply_jitter(self.interval or BASE_INTERVAL))
+
+    def on_fetch_finished(self, result):
+        """Called after every fetch (manual or automatic) to plan the next one."""
+        if not result or not result.get("success"):
+            # Failed fetch: retry later without shrinking the interval
+            self._schedule(apply_jitter(self.interval or BASE_INTERVAL))
+            return
+
+        sub_data = result.get("sub_data")
+        signature = data_signature(sub_data)
+        data_changed = signature != self._last_signature
+        self._last_signature = signature
+
+        ip_status = result.get("ip_status") or {}
+        ip_changed = ip_status.get("key") == "ip_changed_from_to"
+
+        self.interval = compute_next_interval(sub_data, self.interval, data_changed, ip_changed)
+        self._schedule(apply_jitter(self.interval))
@@ -0,0 +1,128 @@
+# resilience.py
+import random
+import threading
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is refused because the endpoint's circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Per-endpoint circuit breaker.
+
+    closed    -> calls go through; failure_threshold consecutive failures open it
+    open      -> calls are refused at once until reset_timeout has passed
+    half_open -> a single trial call is let through; success closes, failure re-opens.
+                 A trial that reports nothing within trial_timeout counts as a failure,
+                 so a caller that never reports back cannot leave the breaker stuck.
+    """
+
+    def __init__(self, name, failure_threshold=3, reset_timeout=60, trial_timeout=30, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.trial_timeout = trial_timeout
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._trial_started = None
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            now = self.clock()
+            if (self.state == HALF_OPEN and self._trial_in_flight
+                    and now - self._trial_started >= self.trial_timeout):
+                # The trial never reported back: treat it as failed
+                self.state = OPEN
+                self.opened_at = now
+                self._trial_in_flight = False
+            if self.state == OPEN and now - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                self._trial_started = now
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = self.clock()
+            self._trial_in_flight = False
+
+    def call(self, func, *args, **kwargs):
+        """Runs func through the breaker; any exception counts as a failure and is re-raised."""
+        if not self.allow_request():
+            raise CircuitOpenError(self.name)
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name, **kwargs):
+    """Returns the shared breaker for an endpoint, creating it on first use."""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name, **kwargs)
+        return breaker
+
+
+def backoff_delays(retries, base=0.5, factor=2, max_delay=4, rng=random):
+    """Yields 'full jitter' exponential backoff delays: uniform(0, min(max_delay, base * factor**n))."""
+    for attempt in range(retries):
+        yield rng.uniform(0, min(max_delay, base * factor ** attempt))
+
+
+class Deadline:
+    """A time budget shared by every step of one operation (e.g. a whole refresh)."""
+
+    def __init__(self, seconds, clock=time.monotonic):
+        self.clock = clock
+        self.expires_at = clock() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - self.clock())
+
+    @property
+    def expired(self):
+        return self.remaining() <= 0
+
+    def timeout(self, default):
+        """The per-call timeout to use: the default, capped by what is left of the budget."""
+        return min(default, self.remaining())
+
+    def sleep(self, delay):
+        """Sleeps for delay if the budget allows it; returns False when it does not."""
+        if delay >= self.remaining():
+            return False
+        time.sleep(delay)
+        return True
@@ -0,0 +1,54 @@
+# shutdown.py
+from config import TRANSLATIONS
+import dns_manager
+from dns_journal import read_journal, reconcile
+
+RESTORE_TIMEOUT = 5
+# Extra time after the restore deadline before the window closes regardless
+FORCE_CLOSE_GRACE_MS = 1500
+
+
+def restore_dns(timeout=RESTORE_TIMEOUT):
+    """
+    Reverts the app's DNS change within timeout. Uses the DNS journal when there is one
+    (original per-interface configuration, one batched netsh run); otherwise resets
+    the last known interfaces to DHCP in parallel.
+    """
+    if read_journal() is None:
+        return dns_manager.unset_dns_parallel(timeout=timeout)
+    return reconcile(timeout)
+
+
+class ShutdownCoordinator:
+    """
+    Closes the window without blocking the Tk loop: DNS is restored on the task
+    executor from the journal or the already known interface list, progress is
+    shown in the status bar, and the window is closed when the restore finishes
+    or, at the latest, shortly after its deadline. Anything left undone stays in
+    the DNS journal and is reconciled on the next launch.
+    """
+
+    def __init__(self, window, executor, status_label, on_close, restore=restore_dns):
+        self.window = window
+        self.executor = executor
+        self.status_label = status_label
+        self.on_close = on_close
+        self.restore = restore
+        self._closed = False
+
+    def start(self, lang_code, restore=True):
+        if not restore:
+            self._close()
+            return
+
+        self.status_label.config(text=TRANSLATIONS[lang_code]["exit_restoring_dns"])
+        self.executor.submit(
+            self.restore, RESTORE_TIMEOUT, on_done=lambda success: self._close(), on_error=lambda e: self._close()
+        )
+        self.window.after(RESTORE_TIMEOUT * 1000 + FORCE_CLOSE_GRACE_MS, self._close)
+
+    def _close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self.on_close()
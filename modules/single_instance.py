@@ -0,0 +1,186 @@
+# single_instance.py
+"""
+Single-instance guard and command channel.
+
+The first instance holds an OS file lock for its whole lifetime and listens on
+an ephemeral loopback port. The port and a random token are published in
+instance.json (in the app data folder), so a second launch can forward its
+command ("show", "set_dns", "unset_dns") and exit without creating a window
+or asking for elevation. Only clients that can read the user's app data folder
+know the token, which keeps other local users from driving the app.
+"""
+import hmac
+import json
+import os
+import secrets
+import socket
+import threading
+
+from config import APP_DATA_PATH
+
+INSTANCE_FILE = os.path.join(APP_DATA_PATH, 'instance.json')
+LOCK_FILE = os.path.join(APP_DATA_PATH, 'instance.lock')
+
+COMMAND_SHOW = "show"
+COMMAND_SET_DNS = "set_dns"
+COMMAND_UNSET_DNS = "unset_dns"
+COMMAND_DIAGNOSTICS = "diagnostics"
+COMMANDS = (COMMAND_SHOW, COMMAND_SET_DNS, COMMAND_UNSET_DNS, COMMAND_DIAGNOSTICS)
+
+CONNECT_TIMEOUT = 0.5
+MAX_MESSAGE_SIZE = 4096
+# How often the GUI picks up forwarded commands on its own thread
+COMMAND_POLL_MS = 250
+
+
+def command_from_argv(argv):
+    """The command a launch with these arguments asks for."""
+    if "--set-dns" in argv:
+        return COMMAND_SET_DNS
+    if "--unset-dns" in argv:
+        return COMMAND_UNSET_DNS
+    if "--diagnostics" in argv:
+        return COMMAND_DIAGNOSTICS
+    return COMMAND_SHOW
+
+
+class InstanceLock:
+    """An exclusive, non-blocking lock on LOCK_FILE; the OS drops it when the process exits."""
+
+    def __init__(self, path=LOCK_FILE):
+        self.path = path
+        self._file = None
+
+    def acquire(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        lock_file = open(self.path, "a+b")
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._file = lock_file
+        return True
+
+    def release(self):
+        if self._file is None:
+            return
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        except OSError:
+            pass
+        self._file.close()
+        self._file = None
+
+
+class CommandServer:
+    """
+    Accepts forwarded commands on a loopback socket. on_command(command) is called
+    on the server thread, so it must not touch Tk: the GUI only queues the command
+    and polls that queue from a timer.
+    """
+
+    def __init__(self, on_command, instance_file=INSTANCE_FILE):
+        self.on_command = on_command
+        self.instance_file = instance_file
+        self.token = secrets.token_hex(16)
+        self.port = None
+        self._socket = None
+        self._thread = None
+
+    def start(self):
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if hasattr(socket, "SO_EXCLUSIVEADDRUSE"):
+            self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_EXCLUSIVEADDRUSE, 1)
+        self._socket.bind(("127.0.0.1", 0))
+        self._socket.listen(4)
+        self.port = self._socket.getsockname()[1]
+        self._publish()
+        self._thread = threading.Thread(target=self._serve, name="instance-ipc", daemon=True)
+        self._thread.start()
+
+    def _publish(self):
+        os.makedirs(os.path.dirname(self.instance_file), exist_ok=True)
+        temp_path = self.instance_file + ".tmp"
+        with open(temp_path, "w", encoding='utf-8') as f:
+            json.dump({"pid": os.getpid(), "port": self.port, "token": self.token}, f)
+        os.replace(temp_path, self.instance_file)
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self._socket.accept()
+            except OSError:
+                # The socket was closed by stop()
+                return
+            with conn:
+                conn.settimeout(CONNECT_TIMEOUT)
+                try:
+                    command = self._read_command(conn)
+                    conn.sendall(b"ok\n" if command else b"error\n")
+                except OSError:
+                    continue
+            if command:
+                try:
+                    self.on_command(command)
+                except Exception as e:
+                    print(f"Forwarded command failed: {e!r}")
+
+    def _read_command(self, conn):
+        data = b""
+        while b"\n" not in data and len(data) < MAX_MESSAGE_SIZE:
+            chunk = conn.recv(MAX_MESSAGE_SIZE)
+            if not chunk:
+                break
+            data += chunk
+        try:
+            message = json.loads(data.split(b"\n", 1)[0])
+            token, command = message["token"], message["command"]
+        except (ValueError, KeyError, TypeError):
+            return None
+        if not isinstance(token, str) or not hmac.compare_digest(token, self.token):
+            return None
+        return command if command in COMMANDS else None
+
+    def stop(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+        try:
+            with open(self.instance_file, "r", encoding='utf-8') as f:
+                published = json.load(f)
+            if published.get("token") == self.token:
+                os.remove(self.instance_file)
+        except (OSError, ValueError):
+            pass
+
+
+def send_command(command, instance_file=INSTANCE_FILE, timeout=CONNECT_TIMEOUT):
+    """Forwards command to the running instance. Returns False if there is none (or it did not accept)."""
+    try:
+        with open(instance_file, "r", encoding='utf-8') as f:
+            published = json.load(f)
+        port, token = int(published["port"]), published["token"]
+    except (OSError, ValueError, KeyError, TypeError):
+        return False
+
+    message = json.dumps({"token": token, "command": command}).encode("utf-8") + b"\n"
+    try:
+        with socket.create_connection(("127.0.0.1", port), timeout=timeout) as conn:
+            conn.sendall(message)
+            return conn.recv(16).startswith(b"ok")
+    except OSError:
+        # Stale instance file: the instance is gone (or the port was reused)
+        return False
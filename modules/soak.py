@@ -0,0 +1,419 @@
+# soak.py
+"""
+Long-run soak harness for the app's background loops.
+
+Runs the controller pieces the GUI wires together (task executor, DNS status
+polling, IP change detector, auto-refresh scheduler with the fetch watchdog,
+IP-wait countdown, all on the shared timer scheduler, with the window minimized
+now and then) headlessly, against fake network and DNS backends, for a
+simulated day on an accelerated clock. Thread count, open handles, traced
+memory and pending timers are sampled along the way; the run fails
+(exit status 1) when any of them keeps growing after the warm-up.
+
+Memory is sampled after a full garbage collection and without the harness's
+own allocations (its sample list and fakes grow by design), and is judged by
+its trend over the measured samples rather than by comparing peaks.
+
+    python soak.py                       # 24 simulated hours
+    python soak.py --hours 72 --sample-minutes 60 --seed 7
+"""
+import argparse
+import gc
+import heapq
+import itertools
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+# Never touch the real settings, journal or queue files
+os.environ["APPDATA"] = tempfile.mkdtemp(prefix="vexo_soak_")
+
+import config
+from task_executor import GuiTaskExecutor, CancellationToken
+from refresh_scheduler import AutoRefreshScheduler
+from ip_monitor import IpChangeDetector, LOCAL_CHECK_INTERVAL
+from dns_service import DnsControl, FakeDnsBackend
+from subscription import Subscription
+from timer_scheduler import TimerScheduler
+from ui_helpers import start_countdown
+
+DNS_POLL_MS = 3000
+FETCH_WATCHDOG_MS = 20000
+# A hung fetch returns this long after its watchdog fired (an orphaned worker)
+HANG_RELEASE_MS = 25000
+WARMUP_RATIO = 0.25
+# The window is minimized for MINIMIZED_MS out of every MINIMIZE_PERIOD_MS
+MINIMIZE_PERIOD_MS = 4 * 3600 * 1000
+MINIMIZED_MS = 3600 * 1000
+
+
+class VirtualClock:
+    def __init__(self, epoch=1700000000.0):
+        self.epoch = epoch
+        self.elapsed = 0.0
+
+    def monotonic(self):
+        return self.elapsed
+
+    def time(self):
+        return self.epoch + self.elapsed
+
+
+class FakeTkLoop:
+    """Stands in for the Tk window: after/after_cancel on the virtual clock."""
+
+    def __init__(self, clock, before_callback=None):
+        self.clock = clock
+        self.before_callback = before_callback
+        self._heap = []
+        self._callbacks = {}
+        self._ids = itertools.count()
+
+    @property
+    def pending(self):
+        return len(self._callbacks)
+
+    def after(self, ms, func, *args):
+        after_id = f"after#{next(self._ids)}"
+        self._callbacks[after_id] = (func, args)
+        heapq.heappush(self._heap, (self.clock.elapsed + ms / 1000, after_id))
+        return after_id
+
+    def after_cancel(self, after_id):
+        self._callbacks.pop(after_id, None)
+        if len(self._heap) > 2 * len(self._callbacks) + 100:
+            # Drop cancelled entries so the harness itself does not look like a leak
+            self._heap = [entry for entry in self._heap if entry[1] in self._callbacks]
+            heapq.heapify(self._heap)
+
+    def run_until(self, end):
+        while self._heap and self._heap[0][0] <= end:
+            due, after_id = heapq.heappop(self._heap)
+            callback = self._callbacks.pop(after_id, None)
+            if callback is None:
+                continue
+            self.clock.elapsed = max(self.clock.elapsed, due)
+            if self.before_callback:
+                self.before_callback()
+            func, args = callback
+            func(*args)
+        self.clock.elapsed = max(self.clock.elapsed, end)
+
+
+class FakeLabel:
+    def config(self, **kwargs):
+        pass
+
+    def pack(self, **kwargs):
+        pass
+
+    def pack_forget(self):
+        pass
+
+
+class FakeNetwork:
+    """Subscription panel and IP services with random failures, hangs and IP changes."""
+
+    def __init__(self, clock, rng, fail_rate=0.05, hang_rate=0.01, ip_change_hours=6):
+        self.clock = clock
+        self.rng = rng
+        self.fail_rate = fail_rate
+        self.hang_rate = hang_rate
+        self.ip_change_hours = ip_change_hours
+        self.public_ip = "198.51.100.1"
+        self.registered_ip = self.public_ip
+        self._next_ip_change = self._ip_change_delay()
+        self.hung = []
+
+    def _ip_change_delay(self):
+        return self.clock.monotonic() + self.rng.expovariate(1 / (self.ip_change_hours * 3600))
+
+    def _advance(self):
+        if self.clock.monotonic() >= self._next_ip_change:
+            self.public_ip = f"198.51.100.{self.rng.randint(2, 254)}"
+            self._next_ip_change = self._ip_change_delay()
+
+    def signature(self):
+        self._advance()
+        return (self.public_ip,)
+
+    def get_public_ip(self):
+        self._advance()
+        return None if self.rng.random() < self.fail_rate else self.public_ip
+
+    def register_ip(self, public_ip, old_ip):
+        if self.rng.random() < self.fail_rate:
+            raise ConnectionError("panel unreachable")
+        self.registered_ip = public_ip
+        return {"key": "ip_changed_from_to", "params": {"old_ip": old_ip, "new_ip": public_ip}, "style": "success"}
+
+    def fetch(self, release=None):
+        roll = self.rng.random()
+        if release is not None and roll < self.hang_rate:
+            release.wait(5)
+        if roll < self.fail_rate:
+            return {"success": False, "error": "fake failure", "offline": True}
+        sub_data = Subscription.from_payload({
+            "last_ip": self.registered_ip, "status_key": "table_status_active",
+            "used_volume_gb": self.rng.random() * 10, "allowed_volume_gb": 50, "dou_ip1": "203.0.113.53"})
+        ip_status = None
+        if self.public_ip != self.registered_ip:
+            ip_status = self.register_ip(self.public_ip, self.registered_ip)
+        return {"success": True, "sub_data": sub_data, "ip_status": ip_status}
+
+
+class SoakController:
+    """The GUI's background loops, wired the way ModernVexoChecker wires them."""
+
+    def __init__(self, loop, clock, network):
+        self.loop = loop
+        self.timers = TimerScheduler(loop, clock=clock.monotonic)
+        self.network = network
+        self.executor = GuiTaskExecutor(self.timers)
+        self.dns_control = DnsControl(FakeDnsBackend(), clock=clock.monotonic)
+        self.fetch_token = None
+        self.watchdog_timer = None
+        self.countdown = None
+        self.timer_label = FakeLabel()
+        self.status_label = FakeLabel()
+        self.fetches = 0
+        self.timeouts = 0
+        self.scheduler = AutoRefreshScheduler(self.timers, self.execute_fetch, self.is_fetch_busy, online_check=lambda: True)
+        self.ip_monitor = IpChangeDetector(
+            network.get_public_ip, network.register_ip, registered_ip=network.registered_ip,
+            get_signature=network.signature, clock=clock.monotonic
+        )
+
+    def start(self):
+        self.scheduler.start(delay=5)
+        self.poll_dns_status()
+        self.poll_ip_monitor()
+        self.timers.call_later(MINIMIZE_PERIOD_MS - MINIMIZED_MS, self.minimize)
+
+    def minimize(self):
+        self.timers.pause_nonessential()
+        self.timers.call_later(MINIMIZED_MS, self.restore)
+
+    def restore(self):
+        self.timers.resume_nonessential()
+        self.timers.call_later(MINIMIZE_PERIOD_MS - MINIMIZED_MS, self.minimize)
+
+    def schedule_dns_status_poll(self):
+        self.timers.call_later(DNS_POLL_MS, self.poll_dns_status, essential=False)
+
+    def poll_dns_status(self):
+        self.executor.submit(
+            self.dns_control.check_dns_status, "203.0.113.53",
+            on_done=lambda status: self.schedule_dns_status_poll(),
+            on_error=lambda e: self.schedule_dns_status_poll()
+        )
+
+    def poll_ip_monitor(self):
+        def on_done(ip_status):
+            if ip_status and ip_status.get("key") == "ip_changed_from_to":
+                self.show_ip_wait()
+            self.timers.call_later(LOCAL_CHECK_INTERVAL * 1000, self.poll_ip_monitor)
+
+        self.executor.submit(
+            self.ip_monitor.check, on_done=on_done,
+            on_error=lambda e: self.timers.call_later(LOCAL_CHECK_INTERVAL * 1000, self.poll_ip_monitor)
+        )
+
+    def show_ip_wait(self):
+        if self.countdown:
+            self.countdown.cancel()
+        self.countdown = start_countdown(60, self.timer_label, self.status_label, self.timers)
+
+    def is_fetch_busy(self):
+        return self.fetch_token is not None
+
+    def execute_fetch(self):
+        self.fetches += 1
+        token = CancellationToken()
+        release = threading.Event()
+        self.fetch_token = token
+        self.executor.submit(self.network.fetch, release, on_done=lambda result: self.on_fetch_done(result, token),
+                             token=token)
+        self.watchdog_timer = self.timers.call_later(FETCH_WATCHDOG_MS, self.on_fetch_timeout, token)
+        # Lets a hung fetch return late, like a socket that finally times out
+        self.timers.call_later(HANG_RELEASE_MS, release.set)
+        return True
+
+    def on_fetch_done(self, result, token):
+        if token is not self.fetch_token:
+            return
+        self.timers.cancel(self.watchdog_timer)
+        self.fetch_token = self.watchdog_timer = None
+        ip_status = result.get("ip_status") or {}
+        if ip_status.get("key") == "ip_changed_from_to":
+            self.ip_monitor.note_registered(self.network.registered_ip)
+            self.show_ip_wait()
+        self.scheduler.on_fetch_finished(result)
+
+    def on_fetch_timeout(self, token):
+        if token is not self.fetch_token:
+            return
+        self.timeouts += 1
+        token.cancel()
+        self.fetch_token = self.watchdog_timer = None
+        self.scheduler.on_fetch_finished(None)
+
+    def stop(self):
+        self.scheduler.stop()
+        self.executor.shutdown()
+
+
+def count_handles():
+    """Open handles (Windows) or file descriptors (Linux) of this process, or None."""
+    if sys.platform == "win32":
+        import ctypes
+        count = ctypes.c_ulong()
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.kernel32.GetProcessHandleCount(process, ctypes.byref(count)):
+            return count.value
+        return None
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return None
+
+
+# Allocations made by the harness itself, and by tracemalloc, are not the app's
+HARNESS_FILTERS = (
+    tracemalloc.Filter(False, os.path.abspath(__file__)),
+    tracemalloc.Filter(False, tracemalloc.__file__),
+)
+
+
+def app_snapshot():
+    """A tracemalloc snapshot of the app's allocations, taken after a full collection."""
+    gc.collect()
+    return tracemalloc.take_snapshot().filter_traces(HARNESS_FILTERS)
+
+
+def take_sample(clock, loop, timers, executor):
+    return {
+        "hour": clock.monotonic() / 3600,
+        "threads": threading.active_count(),
+        "handles": count_handles(),
+        "memory_kb": sum(trace.size for trace in app_snapshot().traces) / 1024,
+        "pending_after": loop.pending,
+        "pending_timers": timers.pending,
+        "outstanding": executor.outstanding,
+    }
+
+
+# Growth allowed between the first and second half of the run (after warm-up)
+GROWTH_LIMITS = {
+    "threads": lambda early: early + 2,
+    "handles": lambda early: early + 8,
+    "pending_after": lambda early: early + 4,
+    "pending_timers": lambda early: early + 4,
+    "outstanding": lambda early: early + 4,
+}
+# Memory may move up and down, but the trend over the measured samples
+# (least-squares slope times their time span) must stay below both of these
+MEMORY_TREND_LIMIT_KB = 16
+MEMORY_TREND_LIMIT_RATIO = 0.1
+
+
+def trend(points):
+    """Least-squares slope of [(x, y)], or 0 when it is undefined."""
+    if len(points) < 2:
+        return 0.0
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    spread = sum((x - mean_x) ** 2 for x, _ in points)
+    if not spread:
+        return 0.0
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / spread
+
+
+def find_unbounded_growth(samples):
+    """Descriptions of the metrics that keep growing after the warm-up."""
+    measured = samples[int(len(samples) * WARMUP_RATIO):]
+    half = len(measured) // 2
+    if half == 0:
+        return []
+    problems = []
+    for name, limit in GROWTH_LIMITS.items():
+        early = [sample[name] for sample in measured[:half] if sample[name] is not None]
+        late = [sample[name] for sample in measured[half:] if sample[name] is not None]
+        if early and late and max(late) > limit(max(early)):
+            problems.append(f"{name} grew from {max(early):.0f} to {max(late):.0f}")
+
+    points = [(sample["hour"], sample["memory_kb"]) for sample in measured]
+    span = points[-1][0] - points[0][0]
+    growth = trend(points) * span
+    typical = sum(y for _, y in points) / len(points)
+    if growth > max(MEMORY_TREND_LIMIT_KB, typical * MEMORY_TREND_LIMIT_RATIO):
+        problems.append(f"memory_kb keeps growing: {growth:.0f} KB over {span:.0f} hours "
+                        f"({points[0][1]:.0f} to {points[-1][1]:.0f} KB)")
+    return problems
+
+
+def run_soak(hours=24, sample_minutes=30, seed=1):
+    # One-time lazy loads (translations for the countdown) must not count as growth
+    config.TRANSLATIONS[config.current_language]
+    tracemalloc.start()
+    clock = VirtualClock()
+    rng = random.Random(seed)
+    controller = None
+
+    def let_workers_finish():
+        # Fake backends answer in microseconds; give them a moment before each callback
+        if controller and controller.executor.outstanding:
+            time.sleep(0.0002)
+
+    loop = FakeTkLoop(clock, before_callback=let_workers_finish)
+    controller = SoakController(loop, clock, FakeNetwork(clock, rng))
+    controller.start()
+
+    samples = []
+    baseline = None
+    step = sample_minutes * 60
+    end = hours * 3600
+    while clock.monotonic() < end:
+        loop.run_until(clock.monotonic() + step)
+        samples.append(take_sample(clock, loop, controller.timers, controller.executor))
+        if baseline is None and len(samples) >= max(1, int(end / step * WARMUP_RATIO)):
+            baseline = app_snapshot()
+
+    controller.stop()
+    final = app_snapshot()
+    return samples, controller, baseline, final
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate a long run of the app's background loops and check for leaks.")
+    parser.add_argument("--hours", type=float, default=24)
+    parser.add_argument("--sample-minutes", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    samples, controller, baseline, final = run_soak(args.hours, args.sample_minutes, args.seed)
+
+    print(f"{'hour':>6} {'threads':>8} {'handles':>8} {'memory KB':>10} {'after':>6} {'timers':>7} {'tasks':>6}")
+    for sample in samples:
+        print(f"{sample['hour']:>6.1f} {sample['threads']:>8} {str(sample['handles']):>8} "
+              f"{sample['memory_kb']:>10.0f} {sample['pending_after']:>6} {sample['pending_timers']:>7} {sample['outstanding']:>6}")
+    print(f"{controller.fetches} fetches, {controller.timeouts} watchdog timeouts, "
+          f"{time.perf_counter() - started:.1f} s real time")
+
+    problems = find_unbounded_growth(samples)
+    for problem in problems:
+        print(f"UNBOUNDED GROWTH: {problem}")
+    if problems and baseline is not None:
+        print("Largest allocation growth since warm-up:")
+        for stat in final.compare_to(baseline, "lineno")[:10]:
+            print(f"  {stat}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
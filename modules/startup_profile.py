@@ -0,0 +1,111 @@
+# startup_profile.py
+"""
+Startup import profiler with a budget check.
+
+Runs a fresh interpreter with -X importtime, reports what each module costs and
+exits with status 1 when the budget is exceeded or a module that should only be
+imported lazily is loaded at startup.
+
+    python startup_profile.py                       # profile "import main, gui"
+    python startup_profile.py --module gui --top 30
+    python startup_profile.py --budget-ms 350 --forbid requests,PIL,ssl
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+# The real entry path: main, plus the window it opens (gui is imported inside main())
+DEFAULT_MODULE = "main,gui"
+DEFAULT_BUDGET_MS = 400
+# Heavy dependencies that must be imported on first use, not at startup
+DEFAULT_FORBIDDEN = ("requests", "PIL", "ssl", "http.client")
+
+
+def run_importtime(module, cwd=None):
+    """
+    Imports module in a fresh interpreter. Returns (raw -X importtime output, error),
+    where error is the last line of the traceback when the import failed, else None.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=cwd, capture_output=True, text=True
+    )
+    if result.returncode == 0:
+        return result.stderr, None
+    # The timings up to the failure are still useful, so they are returned too
+    lines = [line for line in result.stderr.splitlines() if not line.startswith("import time:")]
+    return result.stderr, lines[-1] if lines else f"exit status {result.returncode}"
+
+
+def parse_importtime(output):
+    """
+    Parses -X importtime lines into {module: (self_us, cumulative_us)}.
+    Lines look like: "import time:       412 |       1234 |   encodings.utf_8"
+    """
+    timings = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3:
+            continue
+        try:
+            self_us, cumulative_us = int(fields[0]), int(fields[1])
+        except ValueError:
+            # The header line
+            continue
+        timings[fields[2].strip()] = (self_us, cumulative_us)
+    return timings
+
+
+def check_budget(timings, module, budget_ms, forbidden):
+    """
+    Returns a list of human readable budget violations (empty when within budget).
+    module may name several comma separated modules; their cumulative times add up.
+    """
+    problems = []
+    total_us = sum(timings.get(name, (0, 0))[1] for name in module.split(","))
+    if total_us > budget_ms * 1000:
+        problems.append(f"'import {module}' took {total_us / 1000:.1f} ms (budget {budget_ms} ms)")
+    for name in forbidden:
+        if name in timings:
+            problems.append(f"'{name}' is imported at startup ({timings[name][1] / 1000:.1f} ms); import it lazily")
+    return problems
+
+
+def print_report(timings, top):
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    ranked = sorted(timings.items(), key=lambda item: item[1][1], reverse=True)
+    for name, (self_us, cumulative_us) in ranked[:top]:
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report per-module import cost and enforce a startup budget.")
+    parser.add_argument("--module", default=DEFAULT_MODULE)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--forbid", default=",".join(DEFAULT_FORBIDDEN),
+                        help="comma separated modules that must not load at startup")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    output, error = run_importtime(args.module, cwd=os.path.dirname(os.path.abspath(__file__)))
+    timings = parse_importtime(output)
+    print_report(timings, args.top)
+
+    if error:
+        # A module that does not import at all must never pass the check
+        print(f"IMPORT FAILED: 'import {args.module}': {error}")
+        return 1
+
+    forbidden = [name.strip() for name in args.forbid.split(",") if name.strip()]
+    problems = check_budget(timings, args.module, args.budget_ms, forbidden)
+    for problem in problems:
+        print(f"BUDGET EXCEEDED: {problem}")
+    missing = [name for name in args.module.split(",") if name not in timings]
+    return 1 if problems or missing else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+# subscription.py
+"""
+The subscription data returned by the panel API, decoded and validated once.
+
+Everything downstream (rendering, refresh scheduling, DNS) reads attributes of a
+Subscription instead of repeating dict lookups with defaults; a payload that
+does not fit is rejected here with InvalidSubscription.
+"""
+import ipaddress
+
+STATUS_ACTIVE = 'table_status_active'
+STATUS_DISABLED = 'sub_status_disabled'
+STATUS_LIMITED = 'limited'
+STATUS_EXPIRED = 'table_status_expired'
+
+
+class InvalidSubscription(ValueError):
+    """
+    The panel answered with data that is not a usable subscription. A ValueError,
+    so the refresh reports its message like the other validation errors.
+    """
+
+
+def _number(data, key, kind=float):
+    value = data.get(key)
+    if value is None:
+        return kind(0)
+    if isinstance(value, bool):
+        raise InvalidSubscription(f"{key} is not a number")
+    try:
+        return kind(value)
+    except (TypeError, ValueError):
+        raise InvalidSubscription(f"{key} is not a number") from None
+
+
+def _text(data, key):
+    value = data.get(key)
+    if value is None or value == "":
+        return None
+    if not isinstance(value, str):
+        raise InvalidSubscription(f"{key} is not a string")
+    return value
+
+
+def _ip(data, key):
+    value = _text(data, key)
+    if value is None:
+        return None
+    try:
+        return str(ipaddress.ip_address(value.strip()))
+    except ValueError:
+        raise InvalidSubscription(f"{key} is not an IP address") from None
+
+
+class Subscription:
+    """One snapshot of a subscription, with the derived fields computed up front."""
+
+    __slots__ = (
+        'username', 'status', 'used_volume_gb', 'allowed_volume_gb', 'is_unlimited_volume',
+        'remaining_days', 'remaining_hours', 'is_unlimited_time', 'last_ip',
+        'dns_servers', 'doh_link', 'dot_address', 'mirrors', 'remaining_volume_gb',
+    )
+
+    @classmethod
+    def from_payload(cls, data):
+        """Decodes the API JSON (or a cached copy from to_dict()); raises InvalidSubscription."""
+        if not isinstance(data, dict):
+            raise InvalidSubscription("payload is not an object")
+        if data.get('error'):
+            raise InvalidSubscription(str(data['error']))
+
+        sub = cls()
+        sub.username = _text(data, 'username')
+        sub.status = _text(data, 'status_key')
+        sub.used_volume_gb = _number(data, 'used_volume_gb')
+        sub.allowed_volume_gb = _number(data, 'allowed_volume_gb')
+        sub.is_unlimited_volume = bool(data.get('is_unlimited_volume'))
+        sub.remaining_days = _number(data, 'remaining_days', int)
+        sub.remaining_hours = _number(data, 'remaining_hours', int)
+        sub.is_unlimited_time = bool(data.get('is_unlimited_time'))
+        sub.last_ip = _text(data, 'last_ip')
+        sub.dns_servers = tuple(ip for ip in (_ip(data, 'dou_ip1'), _ip(data, 'dou_ip2')) if ip)
+        sub.doh_link = _text(data, 'doh_link')
+        sub.dot_address = _text(data, 'dot_address')
+        mirrors = data.get('mirrors')
+        sub.mirrors = tuple(m for m in mirrors if isinstance(m, str)) if isinstance(mirrors, list) else ()
+        sub.remaining_volume_gb = max(0.0, sub.allowed_volume_gb - sub.used_volume_gb)
+        return sub
+
+    @classmethod
+    def from_cache(cls, data):
+        """Like from_payload, but returns None for a missing or unusable cached copy."""
+        try:
+            return cls.from_payload(data) if data else None
+        except InvalidSubscription:
+            return None
+
+    def to_dict(self):
+        """The API-shaped dict for the settings file, without empty or default fields."""
+        data = {
+            'username': self.username,
+            'status_key': self.status,
+            'used_volume_gb': self.used_volume_gb,
+            'allowed_volume_gb': self.allowed_volume_gb,
+            'is_unlimited_volume': self.is_unlimited_volume,
+            'remaining_days': self.remaining_days,
+            'remaining_hours': self.remaining_hours,
+            'is_unlimited_time': self.is_unlimited_time,
+            'last_ip': self.last_ip,
+            'doh_link': self.doh_link,
+            'dot_address': self.dot_address,
+            'mirrors': list(self.mirrors),
+        }
+        for key, ip in zip(('dou_ip1', 'dou_ip2'), self.dns_servers):
+            data[key] = ip
+        return {key: value for key, value in data.items() if value}
+
+    @property
+    def is_active(self):
+        return self.status == STATUS_ACTIVE
+
+    @property
+    def dou_ip1(self):
+        return self.dns_servers[0] if self.dns_servers else None
+
+    @property
+    def dou_ip2(self):
+        return self.dns_servers[1] if len(self.dns_servers) > 1 else None
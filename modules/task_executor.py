@@ -0,0 +1,88 @@
+# task_executor.py
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+DRAIN_INTERVAL_MS = 50
+DRAIN_BATCH_SIZE = 20
+
+
+class CancellationToken:
+    """Marks a submitted task as no longer wanted; its result callback is then skipped."""
+
+    def __init__(self):
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class GuiTaskExecutor:
+    """
+    Runs blocking work on a bounded thread pool and hands the results back to the Tk thread.
+
+    Workers never touch Tk: they only put finished futures on a thread-safe queue.
+    The Tk loop drains that queue in batches, and only while tasks are outstanding,
+    so an idle app has no polling wakeups at all.
+    submit() and the callbacks always run on the Tk thread.
+    """
+
+    def __init__(self, window, max_workers=4, drain_interval_ms=DRAIN_INTERVAL_MS, batch_size=DRAIN_BATCH_SIZE):
+        self.window = window
+        self.drain_interval_ms = drain_interval_ms
+        self.batch_size = batch_size
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gui-task")
+        self._results = queue.Queue()
+        self._outstanding = 0
+        self._drain_id = None
+
+    @property
+    def outstanding(self):
+        return self._outstanding
+
+    def submit(self, func, *args, on_done=None, on_error=None, token=None):
+        """
+        Runs func(*args) on a worker. on_done(result) or on_error(exception) is later
+        called on the Tk thread, unless the token was cancelled in the meantime.
+        Returns the token.
+        """
+        token = token or CancellationToken()
+        future = self._pool.submit(func, *args)
+        future.add_done_callback(lambda f: self._results.put((f, on_done, on_error, token)))
+        self._outstanding += 1
+        self._schedule_drain()
+        return token
+
+    def _schedule_drain(self):
+        if self._drain_id is None:
+            self._drain_id = self.window.after(self.drain_interval_ms, self._drain)
+
+    def _drain(self):
+        self._drain_id = None
+        for _ in range(self.batch_size):
+            try:
+                future, on_done, on_error, token = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._outstanding -= 1
+            if token.cancelled:
+                continue
+            try:
+                error = future.exception()
+                if error is None:
+                    if on_done:
+                        on_done(future.result())
+                elif on_error:
+                    on_error(error)
+                else:
+                    print(f"Background task failed: {error!r}")
+            except Exception as e:
+                print(f"Task callback failed: {e!r}")
+
+        if self._outstanding > 0:
+            self._schedule_drain()
+
+    def shutdown(self):
+        if self._drain_id is not None:
+            self.window.after_cancel(self._drain_id)
+            self._drain_id = None
+        self._pool.shutdown(wait=False)
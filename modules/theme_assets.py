@@ -0,0 +1,155 @@
+# theme_assets.py
+import base64
+import os
+import sys
+import tkinter as tk
+
+from config import APP_DATA_PATH, resource_path
+
+DARK_THEMES = frozenset(['darkly', 'superhero', 'cyborg', 'vapor', 'solar'])
+
+DARK_PALETTE = {
+    'bg': '#1a1d23',
+    'card_bg': '#2b3035',
+    'text_primary': '#ffffff',
+    'text_secondary': '#8B949E',
+    'accent': '#00D9FF',
+    'success': '#00D084',
+    'warning': '#FFA500',
+    'danger': '#FF6B6B',
+    'border': '#3d4148'
+}
+
+LIGHT_PALETTE = {
+    'bg': '#f8f9fa',
+    'card_bg': '#ffffff',
+    'text_primary': '#212529',
+    'text_secondary': '#6c757d',
+    'accent': '#0d6efd',
+    'success': '#198754',
+    'warning': '#fd7e14',
+    'danger': '#dc3545',
+    'border': '#dee2e6'
+}
+
+LOGO_SOURCE = "logo.png"
+LOGO_CACHE_DIR = os.path.join(APP_DATA_PATH, 'cache')
+# Tk's "scaling" at 96 DPI (pixels per point)
+BASE_TK_SCALING = 96 / 72
+
+_logo_images = {}
+
+
+def get_palette(theme_name):
+    """
+    The color palette of a theme. Palettes are built once at import time and
+    shared, so callers must not modify the returned dict.
+    """
+    return DARK_PALETTE if theme_name in DARK_THEMES else LIGHT_PALETTE
+
+
+def get_dpi_scale(window):
+    try:
+        return float(window.tk.call('tk', 'scaling')) / BASE_TK_SCALING
+    except (tk.TclError, ValueError):
+        return 1.0
+
+
+def prescaled_logo_name(width, height):
+    return f"logo_{width}x{height}.png"
+
+
+def _fit_size(image_size, target_size):
+    original_width, original_height = image_size
+    target_width, target_height = target_size
+    scale_ratio = min(target_width / original_width, target_height / original_height)
+    return int(original_width * scale_ratio), int(original_height * scale_ratio)
+
+
+def render_logo_png(source_path, target_path, size):
+    """
+    Scales the logo to fit size (keeping its aspect ratio) and saves it as PNG.
+    This is the only place PIL is used, and it is imported here on purpose:
+    normal starts load an already scaled PNG straight into Tk.
+    """
+    from PIL import Image
+
+    img = Image.open(source_path).convert("RGBA")
+    img = img.resize(_fit_size(img.size, size), Image.Resampling.LANCZOS)
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    img.save(target_path, format="PNG")
+
+
+def _load_packed_image(window, name):
+    from asset_pack import get_pack, image_key, PACK_NAME
+    pack = get_pack(resource_path(PACK_NAME))
+    key = image_key(name)
+    if pack is None or key not in pack:
+        return None
+    try:
+        return tk.PhotoImage(master=window, data=base64.b64encode(pack.get_bytes(key)))
+    except tk.TclError:
+        return None
+
+
+def get_logo_image(window, size=(42, 42)):
+    """
+    Returns a PhotoImage of the logo for the given logical size at the window's DPI.
+    Looks in memory first, then for a PNG pre-scaled at build time (in the asset
+    pack or next to the sources), then in the on-disk cache; only if none exists
+    is the logo scaled (once) with PIL.
+    """
+    scale = get_dpi_scale(window)
+    width, height = round(size[0] * scale), round(size[1] * scale)
+    key = (width, height)
+    if key in _logo_images:
+        return _logo_images[key]
+
+    name = prescaled_logo_name(width, height)
+    source_path = resource_path(LOGO_SOURCE)
+    try:
+        # The source size is part of the cache name so a new logo invalidates old files
+        cache_path = os.path.join(LOGO_CACHE_DIR, f"{os.path.getsize(source_path)}_{name}")
+    except OSError:
+        cache_path = None
+
+    photo = _load_packed_image(window, name)
+    for path in (resource_path(name), cache_path):
+        if photo is None and path and os.path.exists(path):
+            try:
+                photo = tk.PhotoImage(master=window, file=path)
+                break
+            except tk.TclError:
+                continue
+
+    if photo is None:
+        # The bundled logo may already have the wanted size (logo.png is 42x42)
+        try:
+            source = tk.PhotoImage(master=window, file=source_path)
+            if (source.width(), source.height()) == (width, height):
+                photo = source
+        except tk.TclError:
+            pass
+
+    if photo is None and cache_path:
+        try:
+            render_logo_png(source_path, cache_path, (width, height))
+            photo = tk.PhotoImage(master=window, file=cache_path)
+        except Exception as e:
+            print(f"Error loading logo: {e}")
+            return None
+
+    _logo_images[key] = photo
+    return photo
+
+
+if __name__ == "__main__":
+    # Build step: pre-scale the logo next to the sources so PyInstaller bundles it.
+    # Usage: python theme_assets.py [size ...]   (defaults: 125%, 150% and 200% DPI of 42 px)
+    # "python asset_pack.py build" packs these sizes (and more) into assets.pack instead.
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    for arg in sys.argv[1:] or ["53", "63", "84"]:
+        edge = int(arg)
+        target = os.path.join(base_dir, prescaled_logo_name(edge, edge))
+        render_logo_png(os.path.join(base_dir, LOGO_SOURCE), target, (edge, edge))
+        print(f"Wrote {target}")
@@ -0,0 +1,112 @@
+# timer_scheduler.py
+import heapq
+import itertools
+import time
+
+# Timers due within this window of the earliest one run in the same tick
+COALESCE_MS = 50
+
+
+class TimerHandle:
+    """A scheduled call; pass it to cancel()."""
+
+    __slots__ = ("due", "func", "args", "essential", "cancelled")
+
+    def __init__(self, due, func, args, essential):
+        self.due = due
+        self.func = func
+        self.args = args
+        self.essential = essential
+        self.cancelled = False
+
+
+class TimerScheduler:
+    """
+    All of the app's timers on one Tk tick source.
+
+    Timers live in a heap and only the earliest one has a Tk `after` pending, so
+    the Tk loop wakes up once per due time instead of once per timer chain; timers
+    due within COALESCE_MS of each other run in the same wakeup. Non-essential
+    timers (display refreshes, status polling) are held while the window is
+    minimized and run once it is restored.
+
+    after()/after_cancel() mirror the Tk methods, so components written against
+    a window (task executor, refresh scheduler, shutdown) can use it unchanged.
+    """
+
+    def __init__(self, window, coalesce_ms=COALESCE_MS, clock=time.monotonic):
+        self.window = window
+        self.coalesce = coalesce_ms / 1000
+        self.clock = clock
+        self.paused = False
+        self._heap = []
+        self._held = []
+        self._sequence = itertools.count()
+        self._tick_id = None
+        self._tick_due = None
+
+    @property
+    def pending(self):
+        return sum(1 for _, _, handle in self._heap if not handle.cancelled) + len(self._held)
+
+    def call_later(self, delay_ms, func, *args, essential=True):
+        handle = TimerHandle(self.clock() + delay_ms / 1000, func, args, essential)
+        heapq.heappush(self._heap, (handle.due, next(self._sequence), handle))
+        self._arm()
+        return handle
+
+    def after(self, delay_ms, func, *args):
+        return self.call_later(delay_ms, func, *args)
+
+    def cancel(self, handle):
+        if handle is not None:
+            handle.cancelled = True
+
+    after_cancel = cancel
+
+    def pause_nonessential(self):
+        self.paused = True
+
+    def resume_nonessential(self):
+        """Runs the timers held while paused (their due time has passed) on the next tick."""
+        self.paused = False
+        held, self._held = self._held, []
+        for handle in held:
+            if not handle.cancelled:
+                heapq.heappush(self._heap, (handle.due, next(self._sequence), handle))
+        self._arm()
+
+    def _arm(self):
+        while self._heap and self._heap[0][2].cancelled:
+            heapq.heappop(self._heap)
+        if not self._heap:
+            return
+        due = self._heap[0][0]
+        if self._tick_id is not None:
+            if self._tick_due <= due:
+                return
+            self.window.after_cancel(self._tick_id)
+        self._tick_due = due
+        self._tick_id = self.window.after(max(0, int((due - self.clock()) * 1000)), self._tick)
+
+    def _tick(self):
+        self._tick_id = None
+        limit = self.clock() + self.coalesce
+        due_now = []
+        while self._heap and self._heap[0][0] <= limit:
+            handle = heapq.heappop(self._heap)[2]
+            if handle.cancelled:
+                continue
+            if self.paused and not handle.essential:
+                self._held.append(handle)
+                continue
+            due_now.append(handle)
+
+        for handle in due_now:
+            if handle.cancelled:
+                continue
+            try:
+                handle.func(*handle.args)
+            except Exception as e:
+                print(f"Timer callback failed: {e!r}")
+        self._arm()
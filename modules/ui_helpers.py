@@ -1,39 +1,66 @@
 # ui_helpers.py
-import tkinter as tk
-import ttkbootstrap as ttk
 from config import TRANSLATIONS, app_settings, save_settings
 
-def start_countdown(counter, timer_label, status_bar_label, window):
-    """تابع شمارش معکوس که همیشه از زبان فعلی برنامه استفاده می‌کند."""
-    import config
-    
-    timer_label.pack(side="bottom", fill="x", pady=(2, 0))
-
-    def update_timer(count):
+class Countdown:
+    """
+    A "wait N seconds" countdown shown in timer_label, driven by the shared timer scheduler.
+    The remaining time is computed from a deadline, so the display is correct again as soon
+    as its (non-essential) ticks resume after the window was minimized.
+    """
+
+    def __init__(self, seconds, timer_label, status_bar_label, scheduler):
+        self.timer_label = timer_label
+        self.status_bar_label = status_bar_label
+        self.scheduler = scheduler
+        self.deadline = scheduler.clock() + seconds
+        self._timer = None
+
+    @property
+    def active(self):
+        return self._timer is not None
+
+    def start(self):
+        self.timer_label.pack(side="bottom", fill="x", pady=(2, 0))
+        self._update()
+        return self
+
+    def cancel(self):
+        self.scheduler.cancel(self._timer)
+        self._timer = None
+
+    def _update(self):
+        """تابع شمارش معکوس که همیشه از زبان فعلی برنامه استفاده می‌کند."""
+        import config
+
+        count = round(self.deadline - self.scheduler.clock())
         if count >= 0:
             # تغییر کلیدی: زبان فعال در هر تکرار حلقه خوانده می‌شود
             lang_code = config.current_language
-            
+
             # تنظیم جهت لیبل بر اساس زبان فعال
             if lang_code == 'fa':
-                timer_label.config(anchor='e')
+                self.timer_label.config(anchor='e')
             else:
-                timer_label.config(anchor='w')
+                self.timer_label.config(anchor='w')
 
             # ترجمه متن تایمر با زبان صحیح
             timer_message = TRANSLATIONS[lang_code]["timer_text"].format(seconds=count)
-            
+
             if lang_code == 'fa':
                 timer_message = '\u202B' + timer_message + '\u202C'
 
-            timer_label.config(text=timer_message)
-            config.active_timer_id = window.after(1000, update_timer, count - 1)
+            self.timer_label.config(text=timer_message)
+            # Display only: may be held while minimized
+            self._timer = self.scheduler.call_later(1000, self._update, essential=False)
         else:
-            timer_label.pack_forget()
-            status_bar_label.config(text="")
-            config.active_timer_id = None
-            
-    update_timer(counter)
+            self.timer_label.pack_forget()
+            self.status_bar_label.config(text="")
+            self._timer = None
+
+
+def start_countdown(counter, timer_label, status_bar_label, scheduler):
+    """Starts and returns a Countdown of counter seconds."""
+    return Countdown(counter, timer_label, status_bar_label, scheduler).start()
 
 # ui_helpers.py
 
@@ -41,6 +68,9 @@ def start_countdown(counter, timer_label, status_bar_label, window):
 
 def manage_subscription_link(parent_window, lang_code):
     """Opens a Toplevel window to add or edit the subscription link."""
+    # Imported here so the countdown above can run without a GUI toolkit (soak harness)
+    import tkinter as tk
+    import ttkbootstrap as ttk
     
     dialog = ttk.Toplevel(parent_window)
     dialog.title(TRANSLATIONS[lang_code]["add_link_title"])
@@ -132,51 +162,3 @@ def manage_subscription_link(parent_window, lang_code):
     dialog.geometry(f"+{x}+{y}")
     
     dialog.wait_window()
-
-def retranslate_results_data(labels, last_fetched_data, lang_code, colors):
-    """Only re-translates the data in the results frame without touching the status bar."""
-    if not last_fetched_data:
-        return
-
-    data = last_fetched_data
-    # ترجمه متن وضعیت
-    status_translations = {
-        'table_status_active': TRANSLATIONS[lang_code]["status_active"],
-        'sub_status_disabled': TRANSLATIONS[lang_code]["status_disabled"],
-        'limited': TRANSLATIONS[lang_code]["status_limited"],
-        'table_status_expired': TRANSLATIONS[lang_code]["status_expired"]
-    }
-    status_key = data.get('status_key')
-    status_text = status_translations.get(status_key, status_key)
-
-    # تعیین رنگ وضعیت بر اساس کلید وضعیت و رنگ‌های تم
-    status_color_map = {
-        'table_status_active': colors.get('success'),
-        'table_status_expired': colors.get('danger'),
-        'sub_status_disabled': colors.get('warning'),
-        'limited': colors.get('warning')
-    }
-    status_color = status_color_map.get(status_key, colors.get('text_secondary'))
-
-    # محاسبه زمان باقی‌مانده
-    if data.get('is_unlimited_time'):
-        remaining_time = TRANSLATIONS[lang_code]["unlimited"]
-    else:
-        days, hours = data.get('remaining_days', 0), data.get('remaining_hours', 0)
-        remaining_time = TRANSLATIONS[lang_code]["time_format"].format(days=days, hours=hours)
-
-    # محاسبه حجم باقی‌مانده
-    if data.get('is_unlimited_volume'):
-        remaining_volume_text = TRANSLATIONS[lang_code]["unlimited"]
-    else:
-        allowed_gb = data.get('allowed_volume_gb') or 0
-        used_gb = data.get('used_volume_gb', 0)
-        remaining_gb = max(0, allowed_gb - used_gb)
-        remaining_volume_text = f"{remaining_gb:.2f} GB"
-
-    # تنظیم متن و رنگ تمام لیبل‌ها به صورت هماهنگ
-    labels['username'].config(text=data.get('username', "..."), foreground=colors.get('accent'))
-    labels['status'].config(text=status_text, foreground=status_color)
-    labels['time'].config(text=remaining_time, foreground=colors.get('accent'))
-    labels['volume'].config(text=remaining_volume_text, foreground=colors.get('accent'))
-    labels['ip'].config(text=data.get('last_ip') or "N/A", foreground=colors.get('accent'))
\ No newline at end of file
@@ -0,0 +1,112 @@
+# view_model.py
+from config import TRANSLATIONS
+from subscription import STATUS_ACTIVE, STATUS_DISABLED, STATUS_LIMITED, STATUS_EXPIRED
+
+RESULT_KEYS = ['username', 'status', 'time', 'volume', 'ip']
+
+HEADER_ICONS = {
+    "username": "👤",
+    "status": "📊",
+    "time": "⏱️",
+    "volume": "💾",
+    "ip": "🌐",
+}
+
+# status_key -> (translation key, theme color)
+STATUS_STYLES = {
+    STATUS_ACTIVE: ("status_active", 'success'),
+    STATUS_DISABLED: ("status_disabled", 'warning'),
+    STATUS_LIMITED: ("status_limited", 'warning'),
+    STATUS_EXPIRED: ("status_expired", 'danger'),
+}
+
+PLACEHOLDER = "..."
+
+
+def format_remaining_time(data, lang_code):
+    if data.is_unlimited_time:
+        return TRANSLATIONS[lang_code]["unlimited"]
+    return TRANSLATIONS[lang_code]["time_format"].format(days=data.remaining_days, hours=data.remaining_hours)
+
+
+def format_remaining_volume(data, lang_code):
+    if data.is_unlimited_volume:
+        return TRANSLATIONS[lang_code]["unlimited"]
+    return f"{data.remaining_volume_gb:.2f} GB"
+
+
+def format_status(data, lang_code, colors):
+    status_key = data.status
+    style = STATUS_STYLES.get(status_key)
+    if style is None:
+        return status_key, colors['text_secondary']
+    translation_key, color_key = style
+    return TRANSLATIONS[lang_code][translation_key], colors[color_key]
+
+
+def build_results_view(data, lang_code, colors):
+    """
+    Display state of the result labels (data is a Subscription) as {label_key: {option: value}}.
+    Without data only the colors are set, so placeholders keep their text.
+    """
+    if not data:
+        return {key: {'foreground': colors['accent']} for key in RESULT_KEYS}
+
+    status_text, status_color = format_status(data, lang_code, colors)
+    return {
+        'username': {'text': data.username or PLACEHOLDER, 'foreground': colors['accent']},
+        'status': {'text': status_text, 'foreground': status_color},
+        'time': {'text': format_remaining_time(data, lang_code), 'foreground': colors['accent']},
+        'volume': {'text': format_remaining_volume(data, lang_code), 'foreground': colors['accent']},
+        'ip': {'text': data.last_ip or "N/A", 'foreground': colors['accent']},
+    }
+
+
+def build_placeholder_view():
+    """Result labels while a fetch is running."""
+    return {key: {'text': PLACEHOLDER} for key in RESULT_KEYS}
+
+
+def build_chrome_view(lang_code, colors):
+    """Display state of the static labels: title, subtitle and the card headers."""
+    view = {
+        'title': {'foreground': colors['accent']},
+        'subtitle': {'foreground': colors['text_secondary']},
+    }
+    for key, icon in HEADER_ICONS.items():
+        view[f"{key}_header"] = {
+            'text': f"{icon} {TRANSLATIONS[lang_code][f'{key}_header']}",
+            'foreground': colors['text_secondary'],
+        }
+    return view
+
+
+class LabelRenderer:
+    """
+    Applies view dicts to widgets, calling .config() only with the options whose
+    value differs from what this renderer last applied to that widget.
+    Widgets rendered here must not be changed with .config() elsewhere.
+    """
+
+    def __init__(self):
+        self._applied = {}
+        self.config_calls = 0
+
+    def apply(self, widgets, view):
+        for key, options in view.items():
+            widget = widgets.get(key)
+            if widget is None:
+                continue
+            applied = self._applied.setdefault(key, {})
+            changes = {name: value for name, value in options.items() if applied.get(name) != value}
+            if changes:
+                widget.config(**changes)
+                applied.update(changes)
+                self.config_calls += 1
+
+    def forget(self, key=None):
+        """Drops the cached state (e.g. after a widget was recreated)."""
+        if key is None:
+            self._applied.clear()
+        else:
+            self._applied.pop(key, None)
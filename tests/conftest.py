@@ -0,0 +1,11 @@
+# conftest.py
+import os
+import sys
+import tempfile
+
+# The app keeps its files in %APPDATA%\VexoChecker; never touch the real one
+os.environ["APPDATA"] = tempfile.mkdtemp(prefix="vexo_tests_")
+
+MODULES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "modules")
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+sys.path.insert(0, MODULES_DIR)
@@ -0,0 +1,89 @@
+# test_asset_pack.py
+import json
+import os
+import shutil
+
+import pytest
+
+import asset_pack
+import theme_assets
+from asset_pack import HEADER, MAGIC, FORMAT_VERSION, AssetPack, build_pack, image_key
+
+MODULES_DIR = os.path.dirname(asset_pack.__file__)
+
+
+def fake_png(edge):
+    # Not a real PNG: the pack stores whatever bytes the renderer produced
+    return b"\x89PNG\r\n\x1a\n" + edge.to_bytes(2, "big") * edge
+
+
+@pytest.fixture
+def source_dir(tmp_path, monkeypatch):
+    """The translation files and the logo, with the PIL rendering step replaced."""
+    source = tmp_path / "src"
+    source.mkdir()
+    for lang in asset_pack.LANGUAGES:
+        shutil.copy(os.path.join(MODULES_DIR, f"{lang}.json"), source)
+    shutil.copy(os.path.join(MODULES_DIR, theme_assets.LOGO_SOURCE), source)
+
+    def render_logo_png(source_path, target_path, size):
+        with open(target_path, "wb") as f:
+            f.write(fake_png(size[0]))
+
+    monkeypatch.setattr(theme_assets, "render_logo_png", render_logo_png)
+    return source
+
+
+def test_build_and_read_round_trip(source_dir, tmp_path):
+    path = str(tmp_path / "assets.pack")
+    index = build_pack(str(source_dir), path)
+
+    with open(path, "rb") as f:
+        magic, version, python_magic, index_length = HEADER.unpack(f.read(HEADER.size))
+        assert json.loads(f.read(index_length)) == index
+    assert (magic, version, python_magic) == (MAGIC, FORMAT_VERSION, asset_pack.PYTHON_MAGIC)
+
+    pack = AssetPack(path)
+    try:
+        assert pack.python_compatible
+        for lang in asset_pack.LANGUAGES:
+            with open(os.path.join(MODULES_DIR, f"{lang}.json"), "r", encoding="utf-8") as f:
+                assert pack.get_translations(lang) == json.load(f)
+        for edge in asset_pack.LOGO_SIZES:
+            key = image_key(theme_assets.prescaled_logo_name(edge, edge))
+            assert key in pack
+            assert pack.get_bytes(key) == fake_png(edge)
+        assert "image/missing.png" not in pack
+    finally:
+        pack.close()
+
+
+def test_marshal_data_of_another_python_is_ignored(source_dir, tmp_path):
+    path = tmp_path / "assets.pack"
+    build_pack(str(source_dir), str(path))
+    data = bytearray(path.read_bytes())
+    # Overwrite the python magic in the header
+    data[6:10] = b"\0\0\0\0"
+    path.write_bytes(bytes(data))
+
+    pack = AssetPack(str(path))
+    try:
+        assert not pack.python_compatible
+        assert pack.get_translations("en") is None
+        # Images do not depend on the Python version
+        assert pack.get_bytes(image_key(theme_assets.prescaled_logo_name(16, 16))) == fake_png(16)
+    finally:
+        pack.close()
+
+
+def test_get_pack_returns_none_for_missing_or_foreign_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(asset_pack, "_packs", {})
+    foreign = tmp_path / "foreign.pack"
+    foreign.write_bytes(HEADER.pack(b"ZZZZ", FORMAT_VERSION, asset_pack.PYTHON_MAGIC, 2) + b"{}")
+    truncated = tmp_path / "truncated.pack"
+    truncated.write_bytes(MAGIC)
+
+    assert asset_pack.get_pack(str(tmp_path / "missing.pack")) is None
+    assert asset_pack.get_pack(str(foreign)) is None
+    assert asset_pack.get_pack(str(truncated)) is None
+
@@ -0,0 +1,25 @@
+# test_connectivity.py
+import pytest
+
+from connectivity import classify_probe_response, ONLINE, CAPTIVE_PORTAL, UNKNOWN
+
+
+def http(status_line, body=b"", headers=b""):
+    return status_line + b"\r\n" + headers + b"Content-Type: text/plain\r\n\r\n" + body
+
+
+@pytest.mark.parametrize("response, expected", [
+    (http(b"HTTP/1.1 200 OK", b"Microsoft Connect Test"), ONLINE),
+    (http(b"HTTP/1.0 200 OK", b"<html><form action='/login'>"), CAPTIVE_PORTAL),
+    (http(b"HTTP/1.1 302 Found", headers=b"Location: http://10.0.0.1/login\r\n"), CAPTIVE_PORTAL),
+    (http(b"HTTP/1.1 307 Temporary Redirect"), CAPTIVE_PORTAL),
+    (http(b"HTTP/1.1 403 Forbidden", b"Blocked by policy"), UNKNOWN),
+    (http(b"HTTP/1.1 404 Not Found"), UNKNOWN),
+    (http(b"HTTP/1.1 502 Bad Gateway"), UNKNOWN),
+    (http(b"HTTP/1.1 503 Service Unavailable"), UNKNOWN),
+    (b"", UNKNOWN),
+    (b"SSH-2.0-OpenSSH_9.6\r\n", UNKNOWN),
+    (b"HTTP/1.1\r\n\r\n", UNKNOWN),
+])
+def test_classify_probe_response(response, expected):
+    assert classify_probe_response(response) == expected
@@ -0,0 +1,92 @@
+# test_diagnostics.py
+import json
+import os
+import subprocess
+import sys
+import threading
+import zipfile
+
+import pytest
+
+import diagnostics
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch, tmp_path):
+    monkeypatch.setattr(diagnostics, "_armed", None)
+    monkeypatch.setattr(diagnostics, "_active", None)
+    monkeypatch.setattr(diagnostics, "DIAGNOSTICS_DIR", str(tmp_path))
+
+
+def test_unarmed_capture_just_runs_the_function():
+    assert diagnostics.capture_next("refresh", lambda a, b: a + b, 1, 2) == 3
+    assert not diagnostics.is_capturing()
+
+
+def test_armed_capture_writes_a_bundle_before_it_ends():
+    saved = []
+
+    def on_saved(path, error):
+        # Still capturing: the GUI keeps polling until the path is queued
+        saved.append((path, error, diagnostics.is_capturing()))
+
+    def operation():
+        worker = threading.Thread(target=diagnostics.spanned("worker", lambda: None))
+        worker.start()
+        worker.join()
+        return "done"
+
+    diagnostics.arm(on_saved)
+    assert diagnostics.is_capturing()
+    assert diagnostics.capture_next("refresh", operation) == "done"
+
+    assert not diagnostics.is_capturing()
+    [(path, error, capturing)] = saved
+    assert error is None and capturing
+    with zipfile.ZipFile(path) as bundle:
+        timings = json.loads(bundle.read("timings.json"))
+        assert "settings.json" in bundle.namelist()
+    assert timings["operation"] == "refresh" and timings["error"] is None
+    assert {span["name"] for span in timings["spans"]} == {"refresh", "worker"}
+
+
+def test_failed_operation_is_bundled_and_reraised():
+    saved = []
+    diagnostics.arm(lambda path, error: saved.append(path))
+
+    with pytest.raises(ValueError):
+        diagnostics.capture_next("set_dns", lambda: int("x"))
+
+    with zipfile.ZipFile(saved[0]) as bundle:
+        assert "ValueError" in json.loads(bundle.read("timings.json"))["error"]
+
+
+def test_unwritable_bundle_is_reported_to_on_saved(monkeypatch, tmp_path):
+    blocker = tmp_path / "not-a-directory"
+    blocker.write_text("")
+    monkeypatch.setattr(diagnostics, "DIAGNOSTICS_DIR", str(blocker / "diagnostics"))
+    saved = []
+    diagnostics.arm(lambda path, error: saved.append((path, error)))
+
+    assert diagnostics.capture_next("refresh", lambda: "done") == "done"
+
+    [(path, error)] = saved
+    assert path is None and isinstance(error, OSError)
+
+
+def test_import_does_not_load_the_profiling_modules():
+    code = ("import sys, diagnostics; "
+            "print(sorted({'cProfile', 'pstats', 'zipfile', 'platform'} & set(sys.modules)))")
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(diagnostics.__file__))
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, check=True)
+
+    assert output.stdout.strip() == "[]"
+
+
+def test_redact_masks_tokens_and_addresses():
+    value = {"url": "https://panel.example/sub/secret-token", "dns": ["10.0.0.1", "keep"]}
+
+    assert diagnostics.redact(value) == {
+        "url": "https://panel.example/sub/" + diagnostics.REDACTED,
+        "dns": ["x.x.x.x", "keep"],
+    }
@@ -0,0 +1,49 @@
+# test_dns_journal.py
+import dns_journal
+import dns_manager
+from dns_journal import plan_recovery
+
+ACTUAL = {
+    "Ethernet": {"source": "static", "servers": ["127.0.0.1"]},
+    "Wi-Fi": {"source": "static", "servers": ["127.0.0.1"]},
+    "Reverted by hand": {"source": "dhcp", "servers": ["192.168.1.1"]},
+}
+
+
+def entry(interfaces):
+    return {"target_dns": "127.0.0.1", "state": "applied", "interfaces": interfaces}
+
+
+def test_restores_only_adapters_that_exist_and_still_use_the_app():
+    commands = plan_recovery(entry({
+        "Ethernet": {"source": "static", "servers": ["10.0.0.1"]},
+        "Reverted by hand": {"source": "static", "servers": ["10.0.0.1"]},
+        'x" & net user evil /add & "': {"source": "dhcp"},
+        "Wi-Fi": "not an object",
+    }), ACTUAL)
+
+    assert commands == [['interface', 'ipv4', 'set', 'dnsservers', 'name=Ethernet', 'static', '10.0.0.1', 'primary']]
+
+
+def test_journal_servers_must_be_ipv4_addresses():
+    commands = plan_recovery(entry({
+        "Ethernet": {"source": "static", "servers": ["10.0.0.1 & calc", "not-an-ip"]},
+        "Wi-Fi": {"source": "static", "servers": ["bad", "10.0.0.2"]},
+    }), ACTUAL)
+
+    assert commands == [
+        ['interface', 'ipv4', 'set', 'dnsservers', 'name=Ethernet', 'source=dhcp'],
+        ['interface', 'ipv4', 'set', 'dnsservers', 'name=Wi-Fi', 'static', '10.0.0.2', 'primary'],
+    ]
+
+
+def test_without_an_adapter_list_the_journal_is_not_trusted(monkeypatch):
+    calls = []
+    monkeypatch.setattr(dns_journal, "read_journal", lambda: entry({'evil"\nname': {"source": "dhcp"}}))
+    monkeypatch.setattr(dns_journal, "clear_journal", lambda: calls.append("cleared"))
+    monkeypatch.setattr(dns_manager, "read_dns_configuration", lambda: {})
+    monkeypatch.setattr(dns_manager, "unset_dns_parallel", lambda timeout: calls.append("dhcp") or True)
+    monkeypatch.setattr(dns_manager, "run_netsh_batch", lambda commands, timeout: calls.append(commands) or True)
+
+    assert dns_journal.reconcile()
+    assert calls == ["dhcp", "cleared"]
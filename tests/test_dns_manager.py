@@ -0,0 +1,209 @@
+# test_dns_manager.py
+import json
+import os
+import subprocess
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import FIXTURES_DIR
+import dns_manager
+from dns_manager import build_restore_commands
+
+
+@pytest.fixture
+def no_window(monkeypatch):
+    monkeypatch.setattr(subprocess, "CREATE_NO_WINDOW", 0, raising=False)
+
+
+def test_restore_commands():
+    assert build_restore_commands("Wi-Fi", {"source": "dhcp", "servers": []}) == [
+        ['interface', 'ipv4', 'set', 'dnsservers', 'name=Wi-Fi', 'source=dhcp'],
+    ]
+    assert build_restore_commands("Ethernet 2", {"source": "static", "servers": ["1.1.1.1", "8.8.8.8"]}) == [
+        ['interface', 'ipv4', 'set', 'dnsservers', 'name=Ethernet 2', 'static', '1.1.1.1', 'primary'],
+        ['interface', 'ipv4', 'add', 'dnsservers', 'name=Ethernet 2', 'address=8.8.8.8', 'index=2'],
+    ]
+
+
+def test_restore_runs_list_arguments_per_interface_without_a_script_file(monkeypatch, no_window):
+    calls = []
+    monkeypatch.setattr(dns_manager, "_run", lambda command, **kwargs: calls.append(command) or SimpleNamespace(returncode=0))
+
+    def no_script(*args, **kwargs):
+        raise AssertionError("no netsh script may be written")
+
+    monkeypatch.setattr(dns_manager.subprocess, "Popen", no_script)
+    monkeypatch.setattr("tempfile.mkstemp", no_script)
+    persian = build_restore_commands("اتصال شبکه", {"source": "static", "servers": ["1.1.1.1", "8.8.8.8"]})
+    wifi = build_restore_commands("Wi-Fi", {"source": "dhcp"})
+
+    assert dns_manager.run_netsh_batch(persian + wifi)
+    assert sorted(calls) == sorted(['netsh'] + command for command in persian + wifi)
+    # The commands of one interface keep their order
+    assert [call for call in calls if call in [['netsh'] + command for command in persian]] == \
+        [['netsh'] + command for command in persian]
+
+
+def test_restore_fails_when_a_command_fails(monkeypatch, no_window):
+    monkeypatch.setattr(dns_manager, "_run",
+                        lambda command, **kwargs: SimpleNamespace(returncode=1 if "name=Wi-Fi" in command else 0))
+    commands = build_restore_commands("Ethernet", {}) + build_restore_commands("Wi-Fi", {})
+
+    assert not dns_manager.run_netsh_batch(commands)
+    assert dns_manager.run_netsh_batch([])
+
+
+def test_validate_ipv4():
+    assert dns_manager.validate_ipv4(" 1.1.1.1 ") == "1.1.1.1"
+    for value in ("1.1.1.1 primary", "::1", "", None, 16843009):
+        with pytest.raises(ValueError):
+            dns_manager.validate_ipv4(value)
+
+
+def test_set_dns_never_goes_through_a_shell(monkeypatch, no_window):
+    calls = []
+    monkeypatch.setattr(dns_manager, "get_active_interface_names", lambda: ["Wi-Fi 2"])
+    monkeypatch.setattr(dns_manager, "_run", lambda command, **kwargs: calls.append((command, kwargs)))
+
+    assert dns_manager.set_dns("1.1.1.1", "8.8.8.8")["success"]
+    assert [command for command, _ in calls] == [
+        ['netsh', 'interface', 'ipv4', 'set', 'dnsservers', 'name=Wi-Fi 2', 'static', '1.1.1.1', 'primary'],
+        ['netsh', 'interface', 'ipv4', 'add', 'dnsservers', 'name=Wi-Fi 2', 'address=8.8.8.8', 'index=2'],
+    ]
+    assert not any(kwargs.get("shell") for _, kwargs in calls)
+    with pytest.raises(ValueError):
+        dns_manager.set_dns("1.1.1.1 & calc")
+
+
+# Parsers against captured output (tests/fixtures)
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8", newline="") as f:
+        return f.read()
+
+
+def test_powershell_adapters():
+    adapters = dns_manager.parse_powershell_adapters(read_fixture("powershell_adapters_fa.json"))
+
+    # Down, loopback and tunnel adapters and malformed records are dropped
+    assert [(adapter["name"], adapter["index"]) for adapter in adapters] == [
+        ("Wi-Fi", 12), ("اترنت", 7), ("vEthernet (WSL)", 45), ("OpenVPN Wintun", 22),
+    ]
+    single = dns_manager.parse_powershell_adapters(read_fixture("powershell_adapter_single.json"))
+    assert [adapter["name"] for adapter in single] == ["Wi-Fi"]
+    assert dns_manager.parse_powershell_adapters("\r\n") == []
+
+
+def test_wmic_csv():
+    adapters = dns_manager.parse_wmic_csv(read_fixture("wmic_adapters_en.csv"))
+    assert [(adapter["name"], adapter["index"]) for adapter in adapters] == [
+        ("Wi-Fi", 12), ("Ethernet 2", 7), ("Office, VPN", 22),
+    ]
+
+    adapters = dns_manager.parse_wmic_csv(read_fixture("wmic_adapters_ru.csv"))
+    assert [adapter["name"] for adapter in adapters] == ["Беспроводная сеть", "Подключение по локальной сети"]
+
+
+@pytest.mark.parametrize("fixture, servers", [
+    ("netsh_dnsservers_dhcp_en.txt", ["192.168.1.1", "8.8.8.8"]),
+    ("netsh_dnsservers_static_de.txt", ["1.1.1.1", "1.0.0.1"]),
+    ("netsh_dnsservers_none_ru.txt", []),
+])
+def test_current_dns_servers_in_any_display_language(monkeypatch, no_window, fixture, servers):
+    output = read_fixture(fixture)
+    monkeypatch.setattr(dns_manager, "_run", lambda command, **kwargs: SimpleNamespace(stdout=output))
+
+    assert dns_manager.get_current_dns_servers("Wi-Fi") == servers
+
+
+class FakeWinreg:
+    """The winreg calls read_dns_configuration makes, over a captured registry dump."""
+
+    HKEY_LOCAL_MACHINE = "HKLM"
+
+    class Key:
+        def __init__(self, path):
+            self.path = path
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc_info):
+            return False
+
+    def __init__(self, dump):
+        self.dump = dump
+
+    def OpenKey(self, parent, sub_key):
+        path = (parent.path if isinstance(parent, self.Key) else parent) + "\\" + sub_key
+        guid = path.split("\\")[-2 if path.endswith("\\Connection") else -1]
+        if guid not in self.dump and not path.endswith(dns_manager.NETWORK_CLASS_KEY):
+            raise OSError(path)
+        return self.Key(path)
+
+    def EnumKey(self, key, index):
+        guids = list(self.dump)
+        if index >= len(guids):
+            raise OSError("no more items")
+        return guids[index]
+
+    def QueryValueEx(self, key, value_name):
+        guid = key.path.split("\\")[-2 if key.path.endswith("\\Connection") else -1]
+        try:
+            return self.dump[guid][value_name], 1
+        except KeyError:
+            raise OSError(value_name) from None
+
+
+def test_dns_configuration_from_the_registry(monkeypatch):
+    dump = json.loads(read_fixture("registry_dns.json"))
+    monkeypatch.setitem(sys.modules, "winreg", FakeWinreg(dump))
+
+    assert dns_manager.read_dns_configuration() == {
+        "Wi-Fi": {"source": "dhcp", "servers": ["192.168.1.1", "8.8.8.8"]},
+        "اترنت": {"source": "static", "servers": ["1.1.1.1", "1.0.0.1"]},
+        "Disabled adapter": {"source": "dhcp", "servers": []},
+    }
+
+
+def adapter(name, index, description=""):
+    return {"name": name, "index": index, "type": 6, "description": description}
+
+
+ADAPTERS = [
+    adapter("vEthernet (WSL)", 45, "Hyper-V Virtual Ethernet Adapter"),
+    adapter("OpenVPN Wintun", 22, "Wintun Userspace Tunnel"),
+    adapter("Wi-Fi", 12, "Intel(R) Wi-Fi 6 AX201 160MHz"),
+    adapter("Ethernet", 7, "Realtek PCIe GbE Family Controller"),
+]
+
+
+def test_physical_adapters():
+    assert [a["name"] for a in ADAPTERS if dns_manager.is_physical_adapter(a)] == ["Wi-Fi", "Ethernet"]
+
+
+def test_select_adapters_by_policy():
+    routes = {22: 5, 12: 35, 7: 25}
+    names = lambda chosen: [a["name"] for a in chosen]
+
+    assert names(dns_manager.select_adapters(ADAPTERS, "default_route", routes)) == ["OpenVPN Wintun"]
+    assert names(dns_manager.select_adapters(ADAPTERS, "default_route", routes, deny=["OpenVPN Wintun"])) == ["Ethernet"]
+    assert names(dns_manager.select_adapters(ADAPTERS, "physical", routes)) == ["Ethernet", "Wi-Fi"]
+    assert names(dns_manager.select_adapters(ADAPTERS, "list", routes, allow=["Wi-Fi"])) == ["Wi-Fi"]
+    assert len(dns_manager.select_adapters(ADAPTERS, "all", routes)) == 4
+    # No default route yet: the physical adapters
+    assert names(dns_manager.select_adapters(ADAPTERS, "default_route", {})) == ["Wi-Fi", "Ethernet"]
+
+
+def test_discovery_falls_back_to_wmic(monkeypatch, no_window):
+    def run(command, **kwargs):
+        if command.startswith("powershell"):
+            raise subprocess.CalledProcessError(1, command)
+        return SimpleNamespace(stdout=read_fixture("wmic_adapters_ru.csv"))
+
+    monkeypatch.setattr(dns_manager, "_adapters_from_ip_helper", lambda: [])
+    monkeypatch.setattr(dns_manager, "_run", run)
+
+    assert [a["index"] for a in dns_manager.discover_active_adapters()] == [5, 8]
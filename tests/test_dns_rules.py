@@ -0,0 +1,119 @@
+# test_dns_rules.py
+import socket
+import threading
+import time
+
+import pytest
+
+import dns_rules
+import dns_transport
+from dns_rules import RoutingUpstream, SuffixTrie, compile_rules, UPSTREAM_DHCP, UPSTREAM_SUBSCRIPTION
+from dns_transport import DohUpstream, DotUpstream, UdpUpstream, build_query
+
+
+class NamedUpstream:
+    def __init__(self, name):
+        self.name = name
+
+    def query(self, packet):
+        return self.name
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def lookups(monkeypatch):
+    """Fake system resolver: records every host name lookup."""
+    names = []
+
+    def gethostbyname(host):
+        names.append(host)
+        if host.endswith(".invalid"):
+            raise socket.gaierror(host)
+        return "192.0.2.10"
+
+    monkeypatch.setattr(dns_transport.socket, "gethostbyname", gethostbyname)
+    return names
+
+
+def test_longest_suffix_wins():
+    trie = compile_rules([
+        {"suffix": "example.com", "upstream": "1.1.1.1"},
+        {"suffix": "corp.example.com", "upstream": UPSTREAM_DHCP},
+        {"suffix": "", "upstream": "9.9.9.9"},
+        "not a rule",
+    ])
+
+    assert trie.lookup("host.corp.example.com") == UPSTREAM_DHCP
+    assert trie.lookup("WWW.Example.com.") == "1.1.1.1"
+    assert trie.lookup("example.org") is None
+    assert sorted(trie.values()) == ["1.1.1.1", UPSTREAM_DHCP]
+
+
+def test_rule_upstreams_are_resolved_when_routing_is_built(lookups):
+    trie = SuffixTrie()
+    trie.add("a.example", "https://doh.example/dns-query")
+    trie.add("b.example", "tls://dot.example:8853")
+    routing = RoutingUpstream(trie, NamedUpstream("default"))
+
+    # Resolved before the forwarder takes over, never at query time
+    assert sorted(lookups) == ["doh.example", "dot.example"]
+    doh = routing._get_upstream("https://doh.example/dns-query")
+    dot = routing._get_upstream("tls://dot.example:8853")
+    assert isinstance(doh, DohUpstream) and doh.address == "192.0.2.10"
+    assert isinstance(dot, DotUpstream)
+    assert (dot.host, dot.port, dot.server_name) == ("192.0.2.10", 8853, "dot.example")
+    assert len(lookups) == 2
+
+
+def test_unusable_rule_targets_fall_back_to_the_subscription(lookups):
+    trie = compile_rules([
+        {"suffix": "a.example", "upstream": "https://gone.invalid/dns-query"},
+        {"suffix": "b.example", "upstream": "not-an-ip"},
+        {"suffix": "c.example", "upstream": UPSTREAM_DHCP},
+    ])
+    default = NamedUpstream("default")
+    routing = RoutingUpstream(trie, default, dhcp_servers=[])
+
+    for name in ("x.a.example", "x.b.example", "x.c.example", "other.example"):
+        assert routing.query(build_query(name)) == "default"
+
+
+def test_dhcp_and_plain_rules_use_udp():
+    trie = compile_rules([
+        {"suffix": "corp.example", "upstream": UPSTREAM_DHCP},
+        {"suffix": "home.example", "upstream": "192.168.1.1"},
+    ])
+    routing = RoutingUpstream(trie, NamedUpstream("default"), dhcp_servers=["", "10.0.0.1"])
+
+    assert routing._get_upstream(UPSTREAM_DHCP).server == "10.0.0.1"
+    assert isinstance(routing._get_upstream("192.168.1.1"), UdpUpstream)
+    assert routing._get_upstream(UPSTREAM_SUBSCRIPTION).name == "default"
+
+
+def test_concurrent_lookups_build_one_upstream(monkeypatch):
+    built = []
+    gate = threading.Barrier(8)
+
+    def slow_build(spec):
+        built.append(spec)
+        time.sleep(0.01)
+        return NamedUpstream(spec)
+
+    routing = RoutingUpstream(SuffixTrie(), NamedUpstream("default"))
+    monkeypatch.setattr(dns_rules, "upstream_from_spec", slow_build)
+    results = []
+
+    def worker():
+        gate.wait()
+        results.append(routing._get_upstream("192.0.2.53"))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert built == ["192.0.2.53"]
+    assert len({id(upstream) for upstream in results}) == 1
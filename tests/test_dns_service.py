@@ -0,0 +1,221 @@
+# test_dns_service.py
+import json
+import os
+import threading
+import time
+
+import pytest
+
+import config
+import dns_manager
+import metrics
+from dns_service import (DnsControl, DnsServiceClient, DnsServiceError, DnsServiceServer, FakeDnsBackend,
+                         SystemDnsBackend, connect_dns_service, run_service, service_arguments,
+                         wait_for_dns_service)
+
+
+@pytest.fixture
+def service():
+    backend = FakeDnsBackend(interfaces=("Ethernet", "Wi-Fi"))
+    server = DnsServiceServer(DnsControl(backend))
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    client = DnsServiceClient(server.port, server.key, timeout=2)
+    yield server, backend, client
+    client.close()
+    server.shutdown()
+    server.server_close()
+
+
+def test_applies_and_reverts_dns(service):
+    server, backend, client = service
+
+    assert client.apply_dns("1.1.1.1", "8.8.8.8")["success"]
+    assert backend.configuration["Wi-Fi"]["servers"] == ["1.1.1.1", "8.8.8.8"]
+    assert client.check_dns_status("1.1.1.1")
+    assert client.reconcile()
+    assert backend.configuration["Wi-Fi"] == {"source": "dhcp", "servers": ["192.168.1.1"]}
+
+
+@pytest.mark.parametrize("dns_ip1, dns_ip2", [
+    ('1.1.1.1" & calc.exe & "', None),
+    ("1.1.1.1 primary", None),
+    ("example.com", None),
+    ("2606:4700::1111", None),
+    ("1.1.1.1", "8.8.8.8 index=1"),
+    (["1.1.1.1"], None),
+])
+def test_rejects_anything_but_ipv4_addresses(service, dns_ip1, dns_ip2):
+    server, backend, client = service
+
+    with pytest.raises(DnsServiceError, match="invalid parameters"):
+        client.apply_dns(dns_ip1, dns_ip2)
+    assert backend.journal is None
+    assert backend.configuration["Ethernet"]["source"] == "dhcp"
+
+
+@pytest.mark.parametrize("method, params", [
+    ("__init__", {}),
+    ("_refresh_status", {"target_dns": "1.1.1.1"}),
+    ("backend", {}),
+    ("apply_dns", {"dns_ip1": "1.1.1.1", "before_change": "x"}),
+    ("reconcile", {"timeout": 10 ** 9}),
+])
+def test_rejects_methods_and_parameters_outside_the_whitelist(service, method, params):
+    server, backend, client = service
+
+    with pytest.raises(DnsServiceError):
+        client.call(method, **params)
+    assert backend.configuration["Ethernet"]["source"] == "dhcp"
+
+
+def test_serves_its_metrics(service):
+    server, backend, client = service
+    metrics.observe(metrics.SUBPROCESS_DURATION, 0.2, command="rpc-test")
+
+    exported = client.metrics()
+
+    assert [metrics.SUBPROCESS_DURATION, {"command": "rpc-test"}, [[0, 0, 1, 0, 0, 0, 0, 0, 0, 0], 1, 0.2]] in exported
+
+
+def test_rejects_a_wrong_key(service):
+    server, backend, client = service
+    intruder = DnsServiceClient(server.port, b"\0" * 32, timeout=2)
+
+    with pytest.raises(DnsServiceError, match="authentication failed"):
+        intruder.apply_dns("1.1.1.1")
+    intruder.close()
+
+
+def test_refuses_callers_that_fail_the_check():
+    checked = []
+    server = DnsServiceServer(DnsControl(FakeDnsBackend()),
+                              verify_caller=lambda address, port: checked.append(port) or False)
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    client = DnsServiceClient(server.port, server.key, timeout=2)
+    try:
+        with pytest.raises(DnsServiceError, match="unavailable"):
+            client.health()
+        assert checked and checked[0] == server.port
+    finally:
+        client.close()
+        server.shutdown()
+        server.server_close()
+
+
+def test_in_process_control_validates_too():
+    control = DnsControl(FakeDnsBackend())
+
+    with pytest.raises(ValueError):
+        control.apply_dns("1.1.1.1; netsh firewall")
+
+
+class FakeForwarder:
+    def __init__(self):
+        self.alive = True
+        self.probed = []
+
+    def __call__(self, ip):
+        self.probed.append(ip)
+        return self.alive
+
+
+def test_restores_dns_when_the_local_forwarder_disappears():
+    backend = FakeDnsBackend()
+    forwarder = FakeForwarder()
+    control = DnsControl(backend, probe_forwarder=forwarder)
+
+    assert control.apply_dns("127.0.0.1")["success"]
+    assert control.check_forwarder()
+    forwarder.alive = False
+    assert control.check_forwarder() and control.check_forwarder()
+    assert backend.configuration["Ethernet"]["servers"] == ["127.0.0.1"]
+
+    assert not control.check_forwarder()
+    assert backend.configuration["Ethernet"] == {"source": "dhcp", "servers": ["192.168.1.1"]}
+    assert backend.journal is None
+    # Nothing left to watch
+    assert control.check_forwarder() and len(forwarder.probed) == 4
+
+
+def test_a_plain_resolver_is_not_probed():
+    forwarder = FakeForwarder()
+    control = DnsControl(FakeDnsBackend(), probe_forwarder=forwarder)
+
+    control.apply_dns("127.0.0.1")
+    control.apply_dns("1.1.1.1")
+    forwarder.alive = False
+    for _ in range(5):
+        assert control.check_forwarder()
+    assert forwarder.probed == []
+
+
+def test_the_service_uses_the_data_folder_it_was_given():
+    folder = r"C:\Users\Jo Doe\AppData\Roaming\VexoChecker"
+    arguments = service_arguments("ab12", folder)
+
+    assert arguments == '--dns-service --data-dir "C:\\Users\\Jo Doe\\AppData\\Roaming\\VexoChecker" --launch-id ab12'
+    assert config._app_data_path(["vexo.exe", "--dns-service", "--data-dir", folder, "--launch-id", "ab12"]) == folder
+    # Only the service follows --data-dir
+    assert config._app_data_path(["vexo.exe", "--data-dir", folder]) != folder
+    assert config._app_data_path(["vexo.exe", "--dns-service", "--data-dir"]) != folder
+
+
+def test_connects_only_to_the_service_it_launched(service, tmp_path):
+    server, backend, client = service
+    service_file = str(tmp_path / "dns_service.json")
+    server.publish(service_file, "older")
+
+    assert connect_dns_service(service_file, timeout=2, launch_id="mine") is None
+    assert wait_for_dns_service("mine", timeout=0.3, service_file=service_file) is None
+    other = connect_dns_service(service_file, timeout=2, launch_id="older")
+    assert other is not None
+    other.close()
+
+
+def test_idle_time_counts_only_while_no_client_is_connected(service):
+    server, backend, client = service
+
+    client.health()
+    assert server.idle_time() == 0
+    client.close()
+    deadline = time.monotonic() + 2
+    while server.idle_time() == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert 0 < server.idle_time() < 2
+
+
+def test_service_publishes_its_launch_and_exits_once_idle(tmp_path):
+    service_file = str(tmp_path / "dns_service.json")
+    runner = threading.Thread(target=run_service, kwargs=dict(
+        backend=FakeDnsBackend(), service_file=service_file, lock_file=str(tmp_path / "dns_service.lock"),
+        idle_timeout=0.5, launch_id="abc123"
+    ), daemon=True)
+    runner.start()
+
+    client = wait_for_dns_service("abc123", timeout=5, service_file=service_file)
+    assert client is not None
+    # A connected GUI keeps the service alive past the idle timeout
+    runner.join(1.5)
+    assert runner.is_alive()
+    assert client.apply_dns("1.1.1.1")["success"]
+
+    client.close()
+    runner.join(5)
+    assert not runner.is_alive()
+    assert not (tmp_path / "dns_service.json").exists()
+
+
+def test_system_backend_rereads_changed_settings(tmp_path, monkeypatch):
+    settings_file = tmp_path / "settings.json"
+    monkeypatch.setattr(config, "SETTINGS_FILE", str(settings_file))
+    monkeypatch.setattr(config, "app_settings", {"adapter_policy": "default_route"})
+    monkeypatch.setattr(config, "current_language", config.current_language)
+    monkeypatch.setattr(config, "last_fetched_data", None)
+    monkeypatch.setattr(dns_manager, "get_active_interface_names", lambda: [config.app_settings["adapter_policy"]])
+    backend = SystemDnsBackend(settings_file=str(settings_file))
+
+    assert backend.active_interfaces() == ["default_route"]
+    settings_file.write_text(json.dumps({"adapter_policy": "physical"}), encoding="utf-8")
+    os.utime(settings_file, ns=(10 ** 18, 10 ** 18))
+    assert backend.active_interfaces() == ["physical"]
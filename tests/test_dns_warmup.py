@@ -0,0 +1,113 @@
+# test_dns_warmup.py
+import socket
+import threading
+import time
+
+import pytest
+
+from dns_transport import get_query_name
+from dns_warmup import UpstreamResolverBackend, run_post_switch
+
+
+class FakeBackend:
+    def __init__(self, delays=None, failing=(), flushed=True):
+        self.delays = delays or {}
+        self.failing = set(failing)
+        self.flushed = flushed
+        self.resolved = []
+        self.running = 0
+        self.most_running = 0
+        self.lock = threading.Lock()
+
+    def flush(self):
+        return self.flushed
+
+    def resolve(self, domain, timeout):
+        with self.lock:
+            self.running += 1
+            self.most_running = max(self.most_running, self.running)
+        try:
+            time.sleep(self.delays.get(domain, 0.01))
+            if domain in self.failing:
+                raise OSError(domain)
+            return True
+        finally:
+            with self.lock:
+                self.running -= 1
+                self.resolved.append(domain)
+
+
+def test_resolves_every_domain_once():
+    backend = FakeBackend(failing={"b.example"})
+
+    result = run_post_switch(backend, ["a.example", "b.example", "a.example", "c.example"])
+
+    assert sorted(backend.resolved) == ["a.example", "b.example", "c.example"]
+    assert (result["flushed"], result["warmed"], result["failed"], result["skipped"]) == (True, 2, 1, 0)
+
+
+def test_concurrency_is_bounded():
+    backend = FakeBackend(delays={f"d{n}.example": 0.05 for n in range(12)})
+
+    result = run_post_switch(backend, [f"d{n}.example" for n in range(12)], concurrency=3)
+
+    assert result["warmed"] == 12
+    assert backend.most_running == 3
+
+
+def test_stage_stops_at_the_budget():
+    backend = FakeBackend(delays={"slow.example": 5})
+
+    result = run_post_switch(backend, ["fast.example", "slow.example"], budget=0.2)
+
+    assert result["elapsed"] < 1
+    assert (result["warmed"], result["skipped"]) == (1, 1)
+
+
+def test_no_domains_only_flushes():
+    result = run_post_switch(FakeBackend(flushed=False), [])
+
+    assert (result["flushed"], result["warmed"], result["skipped"]) == (False, 0, 0)
+
+
+class StubResolver:
+    """A UDP resolver on loopback: echoes each query as its answer, except for names in silent."""
+
+    def __init__(self, port):
+        self.port = port
+        self.silent = set()
+        self.names = []
+
+
+@pytest.fixture
+def stub_resolver():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    stub = StubResolver(sock.getsockname()[1])
+
+    def serve():
+        while True:
+            try:
+                query, address = sock.recvfrom(4096)
+            except OSError:
+                return
+            name = get_query_name(query)
+            stub.names.append(name)
+            if name not in stub.silent:
+                sock.sendto(query[:2] + b"\x81\x80" + query[4:], address)
+
+    threading.Thread(target=serve, daemon=True).start()
+    yield stub
+    sock.close()
+
+
+def test_warms_through_a_local_stub_resolver(stub_resolver):
+    stub_resolver.silent.add("lost.example")
+    backend = UpstreamResolverBackend("127.0.0.1", stub_resolver.port)
+
+    result = run_post_switch(backend, ["one.example", "two.example", "lost.example"], budget=0.5)
+
+    assert sorted(stub_resolver.names) == ["lost.example", "one.example", "two.example"]
+    assert result["flushed"] is False
+    assert result["warmed"] == 2
+    assert result["failed"] + result["skipped"] == 1
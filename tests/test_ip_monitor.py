@@ -0,0 +1,102 @@
+# test_ip_monitor.py
+import socket
+import struct
+
+from ip_monitor import (
+    IP_ADDR_ROW, IpChangeDetector, CONFLICT_BACKOFF_BASE, DEBOUNCE_SECONDS, MIN_CONFIRM_INTERVAL,
+    get_local_network_signature, parse_ip_addr_table,
+)
+
+
+class FakeNetwork:
+    def __init__(self, public_ip, registered_ip):
+        self.public_ip = public_ip
+        self.registered_ip = registered_ip
+        self.signature = ("192.168.1.2",)
+        self.lookups = 0
+        self.registrations = []
+        self.answer = "ip_changed_from_to"
+        self.now = 1000.0
+
+    def get_public_ip(self):
+        self.lookups += 1
+        return self.public_ip
+
+    def register_ip(self, new_ip, old_ip):
+        self.registrations.append((old_ip, new_ip))
+        if self.answer == "ip_changed_from_to":
+            self.registered_ip = new_ip
+        return {"key": self.answer, "params": {}, "style": "success"}
+
+
+def make_detector(network):
+    return IpChangeDetector(network.get_public_ip, network.register_ip, registered_ip=network.registered_ip,
+                            get_signature=lambda: network.signature, clock=lambda: network.now)
+
+
+def test_registers_only_a_real_change():
+    network = FakeNetwork("203.0.113.5", "203.0.113.5")
+    detector = make_detector(network)
+
+    assert detector.check() is None
+    assert network.lookups == 1 and not network.registrations
+    assert detector.get_fresh_ip() == "203.0.113.5"
+
+    # Quiet network: no new lookup
+    network.now += 30
+    assert detector.check() is None
+    assert network.lookups == 1
+
+
+def test_debounced_local_change_triggers_registration():
+    network = FakeNetwork("203.0.113.5", "203.0.113.5")
+    detector = make_detector(network)
+    detector.check()
+
+    network.now += MIN_CONFIRM_INTERVAL
+    network.signature = ("10.0.0.7",)
+    network.public_ip = "198.51.100.9"
+    assert detector.check() is None
+    assert detector.get_fresh_ip() is None
+
+    network.now += DEBOUNCE_SECONDS
+    status = detector.check()
+    assert status["key"] == "ip_changed_from_to"
+    assert network.registrations == [("203.0.113.5", "198.51.100.9")]
+    assert detector.registered_ip == "198.51.100.9"
+
+
+def test_conflict_backs_off():
+    network = FakeNetwork("198.51.100.9", "203.0.113.5")
+    network.answer = "ip_conflict"
+    detector = make_detector(network)
+
+    detector.check()
+    assert detector.backoff == CONFLICT_BACKOFF_BASE
+    network.now += CONFLICT_BACKOFF_BASE - 1
+    detector.check()
+    assert len(network.registrations) == 1
+
+    network.now += 1
+    detector.check()
+    assert len(network.registrations) == 2
+    assert detector.backoff == 2 * CONFLICT_BACKOFF_BASE
+
+
+def test_parses_the_interface_address_table():
+    rows = [("192.168.1.20", 12), ("127.0.0.1", 1), ("10.8.0.2", 30)]
+    data = struct.pack("<I", len(rows)) + b"".join(
+        IP_ADDR_ROW.pack(socket.inet_aton(address), index, 0, 1, 65535, 0, 1) for address, index in rows)
+
+    assert parse_ip_addr_table(data) == ("10.8.0.2", "192.168.1.20")
+
+
+def test_signature_needs_no_name_lookup(monkeypatch):
+    def no_lookups(*args):
+        raise AssertionError("name lookup")
+
+    monkeypatch.setattr(socket, "gethostbyname_ex", no_lookups)
+    monkeypatch.setattr(socket, "getaddrinfo", no_lookups)
+
+    route_source, addresses, gateway = get_local_network_signature()
+    assert isinstance(addresses, tuple)
@@ -0,0 +1,206 @@
+# test_local_forwarder.py
+import os
+import socket
+import ssl
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from conftest import FIXTURES_DIR
+from dns_transport import DotUpstream, build_query, get_query_id, get_query_name
+import local_forwarder
+from local_forwarder import LocalForwarder
+
+
+def make_answer(query):
+    """The query echoed back with the QR bit set: enough for a forwarder to pass on."""
+    return query[:2] + b"\x81\x80" + query[4:]
+
+
+class EchoUpstream:
+    def __init__(self):
+        self.names = []
+        self.closed = False
+
+    def query(self, packet):
+        self.names.append(get_query_name(packet))
+        return make_answer(packet)
+
+    def close(self):
+        self.closed = True
+
+
+def ask(port, name, query_id=0x1234):
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(2)
+        sock.sendto(build_query(name, query_id=query_id), ("127.0.0.1", port))
+        return sock.recvfrom(4096)[0]
+
+
+@pytest.fixture
+def forwarder():
+    upstream = EchoUpstream()
+    forwarder = LocalForwarder(upstream, listen_port=0)
+    forwarder.start()
+    yield forwarder
+    forwarder.stop()
+
+
+def test_forwards_loopback_queries_to_the_upstream(forwarder):
+    answer = ask(forwarder.listen_port, "example.com")
+
+    assert get_query_id(answer) == 0x1234
+    assert answer[2] & 0x80
+    assert forwarder.upstream.names == ["example.com"]
+
+
+def test_keeps_serving_after_a_client_went_away(forwarder):
+    # A client that sent a query and closed its socket before the answer came back
+    gone = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    gone.sendto(build_query("gone.example"), ("127.0.0.1", forwarder.listen_port))
+    gone.close()
+
+    assert get_query_name(ask(forwarder.listen_port, "next.example")) == "next.example"
+
+
+class FlakySocket:
+    """recvfrom() fails like Windows does after an ICMP port-unreachable, then works."""
+
+    def __init__(self, forwarder, packet):
+        self.forwarder = forwarder
+        self.events = [ConnectionResetError(10054, "reset"), OSError("transient"), (packet, ("127.0.0.1", 5353))]
+        self.sent = []
+
+    def recvfrom(self, size):
+        if not self.events:
+            self.forwarder._sock = None
+            raise OSError("closed")
+        event = self.events.pop(0)
+        if isinstance(event, Exception):
+            raise event
+        return event
+
+    def sendto(self, data, address):
+        self.sent.append(data)
+
+
+def test_receive_errors_only_end_the_loop_once_stopped():
+    forwarder = LocalForwarder(EchoUpstream(), listen_port=0)
+    flaky = FlakySocket(forwarder, build_query("after.reset"))
+    forwarder._sock = flaky
+    executor = ThreadPoolExecutor(max_workers=1)
+
+    forwarder._serve(flaky, executor)
+    executor.shutdown(wait=True)
+
+    assert [get_query_name(data) for data in flaky.sent] == ["after.reset"]
+
+
+def test_repeated_receive_errors_back_off(monkeypatch):
+    forwarder = LocalForwarder(EchoUpstream(), listen_port=0)
+    sleeps = []
+
+    class BrokenSocket:
+        def recvfrom(self, size):
+            if len(sleeps) == 10:
+                forwarder._sock = None
+            raise OSError("broken")
+
+    monkeypatch.setattr(local_forwarder.time, "sleep", sleeps.append)
+    forwarder._sock = broken = BrokenSocket()
+
+    forwarder._serve(broken, ThreadPoolExecutor(max_workers=1))
+
+    assert len(sleeps) == 10
+    assert sleeps == sorted(sleeps) and sleeps[-1] == local_forwarder.MAX_ERROR_BACKOFF
+
+
+def test_stop_ends_the_loop_before_the_executor_shuts_down():
+    forwarder = LocalForwarder(EchoUpstream(), listen_port=0)
+    forwarder.start()
+    thread = forwarder._thread
+    ask(forwarder.listen_port, "before.stop")
+
+    forwarder.stop()
+
+    assert not thread.is_alive()
+    assert forwarder.upstream.closed
+
+
+def test_forwarder_answers_the_probe_itself(forwarder):
+    assert local_forwarder.probe("127.0.0.1", forwarder.listen_port)
+    assert forwarder.upstream.names == []
+
+    forwarder.stop()
+    assert not local_forwarder.probe("127.0.0.1", forwarder.listen_port, timeout=0.2)
+
+
+class DotStubServer:
+    """A DNS-over-TLS server on loopback with the self-signed fixture certificate."""
+
+    def __init__(self):
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(os.path.join(FIXTURES_DIR, "localhost.pem"),
+                                os.path.join(FIXTURES_DIR, "localhost.key"))
+        self.listener = socket.create_server(("127.0.0.1", 0))
+        self.port = self.listener.getsockname()[1]
+        self.context = context
+        self.connections = 0
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                raw, _ = self.listener.accept()
+            except OSError:
+                return
+            self.connections += 1
+            threading.Thread(target=self._serve, args=(raw,), daemon=True).start()
+
+    def _serve(self, raw):
+        try:
+            with self.context.wrap_socket(raw, server_side=True) as conn:
+                while True:
+                    header = conn.recv(2)
+                    if len(header) < 2:
+                        return
+                    length = struct.unpack("!H", header)[0]
+                    query = b""
+                    while len(query) < length:
+                        query += conn.recv(length - len(query))
+                    answer = make_answer(query)
+                    conn.sendall(struct.pack("!H", len(answer)) + answer)
+        except (OSError, ssl.SSLError):
+            pass
+
+    def close(self):
+        self.listener.close()
+
+
+def test_dot_upstream_reuses_one_tls_connection():
+    server = DotStubServer()
+    context = ssl.create_default_context(cafile=os.path.join(FIXTURES_DIR, "localhost.pem"))
+    upstream = DotUpstream("127.0.0.1", server.port, server_name="localhost", ssl_context=context, timeout=2)
+    try:
+        for query_id, name in enumerate(["a.example", "b.example", "c.example"], 1):
+            answer = upstream.query(build_query(name, query_id=query_id))
+            assert get_query_id(answer) == query_id
+            assert get_query_name(answer) == name
+        assert upstream.connections_opened == 1
+        assert server.connections == 1
+    finally:
+        upstream.close()
+        server.close()
+
+
+def test_dot_upstream_rejects_an_untrusted_certificate():
+    server = DotStubServer()
+    upstream = DotUpstream("127.0.0.1", server.port, server_name="localhost", timeout=2)
+    try:
+        with pytest.raises(ssl.SSLError):
+            upstream.query(build_query("a.example"))
+    finally:
+        upstream.close()
+        server.close()
@@ -0,0 +1,91 @@
+# test_metrics.py
+import json
+import urllib.request
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture(autouse=True)
+def no_sources(monkeypatch):
+    monkeypatch.setattr(metrics, "_sources", {})
+
+
+def _lines(text, prefix):
+    return [line for line in text.splitlines() if line.startswith(prefix)]
+
+
+def test_histogram_buckets_are_cumulative_with_inclusive_bounds():
+    for value in (0.05, 0.07, 3, 40):
+        metrics.observe(metrics.SUBPROCESS_DURATION, value, command="bucket-test")
+
+    text = metrics.render_prometheus()
+    series = 'vexo_subprocess_duration_seconds_bucket{command="bucket-test",le='
+    buckets = {line[len(series):].split("}")[0].strip('"'): int(line.rsplit(" ", 1)[1])
+               for line in _lines(text, series)}
+
+    assert buckets == {"0.05": 1, "0.1": 2, "0.25": 2, "0.5": 2, "1": 2, "2.5": 2, "5": 3, "10": 3, "15": 3,
+                       "30": 3, "+Inf": 4}
+    assert _lines(text, 'vexo_subprocess_duration_seconds_count{command="bucket-test"}') == [
+        'vexo_subprocess_duration_seconds_count{command="bucket-test"} 4']
+    total = _lines(text, 'vexo_subprocess_duration_seconds_sum{command="bucket-test"}')[0].rsplit(" ", 1)[1]
+    assert float(total) == pytest.approx(43.12)
+
+
+def test_exposition_format():
+    metrics.inc(metrics.IP_PROVIDER_REQUESTS, provider='https://a"b\\c', result="success")
+
+    text = metrics.render_prometheus()
+
+    assert text.endswith("\n")
+    for name in ("vexo_fetch_duration_seconds", "vexo_ip_provider_requests_total", "vexo_dns_connected"):
+        help_line, type_line = _lines(text, f"# HELP {name} ") + _lines(text, f"# TYPE {name} ")
+        assert text.index(help_line) < text.index(type_line)
+    assert "# TYPE vexo_ip_provider_requests_total counter" in text
+    assert "# TYPE vexo_resolver_latency_seconds histogram" in text
+    assert 'vexo_ip_provider_requests_total{provider="https://a\\"b\\\\c",result="success"} 1' in text
+
+
+def test_other_processes_are_merged_with_a_process_label():
+    buckets = [0] * len(metrics.LATENCY_BUCKETS)
+    buckets[1] = 2
+    metrics.add_source("dns_service", lambda: [
+        [metrics.SUBPROCESS_DURATION, {"command": "netsh"}, [buckets, 2, 0.15]],
+        ["vexo_unknown_total", {}, 1],
+        [metrics.SUBPROCESS_DURATION, {"command": "short"}, [[1], 1, 0.01]],
+    ])
+
+    def unreachable():
+        raise ConnectionError("gone")
+    metrics.add_source("stopped", unreachable)
+
+    text = metrics.render_prometheus()
+
+    assert 'vexo_subprocess_duration_seconds_bucket{command="netsh",process="dns_service",le="0.1"} 2' in text
+    assert 'vexo_subprocess_duration_seconds_count{command="netsh",process="dns_service"} 2' in text
+    assert "vexo_unknown_total" not in text
+    assert 'command="short"' not in text
+    assert 'process="stopped"' not in text
+
+
+def test_exported_samples_round_trip_through_json():
+    metrics.observe(metrics.RESOLVER_LATENCY, 0.02, upstream="export-test")
+    exported = json.loads(json.dumps(metrics.export_samples()))
+    metrics.add_source("copy", lambda: exported)
+
+    snapshot = metrics.snapshot()[metrics.RESOLVER_LATENCY]["samples"]
+
+    copied = [entry for entry in snapshot if entry["labels"] == {"upstream": "export-test", "process": "copy"}]
+    assert copied and copied[0]["count"] == 1 and copied[0]["buckets"]["0.025"] == 1
+
+
+def test_endpoint_serves_the_text_format():
+    server = metrics.MetricsServer(0)
+    server.start()
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics", timeout=2) as response:
+            assert response.headers["Content-Type"] == "text/plain; version=0.0.4"
+            assert b"# TYPE vexo_fetch_duration_seconds histogram" in response.read()
+    finally:
+        server.stop()
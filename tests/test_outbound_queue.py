@@ -0,0 +1,65 @@
+# test_outbound_queue.py
+import pytest
+
+import outbound_queue
+from outbound_queue import RETRY_BASE, RETRY_FACTOR
+
+URL = "https://panel.example/sub/token123"
+API_URL = "https://panel.example/api/sub/token123"
+
+
+class PanelUnavailable(Exception):
+    """Stands in for a connection error or a 5xx raised by update_registered_ip."""
+
+
+@pytest.fixture(autouse=True)
+def queue_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(outbound_queue, "QUEUE_FILE", str(tmp_path / "outbound_queue.json"))
+    monkeypatch.setattr(outbound_queue, "APP_DATA_PATH", str(tmp_path))
+
+
+def test_newer_ip_replaces_the_queued_one():
+    outbound_queue.enqueue_ip_update(URL, API_URL, "198.51.100.1", "203.0.113.5", now=1000)
+    outbound_queue.enqueue_ip_update(URL, API_URL, "198.51.100.2", "198.51.100.1", now=1010)
+
+    entry, = outbound_queue.read_queue().values()
+    assert entry["ip"] == "198.51.100.2"
+    # Still the IP the panel has registered
+    assert entry["old_ip"] == "203.0.113.5"
+    assert outbound_queue.seconds_until_next(now=1010) == RETRY_BASE
+
+
+def test_failed_replay_stays_queued_with_backoff():
+    outbound_queue.enqueue_ip_update(URL, API_URL, "198.51.100.1", None, now=1000)
+
+    def send(entry):
+        raise PanelUnavailable("503")
+
+    assert outbound_queue.replay_due(send, retry_on=(PanelUnavailable,), now=1000 + RETRY_BASE) == []
+    entry = outbound_queue.read_queue()["token123"]
+    assert entry["attempts"] == 1
+    assert entry["next_attempt"] == 1000 + RETRY_BASE + RETRY_BASE * RETRY_FACTOR
+
+    # Not due yet: not sent again
+    assert outbound_queue.replay_due(send, retry_on=(PanelUnavailable,), now=1000 + RETRY_BASE + 1) == []
+    assert outbound_queue.read_queue()["token123"]["attempts"] == 1
+
+
+def test_definite_answer_removes_the_entry():
+    outbound_queue.enqueue_ip_update(URL, API_URL, "198.51.100.1", None, now=1000)
+    status = {"key": "ip_conflict_error", "params": {}, "style": "danger"}
+
+    answered = outbound_queue.replay_due(lambda entry: status, retry_on=(PanelUnavailable,), now=2000)
+
+    assert answered == [(URL, status)]
+    assert outbound_queue.read_queue() == {}
+    assert outbound_queue.seconds_until_next() is None
+
+
+def test_discard():
+    outbound_queue.enqueue_ip_update(URL, API_URL, "198.51.100.1", None)
+    outbound_queue.discard("https://other.example/sub/else")
+    assert outbound_queue.read_queue()
+
+    outbound_queue.discard(URL)
+    assert outbound_queue.read_queue() == {}
@@ -0,0 +1,168 @@
+# test_panel_mirrors.py
+import json
+import threading
+import time
+
+import pytest
+
+import config
+
+import panel_mirrors
+import resilience
+from resilience import CLOSED, OPEN
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class FakeHTTPError(Exception):
+    """Like requests.HTTPError from raise_for_status: carries the response."""
+
+    def __init__(self, status_code):
+        super().__init__(status_code)
+        self.response = FakeResponse(status_code)
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(panel_mirrors, "_stats", {})
+    monkeypatch.setattr(resilience, "_breakers", {})
+
+
+def fail_with(error):
+    def send(base, timeout):
+        raise error
+    return send
+
+
+def answer(status_code):
+    return lambda base, timeout: FakeResponse(status_code)
+
+
+BASE = "https://panel.example"
+
+
+def test_client_errors_do_not_open_the_breaker():
+    for _ in range(5):
+        with pytest.raises(FakeHTTPError):
+            panel_mirrors.request_single(BASE, fail_with(FakeHTTPError(404)), 1)
+        panel_mirrors.request_single(BASE, answer(409), 1)
+
+    assert panel_mirrors.get_breaker_for(BASE).state == CLOSED
+    assert panel_mirrors.is_healthy(BASE)
+
+
+@pytest.mark.parametrize("send", [
+    fail_with(FakeHTTPError(503)),
+    fail_with(ConnectionError("refused")),
+    fail_with(TimeoutError()),
+])
+def test_server_and_connection_errors_open_the_breaker(send):
+    for _ in range(3):
+        with pytest.raises(Exception):
+            panel_mirrors.request_single(BASE, send, 1)
+
+    assert panel_mirrors.get_breaker_for(BASE).state == OPEN
+    with pytest.raises(resilience.CircuitOpenError):
+        panel_mirrors.request_single(BASE, answer(200), 1)
+
+
+def test_returned_server_error_counts_as_a_failure():
+    for _ in range(3):
+        assert panel_mirrors.request_single(BASE, answer(500), 1).status_code == 500
+
+    assert panel_mirrors.get_breaker_for(BASE).state == OPEN
+    assert not panel_mirrors.is_healthy(BASE)
+
+
+TOKEN_URL = BASE + "/sub/token123"
+
+
+def test_remember_mirrors_keeps_only_https(monkeypatch):
+    monkeypatch.setitem(panel_mirrors.app_settings, "panel_mirrors", {})
+    panel_mirrors.remember_mirrors(TOKEN_URL, [
+        "http://plain.example/sub/x", "https://m1.example/sub/x", "https://m1.example/", "ftp://x",
+    ])
+
+    assert panel_mirrors.app_settings["panel_mirrors"]["token123"] == ["https://m1.example"]
+
+
+def test_candidates_skip_stored_http_mirrors(monkeypatch):
+    monkeypatch.setitem(panel_mirrors.app_settings, "panel_mirrors", {
+        "token123": ["http://plain.example", "https://m1.example", BASE],
+    })
+
+    assert panel_mirrors.candidates(TOKEN_URL) == [BASE, "https://m1.example"]
+
+
+def delayed(delays):
+    def send(base, timeout):
+        delay = delays[base]
+        if delay is None:
+            raise ConnectionError(base)
+        time.sleep(delay)
+        return FakeResponse(200)
+    return send
+
+
+def test_race_returns_the_fastest_working_mirror():
+    send = delayed({BASE: 0.3, "https://m1.example": None, "https://m2.example": 0.01})
+
+    base, response = panel_mirrors.race([BASE, "https://m1.example", "https://m2.example"], send, 2)
+
+    assert base == "https://m2.example" and response.status_code == 200
+
+
+def test_ranking_prefers_healthy_fast_mirrors(monkeypatch):
+    monkeypatch.setitem(panel_mirrors.app_settings, "panel_mirrors", {
+        "token123": ["https://slow.example", "https://down.example", "https://fast.example"],
+    })
+    panel_mirrors.record(BASE, 0.5)
+    panel_mirrors.record("https://slow.example", 0.9)
+    panel_mirrors.record("https://fast.example", 0.05)
+    for _ in range(3):
+        panel_mirrors.record("https://down.example", None)
+
+    assert panel_mirrors.ranked(TOKEN_URL) == [
+        "https://fast.example", BASE, "https://slow.example", "https://down.example",
+    ]
+
+
+def test_concurrent_settings_writes_keep_the_file_valid(monkeypatch):
+    monkeypatch.setitem(panel_mirrors.app_settings, "panel_mirrors", {})
+    errors = []
+
+    def writer(n):
+        try:
+            for i in range(20):
+                panel_mirrors.record(f"https://m{n}.example", 0.01 * i)
+                panel_mirrors.save_stats()
+                panel_mirrors.remember_mirrors(f"{BASE}/sub/t{n}", [f"https://m{n}-{i}.example"])
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    with open(config.SETTINGS_FILE, "r", encoding="utf-8") as f:
+        saved = json.load(f)
+    assert set(saved["mirror_stats"]) == {f"https://m{n}.example" for n in range(4)}
+    assert saved["panel_mirrors"]["t3"] == ["https://m3-19.example"]
+
+
+@pytest.mark.parametrize("status_code, rejected", [
+    (400, True), (403, True), (404, True), (410, True),
+    (408, False), (429, False), (500, False), (503, False), (200, False),
+])
+def test_rejects_link_only_for_definite_client_errors(status_code, rejected):
+    assert panel_mirrors.rejects_link(FakeResponse(status_code)) is rejected
+
+
+def test_no_answer_does_not_reject_the_link():
+    assert not panel_mirrors.rejects_link(None)
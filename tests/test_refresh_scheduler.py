@@ -0,0 +1,111 @@
+# test_refresh_scheduler.py
+import pytest
+
+import refresh_scheduler
+from refresh_scheduler import (
+    AutoRefreshScheduler, BASE_INTERVAL, URGENT_INTERVAL, MIN_INTERVAL, MAX_INTERVAL,
+    compute_next_interval, is_running_out,
+)
+from subscription import Subscription, STATUS_ACTIVE, STATUS_EXPIRED
+
+
+def make_sub(**fields):
+    payload = {"status_key": STATUS_ACTIVE, "allowed_volume_gb": 50, "used_volume_gb": 10, "remaining_days": 20}
+    payload.update(fields)
+    return Subscription.from_payload(payload)
+
+
+class FakeTimers:
+    """The window's after/after_cancel, without a Tk loop."""
+
+    def __init__(self):
+        self.pending = {}
+        self._next_id = 0
+
+    def after(self, delay_ms, callback):
+        self._next_id += 1
+        self.pending[self._next_id] = (delay_ms, callback)
+        return self._next_id
+
+    def after_cancel(self, timer_id):
+        self.pending.pop(timer_id, None)
+
+    def fire(self):
+        (timer_id, (_, callback)), = self.pending.items()
+        del self.pending[timer_id]
+        callback()
+
+
+@pytest.fixture(autouse=True)
+def no_jitter(monkeypatch):
+    monkeypatch.setattr(refresh_scheduler, "apply_jitter", lambda interval: interval)
+
+
+def test_running_out_of_volume_or_time():
+    assert is_running_out(make_sub(used_volume_gb=49.5))
+    assert is_running_out(make_sub(remaining_days=0, remaining_hours=5))
+    assert not is_running_out(make_sub())
+    assert not is_running_out(make_sub(used_volume_gb=49.5, is_unlimited_volume=True))
+
+
+def test_expired_subscriptions_are_not_running_out():
+    assert not is_running_out(make_sub(status_key=STATUS_EXPIRED, used_volume_gb=49.5))
+    assert not is_running_out(make_sub(remaining_days=0, remaining_hours=0, used_volume_gb=49.5))
+    assert not is_running_out(make_sub(remaining_days=-3))
+
+
+def test_next_interval():
+    sub = make_sub()
+    assert compute_next_interval(sub, BASE_INTERVAL, False, True) == MIN_INTERVAL
+    assert compute_next_interval(make_sub(used_volume_gb=49.5), BASE_INTERVAL, False, False) == URGENT_INTERVAL
+    assert compute_next_interval(sub, BASE_INTERVAL, True, False) == BASE_INTERVAL
+    assert compute_next_interval(sub, BASE_INTERVAL, False, False) == BASE_INTERVAL * 1.5
+    assert compute_next_interval(sub, MAX_INTERVAL, False, False) == MAX_INTERVAL
+
+
+def test_chain_continues_when_no_fetch_was_started():
+    timers = FakeTimers()
+    scheduler = AutoRefreshScheduler(timers, lambda: False, lambda: False, online_check=lambda: True)
+    scheduler.start(delay=1)
+
+    timers.fire()
+
+    assert [delay for delay, _ in timers.pending.values()] == [BASE_INTERVAL * 1000]
+
+
+def test_chain_continues_when_the_callback_fails():
+    def broken():
+        raise RuntimeError("boom")
+
+    timers = FakeTimers()
+    scheduler = AutoRefreshScheduler(timers, broken, lambda: False, online_check=lambda: True)
+    scheduler.start(delay=1)
+
+    with pytest.raises(RuntimeError):
+        timers.fire()
+    assert len(timers.pending) == 1
+
+
+def test_started_fetch_schedules_from_its_result():
+    timers = FakeTimers()
+    scheduler = AutoRefreshScheduler(timers, lambda: True, lambda: False, online_check=lambda: True)
+    scheduler.start(delay=1)
+
+    timers.fire()
+    assert not timers.pending
+
+    scheduler.on_fetch_finished({"success": True, "sub_data": make_sub(used_volume_gb=49.5), "ip_status": None})
+    assert [delay for delay, _ in timers.pending.values()] == [URGENT_INTERVAL * 1000]
+
+
+def test_offline_and_busy_recheck():
+    timers = FakeTimers()
+    online = [False]
+    scheduler = AutoRefreshScheduler(timers, lambda: True, lambda: True, online_check=lambda: online[0])
+    scheduler.start(delay=1)
+
+    timers.fire()
+    assert [delay for delay, _ in timers.pending.values()] == [refresh_scheduler.OFFLINE_RECHECK * 1000]
+    online[0] = True
+    timers.fire()
+    assert [delay for delay, _ in timers.pending.values()] == [refresh_scheduler.BUSY_RECHECK * 1000]
@@ -0,0 +1,132 @@
+# test_resilience.py
+import random
+
+import pytest
+
+from resilience import (
+    CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, Deadline, backoff_delays,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def make_breaker(clock):
+    return CircuitBreaker("panel", failure_threshold=3, reset_timeout=60, trial_timeout=10, clock=clock)
+
+
+def test_consecutive_failures_open_the_breaker(clock):
+    breaker = make_breaker(clock)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow_request()
+
+
+def test_half_open_lets_one_trial_through(clock):
+    breaker = make_breaker(clock)
+    for _ in range(3):
+        breaker.record_failure()
+
+    clock.now += 60
+    assert breaker.allow_request()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow_request()
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow_request()
+
+
+def test_failed_trial_reopens(clock):
+    breaker = make_breaker(clock)
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 60
+    assert breaker.allow_request()
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    clock.now += 59
+    assert not breaker.allow_request()
+
+
+def test_unreported_trial_times_out_back_to_open(clock):
+    breaker = make_breaker(clock)
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 60
+    assert breaker.allow_request()
+
+    clock.now += 10
+    assert not breaker.allow_request()
+    assert breaker.state == OPEN
+
+    clock.now += 60
+    assert breaker.allow_request()
+    assert breaker.state == HALF_OPEN
+
+
+def test_call_counts_exceptions_and_refuses_when_open(clock):
+    breaker = make_breaker(clock)
+
+    def fail():
+        raise ConnectionError()
+
+    for _ in range(3):
+        with pytest.raises(ConnectionError):
+            breaker.call(fail)
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: "never")
+
+    clock.now += 60
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.state == CLOSED
+
+
+def test_backoff_delays_use_full_jitter_up_to_the_cap():
+    delays = list(backoff_delays(6, base=0.5, factor=2, max_delay=4, rng=random.Random(7)))
+
+    assert len(delays) == 6
+    for attempt, delay in enumerate(delays):
+        assert 0 <= delay <= min(4, 0.5 * 2 ** attempt)
+
+
+def test_backoff_delays_draw_from_the_growing_window():
+    class Highest:
+        def uniform(self, low, high):
+            return high
+
+    assert list(backoff_delays(5, rng=Highest())) == [0.5, 1, 2, 4, 4]
+
+
+def test_deadline_caps_timeouts_and_sleeps(clock, monkeypatch):
+    slept = []
+    monkeypatch.setattr("resilience.time.sleep", slept.append)
+    deadline = Deadline(5, clock=clock)
+
+    assert deadline.timeout(10) == 5
+    clock.now += 4
+    assert deadline.timeout(10) == 1
+    assert deadline.sleep(0.5) and slept == [0.5]
+    assert not deadline.sleep(2)
+
+    clock.now += 1
+    assert deadline.expired
+    assert deadline.remaining() == 0
@@ -0,0 +1,64 @@
+# test_single_instance.py
+import json
+import queue
+import socket
+
+import pytest
+
+from single_instance import (
+    CommandServer, InstanceLock, command_from_argv, send_command,
+    COMMAND_SHOW, COMMAND_SET_DNS, COMMAND_UNSET_DNS, COMMAND_DIAGNOSTICS,
+)
+
+
+@pytest.fixture
+def server(tmp_path):
+    received = queue.Queue()
+    server = CommandServer(received.put, instance_file=str(tmp_path / "instance.json"))
+    server.start()
+    server.received = received
+    yield server
+    server.stop()
+
+
+def test_command_from_argv():
+    assert command_from_argv(["vexo.exe"]) == COMMAND_SHOW
+    assert command_from_argv(["vexo.exe", "--set-dns"]) == COMMAND_SET_DNS
+    assert command_from_argv(["vexo.exe", "--unset-dns"]) == COMMAND_UNSET_DNS
+    assert command_from_argv(["vexo.exe", "--diagnostics"]) == COMMAND_DIAGNOSTICS
+
+
+def test_forwards_a_command(server):
+    assert send_command(COMMAND_SET_DNS, instance_file=server.instance_file)
+    assert server.received.get(timeout=2) == COMMAND_SET_DNS
+
+
+def raw_request(port, message):
+    with socket.create_connection(("127.0.0.1", port), timeout=2) as conn:
+        conn.sendall(message)
+        return conn.recv(16)
+
+
+def test_rejects_a_wrong_token_or_unknown_command(server):
+    assert raw_request(server.port, json.dumps({"token": "0" * 32, "command": "show"}).encode() + b"\n") == b"error\n"
+    assert raw_request(server.port, json.dumps({"token": server.token, "command": "format_c"}).encode() + b"\n") == b"error\n"
+    assert raw_request(server.port, b"not json\n") == b"error\n"
+    assert server.received.empty()
+
+
+def test_stale_instance_file(server, tmp_path):
+    instance_file = server.instance_file
+    server.stop()
+
+    assert not send_command(COMMAND_SHOW, instance_file=instance_file)
+    assert not send_command(COMMAND_SHOW, instance_file=str(tmp_path / "missing.json"))
+
+
+def test_only_one_lock_holder(tmp_path):
+    first, second = InstanceLock(str(tmp_path / "instance.lock")), InstanceLock(str(tmp_path / "instance.lock"))
+
+    assert first.acquire()
+    assert not second.acquire()
+    first.release()
+    assert second.acquire()
+    second.release()
@@ -0,0 +1,69 @@
+# test_soak.py
+import tracemalloc
+
+import pytest
+
+import soak
+from soak import find_unbounded_growth
+
+
+def samples(memory, hours=96, **fixed):
+    step = hours / len(memory)
+    base = {"threads": 3, "handles": 4, "pending_after": 1, "pending_timers": 4, "outstanding": 0}
+    base.update(fixed)
+    return [dict(base, hour=(index + 1) * step, memory_kb=kb) for index, kb in enumerate(memory)]
+
+
+def test_slow_steady_leak_is_flagged():
+    # 34 KB growing to 104 KB over a 96 hour run: every late peak is close to the early ones
+    memory = [34 + 70 * index / 95 for index in range(96)]
+
+    problems = find_unbounded_growth(samples(memory))
+
+    assert len(problems) == 1 and problems[0].startswith("memory_kb keeps growing")
+
+
+def test_noise_and_warm_up_are_not_flagged():
+    warm_up = [10, 18, 22, 26] * 6
+    noisy = [30, 34, 29, 36, 31, 33, 30, 35] * 9
+
+    assert find_unbounded_growth(samples(warm_up + noisy)) == []
+
+
+def test_thread_growth_is_flagged():
+    flat = samples([30] * 40)
+    for sample in flat[30:]:
+        sample["threads"] = 9
+
+    assert find_unbounded_growth(flat) == ["threads grew from 3 to 9"]
+
+
+@pytest.fixture
+def traced():
+    yield
+    tracemalloc.stop()
+
+
+def test_leak_in_the_app_is_found_by_a_real_run(monkeypatch, traced):
+    leaked = []
+    fetch = soak.FakeNetwork.fetch
+
+    def leaky_fetch(self, release=None):
+        leaked.append(bytearray(4096))
+        return fetch(self, release)
+
+    monkeypatch.setattr(soak.FakeNetwork, "fetch", leaky_fetch)
+    samples_, controller, baseline, final = soak.run_soak(hours=6, sample_minutes=15)
+
+    assert controller.fetches > 10
+    assert any(problem.startswith("memory_kb keeps growing") for problem in find_unbounded_growth(samples_))
+    # The report points at the leaking line, not at the harness
+    top = final.compare_to(baseline, "lineno")[0]
+    assert top.traceback[0].filename == __file__
+
+
+def test_harness_allocations_are_not_counted(traced):
+    samples_, controller, baseline, final = soak.run_soak(hours=6, sample_minutes=15)
+
+    assert find_unbounded_growth(samples_) == []
+    assert not any(stat.traceback[0].filename == soak.__file__ for stat in final.statistics("lineno"))
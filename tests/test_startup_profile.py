@@ -0,0 +1,62 @@
+# test_startup_profile.py
+import startup_profile
+from startup_profile import check_budget, parse_importtime
+
+IMPORTTIME_OUTPUT = """\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:       300 |       2500 |   requests
+import time:       900 |       3400 | main
+"""
+
+
+def test_parses_importtime_lines():
+    timings = parse_importtime(IMPORTTIME_OUTPUT)
+
+    assert timings == {"_io": (120, 120), "requests": (300, 2500), "main": (900, 3400)}
+
+
+def test_budget_and_forbidden_imports():
+    timings = parse_importtime(IMPORTTIME_OUTPUT)
+
+    assert check_budget(timings, "main", 10, ()) == []
+    problems = check_budget(timings, "main", 2, ("requests", "ssl"))
+    assert len(problems) == 2
+    assert "budget 2 ms" in problems[0] and "'requests'" in problems[1]
+
+
+def test_reports_a_failed_import(tmp_path):
+    (tmp_path / "broken_startup.py").write_text("import json\nimport module_that_does_not_exist\n")
+
+    output, error = startup_profile.run_importtime("broken_startup", cwd=str(tmp_path))
+
+    assert "json" in parse_importtime(output)
+    assert error.startswith("ModuleNotFoundError")
+    assert startup_profile.run_importtime("json", cwd=str(tmp_path))[1] is None
+
+
+def test_failed_import_exits_non_zero(monkeypatch, capsys):
+    # Timings for "main" were printed, but the import still failed
+    monkeypatch.setattr(startup_profile, "run_importtime",
+                        lambda module, cwd=None: (IMPORTTIME_OUTPUT, "ImportError: no ttkbootstrap"))
+
+    assert startup_profile.main(["--module", "main", "--budget-ms", "10000", "--forbid", ""]) == 1
+    assert "IMPORT FAILED" in capsys.readouterr().out
+
+
+def test_import_within_budget_passes(monkeypatch):
+    monkeypatch.setattr(startup_profile, "run_importtime", lambda module, cwd=None: (IMPORTTIME_OUTPUT, None))
+
+    assert startup_profile.main(["--module", "main", "--budget-ms", "10000", "--forbid", ""]) == 0
+
+
+def test_default_target_is_the_real_entry_path(monkeypatch):
+    profiled = []
+    output = IMPORTTIME_OUTPUT + "import time:      4000 |      90000 | gui\n"
+    monkeypatch.setattr(startup_profile, "run_importtime",
+                        lambda module, cwd=None: profiled.append(module) or (output, None))
+
+    # The window's import cost counts against the budget too
+    assert startup_profile.main(["--budget-ms", "50", "--forbid", ""]) == 1
+    assert profiled == ["main,gui"]
+    assert startup_profile.main(["--budget-ms", "100", "--forbid", ""]) == 0
@@ -0,0 +1,81 @@
+# test_subscription.py
+import pytest
+
+from subscription import STATUS_ACTIVE, STATUS_EXPIRED, InvalidSubscription, Subscription
+
+PAYLOAD = {
+    "username": "alice",
+    "status_key": STATUS_ACTIVE,
+    "used_volume_gb": 12.5,
+    "allowed_volume_gb": "50",
+    "is_unlimited_volume": False,
+    "remaining_days": 10,
+    "remaining_hours": "5",
+    "is_unlimited_time": False,
+    "last_ip": "203.0.113.7",
+    "dou_ip1": " 198.51.100.1 ",
+    "dou_ip2": "",
+    "doh_link": "https://dns.example/dns-query",
+    "mirrors": ["https://m1.example", 7, None],
+}
+
+
+def test_from_payload_decodes_and_derives():
+    sub = Subscription.from_payload(PAYLOAD)
+
+    assert sub.username == "alice"
+    assert sub.allowed_volume_gb == 50.0 and sub.remaining_hours == 5
+    assert sub.remaining_volume_gb == 37.5
+    assert sub.dns_servers == ("198.51.100.1",)
+    assert (sub.dou_ip1, sub.dou_ip2) == ("198.51.100.1", None)
+    assert sub.dot_address is None
+    assert sub.mirrors == ("https://m1.example",)
+    assert sub.is_active
+
+
+def test_remaining_volume_is_never_negative():
+    sub = Subscription.from_payload(dict(PAYLOAD, used_volume_gb=60, status_key=STATUS_EXPIRED))
+
+    assert sub.remaining_volume_gb == 0.0
+    assert not sub.is_active
+
+
+def test_missing_fields_get_defaults():
+    sub = Subscription.from_payload({})
+
+    assert (sub.username, sub.status, sub.used_volume_gb, sub.remaining_days) == (None, None, 0.0, 0)
+    assert sub.dns_servers == () and sub.mirrors == ()
+
+
+@pytest.mark.parametrize("payload", [
+    ["not", "an", "object"],
+    {"error": "Subscription not found"},
+    dict(PAYLOAD, used_volume_gb="lots"),
+    dict(PAYLOAD, remaining_days=True),
+    dict(PAYLOAD, username=42),
+    dict(PAYLOAD, dou_ip1="dns.example"),
+])
+def test_unusable_payloads_are_rejected(payload):
+    with pytest.raises(InvalidSubscription):
+        Subscription.from_payload(payload)
+
+
+def test_invalid_subscription_is_a_validation_error():
+    with pytest.raises(ValueError, match="Subscription not found"):
+        Subscription.from_payload({"error": "Subscription not found"})
+
+
+def test_to_dict_round_trips_through_the_cache():
+    sub = Subscription.from_payload(dict(PAYLOAD, dou_ip2="198.51.100.2"))
+    data = sub.to_dict()
+
+    assert "dot_address" not in data and "is_unlimited_time" not in data
+    assert data["dou_ip1"] == "198.51.100.1" and data["dou_ip2"] == "198.51.100.2"
+    again = Subscription.from_cache(data)
+    assert {slot: getattr(again, slot) for slot in Subscription.__slots__} == \
+           {slot: getattr(sub, slot) for slot in Subscription.__slots__}
+
+
+@pytest.mark.parametrize("cached", [None, {}, {"error": "gone"}, {"remaining_days": "soon"}])
+def test_from_cache_ignores_unusable_copies(cached):
+    assert Subscription.from_cache(cached) is None
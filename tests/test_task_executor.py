@@ -0,0 +1,126 @@
+# test_task_executor.py
+import threading
+
+import pytest
+
+from task_executor import CancellationToken, GuiTaskExecutor
+
+
+class FakeRoot:
+    """Stands in for the Tk root: after() callbacks run when the test calls run_pending()."""
+
+    def __init__(self):
+        self.pending = {}
+        self.next_id = 0
+
+    def after(self, delay_ms, func):
+        self.next_id += 1
+        self.pending[self.next_id] = func
+        return self.next_id
+
+    def after_cancel(self, after_id):
+        del self.pending[after_id]
+
+    def run_pending(self):
+        callbacks, self.pending = list(self.pending.values()), {}
+        for func in callbacks:
+            func()
+
+
+@pytest.fixture
+def root():
+    return FakeRoot()
+
+
+@pytest.fixture
+def executor(root):
+    executor = GuiTaskExecutor(root, max_workers=2, batch_size=2)
+    yield executor
+    executor.shutdown()
+
+
+def wait_for_results(executor, count):
+    for _ in range(200):
+        if executor._results.qsize() >= count:
+            return
+        threading.Event().wait(0.01)
+    raise AssertionError("tasks did not finish")
+
+
+def test_results_are_dispatched_on_the_draining_thread_in_completion_order(root, executor):
+    release_slow = threading.Event()
+    calls = []
+
+    def slow():
+        release_slow.wait(2)
+        return "slow"
+
+    executor.submit(slow, on_done=lambda result: calls.append((result, threading.current_thread())))
+    executor.submit(lambda: "fast", on_done=lambda result: calls.append((result, threading.current_thread())))
+    wait_for_results(executor, 1)
+    release_slow.set()
+    wait_for_results(executor, 2)
+    root.run_pending()
+
+    assert calls == [("fast", threading.current_thread()), ("slow", threading.current_thread())]
+    assert executor.outstanding == 0
+
+
+def test_errors_go_to_on_error(root, executor):
+    errors = []
+    executor.submit(int, "x", on_done=lambda result: errors.append("done"), on_error=errors.append)
+    wait_for_results(executor, 1)
+    root.run_pending()
+
+    assert len(errors) == 1 and isinstance(errors[0], ValueError)
+
+
+def test_cancelled_tasks_are_not_dispatched(root, executor):
+    calls = []
+    token = executor.submit(lambda: "stale", on_done=calls.append)
+    token.cancel()
+    executor.submit(lambda: "fresh", on_done=calls.append, token=CancellationToken())
+    wait_for_results(executor, 2)
+    root.run_pending()
+
+    assert calls == ["fresh"]
+    assert executor.outstanding == 0
+
+
+def test_drain_works_in_batches_and_stops_when_idle(root, executor):
+    calls = []
+    for n in range(5):
+        executor.submit(lambda n=n: n, on_done=calls.append)
+    wait_for_results(executor, 5)
+
+    root.run_pending()
+    assert len(calls) == 2 and len(root.pending) == 1
+    root.run_pending()
+    root.run_pending()
+    assert sorted(calls) == [0, 1, 2, 3, 4]
+    # Nothing outstanding: no further wakeups are scheduled
+    assert root.pending == {}
+
+
+def test_failing_callback_does_not_stop_the_batch(root, executor):
+    calls = []
+
+    def broken(result):
+        raise RuntimeError("callback bug")
+
+    executor.submit(lambda: 1, on_done=broken)
+    wait_for_results(executor, 1)
+    executor.submit(lambda: 2, on_done=calls.append)
+    wait_for_results(executor, 2)
+    root.run_pending()
+
+    assert calls == [2]
+
+
+def test_shutdown_cancels_the_scheduled_drain(root):
+    executor = GuiTaskExecutor(root)
+    executor.submit(lambda: None)
+    assert len(root.pending) == 1
+
+    executor.shutdown()
+    assert root.pending == {}
@@ -0,0 +1,122 @@
+# test_theme_assets.py
+import json
+import os
+import tkinter as tk
+
+import pytest
+
+import asset_pack
+import theme_assets
+from asset_pack import HEADER, MAGIC, FORMAT_VERSION, PYTHON_MAGIC, image_key
+
+
+class FakePhoto:
+    """Stands in for tk.PhotoImage: remembers where it was loaded from."""
+
+    sizes = {}
+
+    def __init__(self, master=None, file=None, data=None):
+        if file is not None and not os.path.exists(file):
+            raise tk.TclError(f"couldn't open {file}")
+        self.source = file if file is not None else "pack"
+        self._size = self.sizes.get(file, (0, 0))
+
+    def width(self):
+        return self._size[0]
+
+    def height(self):
+        return self._size[1]
+
+
+class FakeWindow:
+    def __init__(self, dpi=96):
+        self.tk = self
+        self.scaling = dpi / 72
+
+    def call(self, *args):
+        return str(self.scaling)
+
+
+@pytest.fixture
+def assets(tmp_path, monkeypatch):
+    """A resource folder with only the source logo (42x42), no pack and an empty cache."""
+    resources = tmp_path / "resources"
+    resources.mkdir()
+    (resources / theme_assets.LOGO_SOURCE).write_bytes(b"source logo")
+    monkeypatch.setattr(theme_assets, "resource_path", lambda name: str(resources / name))
+    monkeypatch.setattr(theme_assets, "LOGO_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(theme_assets, "_logo_images", {})
+    monkeypatch.setattr(asset_pack, "_packs", {})
+    monkeypatch.setattr(theme_assets.tk, "PhotoImage", FakePhoto)
+    monkeypatch.setattr(FakePhoto, "sizes", {str(resources / theme_assets.LOGO_SOURCE): (42, 42)})
+    rendered = []
+
+    def render_logo_png(source_path, target_path, size):
+        rendered.append(size)
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        with open(target_path, "wb") as f:
+            f.write(b"rendered")
+
+    monkeypatch.setattr(theme_assets, "render_logo_png", render_logo_png)
+    return resources, rendered
+
+
+def cache_path(resources, edge):
+    size = os.path.getsize(resources / theme_assets.LOGO_SOURCE)
+    return os.path.join(theme_assets.LOGO_CACHE_DIR, f"{size}_{theme_assets.prescaled_logo_name(edge, edge)}")
+
+
+def write_pack(path, names):
+    index = {image_key(name): [0, 3] for name in names}
+    index_bytes = json.dumps(index).encode()
+    path.write_bytes(HEADER.pack(MAGIC, FORMAT_VERSION, PYTHON_MAGIC, len(index_bytes)) + index_bytes + b"png")
+
+
+def test_source_logo_is_used_when_it_has_the_wanted_size(assets):
+    resources, rendered = assets
+    photo = theme_assets.get_logo_image(FakeWindow(), (42, 42))
+
+    assert photo.source == str(resources / theme_assets.LOGO_SOURCE)
+    assert rendered == []
+
+
+def test_asset_pack_comes_first(assets):
+    resources, rendered = assets
+    name = theme_assets.prescaled_logo_name(63, 63)
+    write_pack(resources / asset_pack.PACK_NAME, [name])
+    (resources / name).write_bytes(b"prescaled")
+
+    assert theme_assets.get_logo_image(FakeWindow(dpi=144), (42, 42)).source == "pack"
+
+
+def test_prescaled_file_then_cache(assets):
+    resources, rendered = assets
+    name = theme_assets.prescaled_logo_name(84, 84)
+    (resources / name).write_bytes(b"prescaled")
+    assert theme_assets.get_logo_image(FakeWindow(dpi=192), (42, 42)).source == str(resources / name)
+
+    os.makedirs(theme_assets.LOGO_CACHE_DIR)
+    with open(cache_path(resources, 53), "wb") as f:
+        f.write(b"cached")
+    assert theme_assets.get_logo_image(FakeWindow(dpi=120), (42, 42)).source == cache_path(resources, 53)
+    assert rendered == []
+
+
+def test_logo_is_rendered_once_into_the_cache(assets):
+    resources, rendered = assets
+    window = FakeWindow(dpi=144)
+    first = theme_assets.get_logo_image(window, (42, 42))
+
+    assert first.source == cache_path(resources, 63)
+    assert rendered == [(63, 63)]
+    assert theme_assets.get_logo_image(window, (42, 42)) is first
+    assert rendered == [(63, 63)]
+
+
+def test_failed_rendering_gives_no_logo(assets, monkeypatch):
+    def broken(source_path, target_path, size):
+        raise ImportError("PIL")
+
+    monkeypatch.setattr(theme_assets, "render_logo_png", broken)
+
+    assert theme_assets.get_logo_image(FakeWindow(dpi=144), (42, 42)) is None
@@ -0,0 +1,133 @@
+# test_timer_scheduler.py
+import pytest
+
+from timer_scheduler import TimerScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeWindow:
+    """Records the Tk after() calls; fire() runs the pending one as Tk would."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.pending = {}
+        self.next_id = 0
+        self.scheduled = 0
+
+    def after(self, delay_ms, func):
+        self.next_id += 1
+        self.scheduled += 1
+        self.pending[self.next_id] = (delay_ms, func)
+        return self.next_id
+
+    def after_cancel(self, after_id):
+        del self.pending[after_id]
+
+    def fire(self):
+        [(after_id, (delay_ms, func))] = self.pending.items()
+        del self.pending[after_id]
+        self.clock.now += delay_ms / 1000
+        func()
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def window(clock):
+    return FakeWindow(clock)
+
+
+@pytest.fixture
+def timers(window, clock):
+    return TimerScheduler(window, coalesce_ms=50, clock=clock)
+
+
+def test_timers_run_in_due_order_on_one_pending_after(timers, window):
+    calls = []
+    timers.call_later(300, calls.append, "c")
+    timers.call_later(100, calls.append, "a")
+    timers.call_later(200, calls.append, "b")
+    timers.call_later(200, calls.append, "b2")
+
+    assert [delay for delay, _ in window.pending.values()] == [100]
+    while window.pending:
+        window.fire()
+    assert calls == ["a", "b", "b2", "c"]
+    assert timers.pending == 0
+
+
+def test_timers_within_the_coalesce_window_share_a_tick(timers, window):
+    calls = []
+    timers.call_later(100, calls.append, "a")
+    timers.call_later(130, calls.append, "b")
+    timers.call_later(200, calls.append, "c")
+
+    window.fire()
+    assert calls == ["a", "b"]
+    assert [delay for delay, _ in window.pending.values()] == [100]
+    window.fire()
+    assert calls == ["a", "b", "c"]
+
+
+def test_cancelled_timers_do_not_run(timers, window):
+    calls = []
+    first = timers.call_later(100, calls.append, "a")
+    timers.call_later(200, calls.append, "b")
+    timers.cancel(first)
+    timers.cancel(None)
+
+    assert timers.pending == 1
+    while window.pending:
+        window.fire()
+    assert calls == ["b"]
+
+
+def test_a_timer_cancelled_by_an_earlier_one_in_the_same_tick_is_skipped(timers, window):
+    calls = []
+    later = timers.call_later(120, calls.append, "later")
+    timers.call_later(100, lambda: timers.after_cancel(later))
+
+    window.fire()
+    assert calls == []
+
+
+def test_paused_nonessential_timers_are_held_until_resumed(timers, window):
+    calls = []
+    timers.call_later(100, calls.append, "display", essential=False)
+    timers.call_later(100, calls.append, "essential")
+    timers.pause_nonessential()
+
+    window.fire()
+    assert calls == ["essential"]
+    assert timers.pending == 1 and not window.pending
+
+    timers.resume_nonessential()
+    window.fire()
+    assert calls == ["essential", "display"]
+
+
+def test_an_earlier_timer_rearms_the_tick(timers, window):
+    timers.call_later(1000, lambda: None)
+    timers.call_later(10, lambda: None)
+
+    assert [delay for delay, _ in window.pending.values()] == [10]
+    assert window.scheduled == 2
+
+
+def test_a_failing_callback_does_not_stop_the_tick(timers, window):
+    calls = []
+    timers.call_later(100, lambda: 1 / 0)
+    timers.call_later(100, calls.append, "next")
+
+    window.fire()
+    assert calls == ["next"]
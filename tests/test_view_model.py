@@ -0,0 +1,98 @@
+# test_view_model.py
+from config import TRANSLATIONS
+from subscription import STATUS_ACTIVE, STATUS_EXPIRED, Subscription
+from view_model import (
+    PLACEHOLDER, RESULT_KEYS, LabelRenderer, build_chrome_view, build_placeholder_view, build_results_view,
+)
+
+COLORS = {"accent": "#0af", "text_secondary": "#888", "success": "#0f0", "warning": "#fa0", "danger": "#f00"}
+
+
+def make_sub(**fields):
+    payload = {
+        "username": "alice", "status_key": STATUS_ACTIVE, "used_volume_gb": 12.5, "allowed_volume_gb": 50,
+        "remaining_days": 3, "remaining_hours": 4, "last_ip": "203.0.113.7",
+    }
+    payload.update(fields)
+    return Subscription.from_payload(payload)
+
+
+class FakeLabel:
+    def __init__(self):
+        self.options = {}
+        self.calls = []
+
+    def config(self, **options):
+        self.calls.append(options)
+        self.options.update(options)
+
+
+def test_results_view_formats_a_subscription():
+    en = TRANSLATIONS["en"]
+    view = build_results_view(make_sub(), "en", COLORS)
+
+    assert view["username"] == {"text": "alice", "foreground": COLORS["accent"]}
+    assert view["status"] == {"text": en["status_active"], "foreground": COLORS["success"]}
+    assert view["time"]["text"] == en["time_format"].format(days=3, hours=4)
+    assert view["volume"]["text"] == "37.50 GB"
+    assert view["ip"]["text"] == "203.0.113.7"
+
+
+def test_results_view_of_unlimited_and_unknown_fields():
+    sub = make_sub(is_unlimited_time=True, is_unlimited_volume=True, status_key=STATUS_EXPIRED,
+                   username=None, last_ip=None)
+    view = build_results_view(sub, "en", COLORS)
+
+    assert view["time"]["text"] == view["volume"]["text"] == TRANSLATIONS["en"]["unlimited"]
+    assert view["status"]["foreground"] == COLORS["danger"]
+    assert view["username"]["text"] == PLACEHOLDER
+    assert view["ip"]["text"] == "N/A"
+
+
+def test_unknown_status_is_shown_as_is():
+    view = build_results_view(make_sub(status_key="on_hold"), "en", COLORS)
+
+    assert view["status"] == {"text": "on_hold", "foreground": COLORS["text_secondary"]}
+
+
+def test_results_view_without_data_only_colors_the_labels():
+    view = build_results_view(None, "en", COLORS)
+
+    assert set(view) == set(RESULT_KEYS)
+    assert all(options == {"foreground": COLORS["accent"]} for options in view.values())
+
+
+def test_placeholder_view():
+    assert build_placeholder_view() == {key: {"text": PLACEHOLDER} for key in RESULT_KEYS}
+
+
+def test_chrome_view_translates_headers():
+    view = build_chrome_view("ru", COLORS)
+
+    assert view["title"] == {"foreground": COLORS["accent"]}
+    assert view["username_header"]["text"].endswith(TRANSLATIONS["ru"]["username_header"])
+    assert {f"{key}_header" for key in RESULT_KEYS} <= set(view)
+
+
+def test_renderer_only_applies_changed_options():
+    labels = {key: FakeLabel() for key in RESULT_KEYS}
+    renderer = LabelRenderer()
+    view = build_results_view(make_sub(), "en", COLORS)
+
+    renderer.apply(labels, view)
+    renderer.apply(labels, view)
+    assert renderer.config_calls == len(RESULT_KEYS)
+
+    renderer.apply(labels, build_results_view(make_sub(last_ip="198.51.100.9"), "en", COLORS))
+    assert labels["ip"].calls[-1] == {"text": "198.51.100.9"}
+    assert renderer.config_calls == len(RESULT_KEYS) + 1
+
+
+def test_renderer_skips_missing_widgets_and_forgets_state():
+    label = FakeLabel()
+    renderer = LabelRenderer()
+    renderer.apply({"ip": label}, {"ip": {"text": "x"}, "gone": {"text": "y"}})
+
+    renderer.forget("ip")
+    renderer.apply({"ip": label}, {"ip": {"text": "x"}})
+    assert label.calls == [{"text": "x"}, {"text": "x"}]